@@ -28,7 +28,11 @@
 Кроме того, вы сможете формировать цепочки на лету из разнообразных объектов, не привязываясь к конкретным классам.
 """
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from collections import deque
+from itertools import chain, count
+from time import perf_counter
+from typing import Callable, Dict, Iterator, Optional, List, Set, Tuple
+import sys
 
 
 class ComponentWithContextualHelp(ABC):
@@ -39,19 +43,93 @@ class ComponentWithContextualHelp(ABC):
 
 # Базовый класс простых компонентов.
 class Component(ComponentWithContextualHelp):
+    # Индекс попаданий мышью, в который входит компонент (см. HitIndex)
+    hit_index: Optional['HitIndex'] = None
+
     def __init__(self, tooltip_text: Optional[str] = None):
-        self.tooltip_next = tooltip_text
-        self.container = None
+        # Звено, которое в прошлый раз обработало запрос помощи от этого компонента; None — ещё не известно
+        self._help_cache: Optional['Component'] = None
+        self._container: Optional['Container'] = None
+        # Порядок среди детей контейнера: кто добавлен позже, лежит выше
+        self.z_order = 0
+        self._tooltip_next = tooltip_text
+
+    def invalidate_help(self) -> None:
+        """
+        Забывает запомненные обработчики компонента и его потомков: после переноса компонента или смены
+        его текста помощи ответ мог измениться только у них. Потомок, который обрабатывает запрос сам,
+        пропускается вместе со своим поддеревом — их запросы выше него не поднимаются.
+        """
+        for node in traverse(self, prune=lambda node: node is not self and node._help_cache is node):
+            node._help_cache = None
+
+    @property
+    def container(self) -> Optional['Container']:
+        return self._container
+
+    @container.setter
+    def container(self, container: Optional['Container']) -> None:
+        if self.hit_index is not None:
+            self.hit_index.remove_subtree(self)
+        self._container = container
+        self.invalidate_help()
+        if container is not None and container.hit_index is not None:
+            container.hit_index.insert_subtree(self)
+
+    def rect(self) -> Optional[Tuple[int, int, int, int]]:
+        """Занимаемый прямоугольник (x0, y0, x1, y1) в координатах окна; None у компонентов без геометрии."""
+        return None
+
+    @property
+    def tooltip_next(self) -> Optional[str]:
+        return self._tooltip_next
+
+    @tooltip_next.setter
+    def tooltip_next(self, text: Optional[str]) -> None:
+        self._tooltip_next = text
+        self.invalidate_help()
 
     def show_help(self) -> None:
+        """
+        Передаёт запрос по цепочке: сам компонент, затем его контейнеры вверх по дереву,
+        пока кто-то не обработает запрос. Проход идёт циклом, а не рекурсией, поэтому глубина вложенности не ограничена.
+        Обработчик запоминается у всех пройденных звеньев, так что повторное нажатие F1 сразу идёт к нему.
+        Решает всегда сам handle_help: если запомненный обработчик отказался, проход продолжается как обычно.
+        """
+        visited = []
+        handler = None
+        for component in self.iter_chain():
+            cached = component._help_cache
+            if cached is not None and cached.handle_help():
+                handler = cached
+                break
+            visited.append(component)
+            if cached is not component and component.handle_help():
+                handler = component
+                break
+        for component in visited:
+            component._help_cache = handler
+
+    def help_handler(self) -> Optional['Component']:
+        """Звено, обработавшее последний запрос помощи от компонента, или None, если оно ещё не известно."""
+        return self._help_cache
+
+    def iter_chain(self) -> Iterator['Component']:
+        """Звенья цепочки обязанностей: сам компонент и все его контейнеры до корня."""
+        component = self
+        while component is not None:
+            yield component
+            component = component.container
+
+    def handle_help(self) -> bool:
         """
         Базовое поведение компонента заключается в том, чтобы показать всплывающую подсказку, если для неё задан текст.
-        В обратном случае — перенаправить запрос своему контейнеру, если тот существует.
+        В обратном случае запрос уходит следующему звену — контейнеру.
         """
         if self.tooltip_next:
             print('Показать подсказку')
-        else:
-            self.container.show_help()
+            return True
+        return False
 
 
 # Контейнеры могут включать в себя как простые компоненты, так
@@ -62,16 +140,76 @@ class Container(Component):
     def __init__(self, tooltip_text: Optional[str] = None):
         super().__init__(tooltip_text)
         self.children: List[Component] = []
+        self._child_sequence = count()
 
     def add_child(self, child) -> None:
+        # Перенос поддерева в другой контейнер: убираем его у прежнего родителя
+        if child.container is not None:
+            child.container.children.remove(child)
         self.children.append(child)
+        child.z_order = next(self._child_sequence)
         child.container = self
 
 
+class Rectangular:
+    """
+    Примесь для компонентов с геометрией. Координаты абсолютные, в системе окна.
+    Изменение положения или размера сразу обновляет индекс попаданий дерева.
+    """
+    hit_index: Optional['HitIndex']
+
+    @property
+    def x(self) -> int:
+        return self._x
+
+    @x.setter
+    def x(self, value: int) -> None:
+        self._x = value
+        self._reindex()
+
+    @property
+    def y(self) -> int:
+        return self._y
+
+    @y.setter
+    def y(self, value: int) -> None:
+        self._y = value
+        self._reindex()
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @width.setter
+    def width(self, value: int) -> None:
+        self._width = value
+        self._reindex()
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @height.setter
+    def height(self, value: int) -> None:
+        self._height = value
+        self._reindex()
+
+    def _reindex(self) -> None:
+        if self.hit_index is not None:
+            self.hit_index.move(self)
+
+    def rect(self) -> Tuple[int, int, int, int]:
+        return self._x, self._y, self._x + self._width, self._y + self._height
+
+    def move_to(self, x: int, y: int) -> None:
+        self._x, self._y = x, y
+        self._reindex()
+
+
 # Большинство примитивных компонентов устроит базовое поведение
 # показа помощи через подсказку, которое они унаследуют из
 # класса Component.
-class Button(Component):
+class Button(Rectangular, Component):
     def __init__(self, x, y, width, height, text, tooltip_text: Optional[str] = None):
         super().__init__(tooltip_text)
         self.x = x
@@ -81,10 +219,10 @@ class Button(Component):
         self.text = text
 
 
-# Но сложные компоненты могут переопределять метод показа
+# Но сложные компоненты могут переопределять метод обработки
 # помощи по-своему. Но и в этом случае они всегда могут
 # вернуться к базовой реализации, вызвав метод родителя
-class Panel(Container):
+class Panel(Rectangular, Container):
     def __init__(self, x: int, y: int, width: int, height: int, tooltip_text: Optional[str] = None,
                  modal_help_text: Optional[str] = None):
         super().__init__(tooltip_text)
@@ -92,34 +230,188 @@ class Panel(Container):
         self.y = y
         self.width = width
         self.height = height
-        self.modal_help_text = modal_help_text
+        self._modal_help_text = modal_help_text
 
-    def show_help(self) -> None:
+    @property
+    def modal_help_text(self) -> Optional[str]:
+        return self._modal_help_text
+
+    @modal_help_text.setter
+    def modal_help_text(self, text: Optional[str]) -> None:
+        self._modal_help_text = text
+        self.invalidate_help()
+
+    def handle_help(self) -> bool:
         if self.modal_help_text:
             print(f"Модальная подсказка: {self.modal_help_text}")
-        else:
-            super().show_help()
+            return True
+        return super().handle_help()
 
 
 class Dialog(Container):
     def __init__(self, title, tooltip_text: Optional[str] = None, wiki_page_url: Optional[str] = None):
         super().__init__(tooltip_text)
         self.title = title
-        self.wiki_page_url = wiki_page_url
+        self._wiki_page_url = wiki_page_url
 
-    def show_help(self) -> None:
+    @property
+    def wiki_page_url(self) -> Optional[str]:
+        return self._wiki_page_url
+
+    @wiki_page_url.setter
+    def wiki_page_url(self, url: Optional[str]) -> None:
+        self._wiki_page_url = url
+        self.invalidate_help()
+
+    def handle_help(self) -> bool:
         if self.wiki_page_url:
             print(f'Страница в википедии: {self.wiki_page_url}')
-        else:
-            super().show_help()
+            return True
+        return super().handle_help()
+
+
+def traverse(root: Component, order: str = 'pre',
+             prune: Optional[Callable[[Component], bool]] = None) -> Iterator[Component]:
+    """
+    Обходит дерево компонентов без рекурсии, на явном стеке (или очереди для 'bfs'), и отдаёт узлы по одному.
+    order: 'pre' — контейнер перед детьми, 'post' — дети перед контейнером, 'bfs' — по уровням.
+    prune: если вернула True, узел пропускается вместе со всем своим поддеревом.
+    """
+    if prune is not None and prune(root):
+        return
+    if order == 'pre':
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            yield node
+            if isinstance(node, Container):
+                stack.extend(child for child in reversed(node.children) if prune is None or not prune(child))
+    elif order == 'post':
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded or not isinstance(node, Container):
+                yield node
+                continue
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children) if prune is None or not prune(child))
+    elif order == 'bfs':
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            yield node
+            if isinstance(node, Container):
+                queue.extend(child for child in node.children if prune is None or not prune(child))
+    else:
+        raise ValueError(f'Неизвестный порядок обхода: {order}')
+
+
+class HitIndex:
+    """
+    Индекс попаданий мышью по дереву компонентов: равномерная сетка ячеек по cell_size пикселей,
+    в каждой ячейке — компоненты, чей прямоугольник её задевает.
+    Порядок наложения задаётся ключом — путём z_order от корня: ребёнок лежит над родителем,
+    позже добавленный сосед — над ранним. Ребёнок виден только внутри прямоугольников своих предков.
+    Индекс обновляется на лету: при добавлении и переносе поддеревьев и при смене геометрии компонента.
+    Компонент, который задел бы больше max_cells ячеек (огромная панель, фон), в сетку не раскладывается,
+    а лежит в отдельном списке крупных, который проверяется при каждом запросе.
+    """
+
+    def __init__(self, root: Component, cell_size: int = 32, max_cells: int = 256):
+        self.root = root
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self._cells: Dict[Tuple[int, int], Set[Component]] = {}
+        self._oversized: Set[Component] = set()
+        self._keys: Dict[Component, Tuple[int, ...]] = {}
+        self._placed: Dict[Component, Tuple[Tuple[int, int, int, int], List[Tuple[int, int]]]] = {}
+        self.insert_subtree(root)
+
+    def insert_subtree(self, component: Component) -> None:
+        for node in traverse(component):
+            node.hit_index = self
+            parent = node.container
+            self._keys[node] = (self._keys[parent] if parent in self._keys else ()) + (node.z_order,)
+            self._place(node)
+
+    def remove_subtree(self, component: Component) -> None:
+        for node in traverse(component):
+            node.hit_index = None
+            self._unplace(node)
+            self._keys.pop(node, None)
+
+    def move(self, component: Component) -> None:
+        if component in self._keys:
+            self._unplace(component)
+            self._place(component)
+
+    def _place(self, component: Component) -> None:
+        rect = component.rect()
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        size = self.cell_size
+        columns = range(x0 // size, (x1 - 1) // size + 1)
+        rows = range(y0 // size, (y1 - 1) // size + 1)
+        if len(columns) * len(rows) > self.max_cells:
+            self._oversized.add(component)
+            self._placed[component] = (rect, [])
+            return
+        cells = [(cell_x, cell_y) for cell_y in rows for cell_x in columns]
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                bucket = self._cells[cell] = set()
+            bucket.add(component)
+        self._placed[component] = (rect, cells)
+
+    def _unplace(self, component: Component) -> None:
+        placed = self._placed.pop(component, None)
+        if placed is None:
+            return
+        self._oversized.discard(component)
+        for cell in placed[1]:
+            bucket = self._cells[cell]
+            bucket.discard(component)
+            if not bucket:
+                del self._cells[cell]
+
+    def _visible(self, component: Component, x: int, y: int) -> bool:
+        """Точка внутри всех предков с геометрией: ребёнок обрезается родителем."""
+        ancestor = component.container
+        while ancestor is not None:
+            placed = self._placed.get(ancestor)
+            if placed is not None:
+                x0, y0, x1, y1 = placed[0]
+                if not (x0 <= x < x1 and y0 <= y < y1):
+                    return False
+            ancestor = ancestor.container
+        return True
+
+    def component_at(self, x: int, y: int) -> Component:
+        """Верхний компонент под точкой; если под ней нет ни одного компонента с геометрией — корень."""
+        bucket = self._cells.get((x // self.cell_size, y // self.cell_size), ())
+        hits = []
+        for component in chain(bucket, self._oversized):
+            x0, y0, x1, y1 = self._placed[component][0]
+            if x0 <= x < x1 and y0 <= y < y1:
+                hits.append(component)
+        hits.sort(key=self._keys.__getitem__, reverse=True)
+        for component in hits:
+            if self._visible(component, x, y):
+                return component
+        return self.root
 
 
 class Application:
     def __init__(self):
         self.dialog = None
+        self.hit_index: Optional[HitIndex] = None
+        self.mouse = (0, 0)
 
     def create_ui(self) -> None:
         self.dialog = Dialog("Отчеты", wiki_page_url="http://...")
+        self.hit_index = HitIndex(self.dialog)
         panel = Panel(0, 0, 400, 800, modal_help_text="Эта панель предназначена для...")
         ok = Button(250, 760, 50, 20, "ОК", tooltip_text="Это кнопка OK, которая...")
         cancel = Button(320, 760, 50, 20, "Отмена")
@@ -127,15 +419,182 @@ class Application:
         panel.add_child(cancel)
         self.dialog.add_child(panel)
 
+    def on_mouse_move(self, x: int, y: int) -> None:
+        self.mouse = (x, y)
+
     def on_press_f1_key(self, component: Component) -> None:
         component.show_help()
 
     def get_component_at_mouse_coords(self) -> Component:
-        return self.dialog.children[0].children[0]
+        return self.hit_index.component_at(*self.mouse)
+
+
+def benchmark_chain(depth: int = 1_000_000, shallow_depth: int = 500, repeats: int = 200) -> None:
+    """
+    Сравнивает рекурсивную передачу запроса по контейнерам (как было раньше) с проходом циклом.
+    Подсказка есть только у корня, поэтому запрос проходит всю цепочку.
+    """
+
+    def recursive_show_help(component: Component) -> None:
+        if not component.handle_help():
+            recursive_show_help(component.container)
+
+    def iterative_show_help(component: Component) -> None:
+        for link in component.iter_chain():
+            if link.handle_help():
+                return
+
+    def build(levels: int) -> Button:
+        root = Dialog('Корень', tooltip_text='Подсказка корня')
+        node = root
+        for _ in range(levels):
+            child = Container()
+            node.add_child(child)
+            node = child
+        button = Button(0, 0, 10, 10, 'Кнопка')
+        node.add_child(button)
+        return button
+
+    shallow = build(shallow_depth)
+    # Печать подсказки исключаем из замера: считаем только проход по цепочке
+    shallow_root = list(shallow.iter_chain())[-1]
+    shallow_root.tooltip_next = None
+    shallow_root.handle_help = lambda: True
+    started = perf_counter()
+    for _ in range(repeats):
+        recursive_show_help(shallow)
+    recursive_time = perf_counter() - started
+    started = perf_counter()
+    for _ in range(repeats):
+        iterative_show_help(shallow)
+    iterative_time = perf_counter() - started
+    print(f'Глубина {shallow_depth}, {repeats} запросов: рекурсивно {recursive_time * 1000:.1f} мс, '
+          f'циклом {iterative_time * 1000:.1f} мс')
+
+    deep = build(depth)
+    try:
+        recursive_show_help(deep)
+    except RecursionError:
+        print(f'Глубина {depth}: рекурсивный show_help — RecursionError')
+    started = perf_counter()
+    iterative_show_help(deep)
+    print(f'Глубина {depth}: show_help циклом за {(perf_counter() - started) * 1000:.1f} мс')
+    root = list(deep.iter_chain())[-1]
+    for order in ('pre', 'post', 'bfs'):
+        started = perf_counter()
+        count = sum(1 for _ in traverse(root, order=order))
+        print(f'Глубина {depth}: обход {order} по {count} компонентам за {(perf_counter() - started) * 1000:.1f} мс')
+
+
+def benchmark_help_cache(depth: int = 1_000, buttons: int = 1_000, presses: int = 100_000) -> None:
+    """
+    Нажатия F1 на случайных кнопках в конце цепочки из depth контейнеров; помощь есть только у корня.
+    Проход по цепочке на каждое нажатие против запомненного обработчика, и цена первого нажатия после смены текста.
+    """
+    import random
+
+    class QuietDialog(Dialog):
+        def handle_help(self) -> bool:
+            return bool(self.wiki_page_url)
+
+    root = QuietDialog('Корень', wiki_page_url='http://...')
+    node: Container = root
+    for _ in range(depth):
+        child = Container()
+        node.add_child(child)
+        node = child
+    leaves = [Button(0, 0, 10, 10, f'Кнопка {number}') for number in range(buttons)]
+    for leaf in leaves:
+        node.add_child(leaf)
+    targets = random.Random(1).choices(leaves, k=presses)
+
+    def walk(component: Component) -> None:
+        for link in component.iter_chain():
+            if link.handle_help():
+                return
+
+    started = perf_counter()
+    for target in targets[:presses // 100]:
+        walk(target)
+    walk_time = (perf_counter() - started) / (presses // 100)
+    started = perf_counter()
+    for target in targets:
+        target.show_help()
+    cached_time = (perf_counter() - started) / presses
+    print(f'Глубина {depth}, {buttons} кнопок: проход по цепочке {walk_time * 1e6:.1f} мкс на нажатие, '
+          f'с запомненным обработчиком {cached_time * 1e6:.2f} мкс')
+
+    node.tooltip_next = 'Подсказка контейнера'
+    started = perf_counter()
+    leaves[0].show_help()
+    first = perf_counter() - started
+    started = perf_counter()
+    leaves[1].show_help()
+    print(f'После смены подсказки: первое нажатие {first * 1e6:.1f} мкс, '
+          f'соседняя кнопка {(perf_counter() - started) * 1e6:.1f} мкс, обработчик — {leaves[1].help_handler() is node}')
+
+
+def benchmark_hit_test(panels: int = 200, buttons_per_panel: int = 150, moves: int = 100_000) -> None:
+    """
+    Экран 1920x1080: сетка панелей, в каждой — сетка кнопок. Случайные движения мыши:
+    запрос к HitIndex против полного обхода дерева, плюс стоимость переноса компонентов.
+    """
+    import random
+
+    dialog = Dialog('Экран')
+    index = HitIndex(dialog)
+    columns = 20
+    panel_width, panel_height = 1920 // columns, 1080 // (panels // columns)
+    for number in range(panels):
+        left, top = number % columns * panel_width, number // columns * panel_height
+        panel = Panel(left, top, panel_width, panel_height)
+        for button in range(buttons_per_panel):
+            panel.add_child(Button(left + button % 10 * 9, top + button // 10 * 7, 8, 6, f'{number}.{button}'))
+        dialog.add_child(panel)
+    components = sum(1 for _ in traverse(dialog))
+
+    def naive(x: int, y: int) -> Component:
+        found = dialog
+        for node in traverse(dialog, prune=lambda node: node.rect() is not None and not (
+                node.rect()[0] <= x < node.rect()[2] and node.rect()[1] <= y < node.rect()[3])):
+            if node.rect() is not None:
+                found = node
+        return found
+
+    rng = random.Random(1)
+    points = [(rng.randrange(1920), rng.randrange(1080)) for _ in range(moves)]
+    for x, y in points[:200]:
+        assert index.component_at(x, y) is naive(x, y)
+
+    latencies = []
+    for x, y in points:
+        started = perf_counter()
+        index.component_at(x, y)
+        latencies.append(perf_counter() - started)
+    latencies.sort()
+    started = perf_counter()
+    for x, y in points[:100]:
+        naive(x, y)
+    naive_time = (perf_counter() - started) / 100
+    print(f'{components} компонентов, {moves} движений мыши: HitIndex p50 {latencies[moves // 2] * 1e6:.1f} мкс, '
+          f'p99 {latencies[int(moves * 0.99)] * 1e6:.1f} мкс, максимум {latencies[-1] * 1e6:.1f} мкс; '
+          f'обход дерева {naive_time * 1e6:.0f} мкс')
+
+    buttons = [node for node in traverse(dialog) if isinstance(node, Button)]
+    started = perf_counter()
+    for button in rng.sample(buttons, 10_000):
+        button.move_to(rng.randrange(1900), rng.randrange(1070))
+    print(f'  перенос кнопки: {(perf_counter() - started) / 10_000 * 1e6:.1f} мкс')
 
 
 if __name__ == '__main__':
-    app = Application()
-    app.create_ui()
-    component = app.get_component_at_mouse_coords()
-    app.on_press_f1_key(component)
+    if 'bench' in sys.argv[1:]:
+        benchmark_chain()
+        benchmark_help_cache()
+        benchmark_hit_test()
+    else:
+        app = Application()
+        app.create_ui()
+        app.on_mouse_move(260, 770)
+        component = app.get_component_at_mouse_coords()
+        app.on_press_f1_key(component)
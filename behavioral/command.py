@@ -7,4 +7,671 @@
 по этим кнопкам? Самым простым решением было бы создать подклассы для каждой кнопки и переопределить в них метод действия под разные задачи.
 Но скоро станет понятно, что мы так раздуваем код и получилось слишком много подклассов.
 Также код становится зависимым от классов бизнес-логики, которая часто меняется.
-"""
\ No newline at end of file
+Решение:
+Хорошие программы обычно разделяют на слои: графический интерфейс и бизнес-логику. Кнопка не должна сама выполнять действие,
+она лишь сообщает о нажатии. Паттерн Команда предлагает не отправлять такие вызовы напрямую, а вынести все детали запроса:
+объект-получатель, вызываемый метод и его аргументы — в отдельный класс с единственным методом выполнения.
+Кнопка хранит ссылку на объект команды и запускает её по нажатию, не зная, что именно произойдёт.
+Раз запрос стал объектом, его можно отложить, поставить в очередь, объединить с похожими и выполнить в другом потоке.
+"""
+import heapq
+import os
+import pickle
+import random
+import struct
+import sys
+import tempfile
+import threading
+import tracemalloc
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future
+from itertools import count
+from time import monotonic, perf_counter, sleep
+from typing import Any, Deque, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+
+class Command(ABC):
+    """
+    Базовая команда. Кроме execute команда может сообщить шине, как с ней обращаться:
+    priority — меньше значит раньше;
+    coalesce_key — команды с одинаковым ключом, ещё не начавшие выполняться, схлопываются в последнюю;
+    batch_key — команды с одинаковым ключом выполняются одной пачкой через execute_batch
+    и никогда не выполняются параллельно друг с другом, так что их порядок сохраняется.
+    """
+    priority = 0
+
+    @abstractmethod
+    def execute(self) -> Any:
+        pass
+
+    def coalesce_key(self) -> Optional[Hashable]:
+        return None
+
+    def batch_key(self) -> Optional[Hashable]:
+        return None
+
+    def execute_batch(self, commands: Sequence['Command']) -> List[Any]:
+        """Выполняет пачку совместимых команд (эта команда в ней первая). По умолчанию — по одной."""
+        return [command.execute() for command in commands]
+
+
+class _Absent:
+    """Метка «поля не было» в обратной дельте: при откате такое поле удаляется."""
+
+    def __repr__(self) -> str:
+        return 'ABSENT'
+
+    def __reduce__(self) -> str:
+        return 'ABSENT'
+
+
+ABSENT = _Absent()
+
+Delta = Dict[str, Any]
+
+
+class Document:
+    """
+    Получатель команд: набор полей документа. Каждое обращение стоит apply_cost секунд (запись, перерисовка).
+    apply возвращает обратную дельту — прежние значения изменённых полей, применив которую, изменение можно откатить.
+    """
+
+    def __init__(self, apply_cost: float = 0.0):
+        self.fields: Dict[str, Any] = {}
+        self.apply_cost = apply_cost
+        self.applies = 0
+        self._lock = threading.Lock()
+
+    def apply(self, changes: Delta) -> Delta:
+        fields = self.fields
+        with self._lock:
+            reverse = {field: fields.get(field, ABSENT) for field in changes}
+            for field, value in changes.items():
+                if value is ABSENT:
+                    fields.pop(field, None)
+                else:
+                    fields[field] = value
+            self.applies += 1
+        if self.apply_cost:
+            sleep(self.apply_cost)
+        return reverse
+
+
+class SetFieldCommand(Command):
+    def __init__(self, document: Document, field: str, value: Any, priority: int = 0):
+        self.document = document
+        self.field = field
+        self.value = value
+        self.priority = priority
+
+    def execute(self) -> Delta:
+        return self.document.apply({self.field: self.value})
+
+    def coalesce_key(self) -> Hashable:
+        # Повторная запись в то же поле делает предыдущую, ещё не выполненную, лишней
+        return id(self.document), self.field
+
+    def batch_key(self) -> Hashable:
+        return id(self.document)
+
+    def execute_batch(self, commands: Sequence['SetFieldCommand']) -> List[None]:
+        self.document.apply({command.field: command.value for command in commands})
+        return [None] * len(commands)
+
+
+class _Pending:
+    """Команда в очереди шины вместе с будущими результатами всех схлопнутых в неё отправок."""
+    __slots__ = ('priority', 'order', 'command', 'futures', 'submitted', 'alive')
+
+    def __init__(self, priority: int, order: int, command: Command, future: Future, submitted: float):
+        self.priority = priority
+        self.order = order
+        self.command = command
+        self.futures = [future]
+        self.submitted = submitted
+        self.alive = True
+
+    def __lt__(self, other: '_Pending') -> bool:
+        return (self.priority, self.order) < (other.priority, other.order)
+
+
+class CommandBus:
+    """
+    Шина команд: очередь с приоритетами и пул из workers потоков.
+    submit возвращает Future. Если в очереди уже max_pending команд, submit ждёт (или, с block=False,
+    бросает OverflowError) — так быстрые отправители не раздувают очередь без предела.
+    Рабочий поток берёт самую срочную команду и выполняет пачку из первых max_batch ожидающих команд
+    с её batch_key в порядке отправки; пока пачка выполняется, другие команды с этим ключом ждут.
+    Future, отменённые до начала выполнения, пропускаются.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 10_000, max_batch: int = 256, coalesce: bool = True):
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.coalesce = coalesce
+        self._heap: List[_Pending] = []
+        self._batches: Dict[Hashable, Deque[_Pending]] = {}
+        self._coalesced: Dict[Hashable, _Pending] = {}
+        self._busy: Set[Hashable] = set()
+        self._deferred: Dict[Hashable, List[_Pending]] = {}
+        self._pending = 0
+        self._order = count()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self.stats = {'submitted': 0, 'executed': 0, 'coalesced': 0, 'batches': 0, 'max_pending': 0}
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, command: Command, block: bool = True, timeout: Optional[float] = None) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('CommandBus is closed')
+            self.stats['submitted'] += 1
+
+            key = command.coalesce_key() if self.coalesce else None
+            pending = self._coalesced.get(key) if key is not None else None
+            if pending is not None and pending.alive:
+                pending.command = command
+                pending.futures.append(future)
+                self.stats['coalesced'] += 1
+                if command.priority < pending.priority:
+                    # Более срочная запись поднимает всю схлопнутую команду — и в общей очереди,
+                    # и среди отложенных по её batch_key, где она может сейчас лежать
+                    pending.priority = command.priority
+                    heapq.heapify(self._heap)
+                    deferred = self._deferred.get(command.batch_key())
+                    if deferred:
+                        heapq.heapify(deferred)
+                return future
+
+            if self._pending >= self.max_pending:
+                if not block:
+                    raise OverflowError('CommandBus queue is full')
+                if not self._not_full.wait_for(lambda: self._pending < self.max_pending or self._closed, timeout):
+                    raise TimeoutError('CommandBus queue is full')
+                if self._closed:
+                    raise RuntimeError('CommandBus is closed')
+
+            pending = _Pending(command.priority, next(self._order), command, future, perf_counter())
+            heapq.heappush(self._heap, pending)
+            batch_key = command.batch_key()
+            if batch_key is not None:
+                self._batches.setdefault(batch_key, deque()).append(pending)
+            if key is not None:
+                self._coalesced[key] = pending
+            self._pending += 1
+            self.stats['max_pending'] = max(self.stats['max_pending'], self._pending)
+            self._not_empty.notify()
+        return future
+
+    def _take(self, pending: _Pending) -> None:
+        pending.alive = False
+        self._pending -= 1
+        if self.coalesce:
+            key = pending.command.coalesce_key()
+            if key is not None and self._coalesced.get(key) is pending:
+                del self._coalesced[key]
+
+    def _next_batch(self) -> Optional[List[_Pending]]:
+        """
+        Под блокировкой: следующая пачка для выполнения, или None, если шина закрыта и пуста.
+        Приоритет решает, чей batch_key обслужить первым, а внутри ключа команды идут в порядке отправки:
+        пачка — это голова очереди ключа, иначе более ранняя запись в то же поле перетёрла бы срочную.
+        """
+        while True:
+            while self._heap and not self._heap[0].alive:
+                heapq.heappop(self._heap)
+            if self._heap:
+                first = heapq.heappop(self._heap)
+                batch_key = first.command.batch_key()
+                if batch_key is None:
+                    self._take(first)
+                    batch = [first]
+                elif batch_key in self._busy:
+                    # Ключ уже выполняется в другом потоке: отложим до его освобождения
+                    heapq.heappush(self._deferred.setdefault(batch_key, []), first)
+                    continue
+                else:
+                    self._busy.add(batch_key)
+                    lane = self._batches[batch_key]
+                    batch = []
+                    while lane and len(batch) < self.max_batch:
+                        pending = lane.popleft()
+                        if pending.alive:
+                            self._take(pending)
+                            batch.append(pending)
+                    if not lane:
+                        del self._batches[batch_key]
+                    if first.alive:
+                        # Срочная команда не поместилась за более ранними: она выйдет со следующей пачкой ключа
+                        heapq.heappush(self._heap, first)
+                self._not_full.notify(len(batch))
+                return batch
+            if self._closed and not self._pending:
+                return None
+            self._not_empty.wait()
+
+    def _release(self, batch_key: Hashable) -> None:
+        """
+        Освобождает ключ и возвращает в очередь самую срочную из отложенных по нему команд.
+        Остальные догонят её в пачке или вернутся по одной при следующих освобождениях.
+        """
+        self._busy.discard(batch_key)
+        deferred = self._deferred.get(batch_key)
+        while deferred and not deferred[0].alive:
+            heapq.heappop(deferred)
+        if deferred:
+            heapq.heappush(self._heap, heapq.heappop(deferred))
+            self._not_empty.notify()
+        if not deferred:
+            self._deferred.pop(batch_key, None)
+
+    @staticmethod
+    def _run(batch: List[_Pending]) -> int:
+        """Выполняет пачку и разрешает её Future; возвращает число выполненных команд."""
+        live = []
+        for pending in batch:
+            # Отменённые, пока команда стояла в очереди, отправки пропускаем; команду без живых отправок не выполняем
+            pending.futures = [future for future in pending.futures if future.set_running_or_notify_cancel()]
+            if pending.futures:
+                live.append(pending)
+        if not live:
+            return 0
+
+        error: Optional[BaseException] = None
+        try:
+            commands = [pending.command for pending in live]
+            try:
+                results = commands[0].execute_batch(commands)
+                if len(results) != len(commands):
+                    raise ValueError(f'execute_batch returned {len(results)} results for {len(commands)} commands')
+            except BaseException as exception:
+                error = exception
+            else:
+                for pending, result in zip(live, results):
+                    for future in pending.futures:
+                        future.set_result(result)
+        finally:
+            # Что бы ни случилось выше, ни один Future не должен остаться висеть
+            for pending in live:
+                for future in pending.futures:
+                    if not future.done():
+                        future.set_exception(error or RuntimeError('command was not completed'))
+        return len(live)
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                batch = self._next_batch()
+            if batch is None:
+                with self._lock:
+                    self._not_empty.notify_all()
+                return
+
+            executed = 0
+            try:
+                executed = self._run(batch)
+            finally:
+                with self._lock:
+                    self.stats['executed'] += executed
+                    self.stats['batches'] += 1
+                    batch_key = batch[0].command.batch_key()
+                    if batch_key is not None:
+                        self._release(batch_key)
+
+    def close(self, wait: bool = True) -> None:
+        """Перестаёт принимать команды; уже поставленные в очередь будут выполнены."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+class _SpillStack:
+    """
+    Стек записей в файле, который только дописывается. Каждая запись — данные и хвост TRAILER
+    (их длина и конец предыдущей записи стека), так что стек — цепочка от вершины назад, и индекса в памяти
+    не нужно: хранится только конец вершины. Снятая запись остаётся в файле мёртвой. Когда мёртвых байт
+    больше живых (и файл не совсем мал), живые записи по порядку переписываются в новый файл, который
+    заменяет старый; опустевший стек начинает файл заново.
+    """
+    TRAILER = struct.Struct('<IQ')
+    COMPACT_BYTES = 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'w+b')
+        self._top = 0
+        self._end = 0
+        self._live = 0
+        self.count = 0
+
+    def push(self, blob: bytes) -> None:
+        self._file.seek(self._end)
+        self._file.write(blob)
+        self._file.write(self.TRAILER.pack(len(blob), self._top))
+        self._end += len(blob) + self.TRAILER.size
+        self._top = self._end
+        self._live += len(blob) + self.TRAILER.size
+        self.count += 1
+
+    def _read(self, end: int) -> Tuple[int, int]:
+        """Длина данных записи, кончающейся на end, и конец записи под ней."""
+        self._file.seek(end - self.TRAILER.size)
+        return self.TRAILER.unpack(self._file.read(self.TRAILER.size))
+
+    def pop(self) -> bytes:
+        size, previous = self._read(self._top)
+        self._file.seek(self._top - self.TRAILER.size - size)
+        blob = self._file.read(size)
+        self._top = previous
+        self._live -= size + self.TRAILER.size
+        self.count -= 1
+        if not self.count:
+            self.clear()
+        elif self._end - self._live > max(self._live, self.COMPACT_BYTES):
+            self._compact()
+        return blob
+
+    def _compact(self) -> None:
+        records = []
+        end = self._top
+        while end:
+            size, previous = self._read(end)
+            records.append((end - self.TRAILER.size - size, size))
+            end = previous
+        temporary = self.path + '.compact'
+        with open(temporary, 'wb') as target:
+            top = 0
+            for start, size in reversed(records):
+                self._file.seek(start)
+                target.write(self._file.read(size))
+                target.write(self.TRAILER.pack(size, top))
+                top += size + self.TRAILER.size
+        self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, 'r+b')
+        self._top = self._end = self._live
+
+    def clear(self) -> None:
+        self._file.truncate(0)
+        self._top = self._end = self._live = 0
+        self.count = 0
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class History:
+    """
+    История отмены и повтора для документа. Хранится не снимок документа, а обратная дельта каждой команды,
+    упакованная pickle в bytes: обычно это десятки байт на команду.
+    Команды, меняющие те же поля в пределах merge_window секунд, сливаются в один шаг (как набор текста).
+    Шаги отмены и повтора вместе занимают в памяти не больше max_bytes: сверх этого самые далёкие шаги
+    уходят в файлы spill_path и spill_path + '.redo' (см. _SpillStack). С файлами первыми уходят шаги повтора:
+    любая новая команда всё равно их сбросит. Без файла шаги выбрасываются, причём сначала самые старые шаги
+    отмены, а ветка повтора теряется только когда отмены не осталось. Каждый выброшенный шаг учитывается
+    в stats['dropped'] (или stats['dropped_redo']), а _push возвращает, пропало ли что-нибудь.
+    """
+
+    def __init__(self, document: Document, max_bytes: int = 64 * 1024 * 1024, spill_path: Optional[str] = None,
+                 merge_window: float = 0.0):
+        self.document = document
+        self.max_bytes = max_bytes
+        self.merge_window = merge_window
+        # Ближайший к текущему состоянию шаг — справа, самый далёкий — слева
+        self._undo: Deque[bytes] = deque()
+        self._redo: Deque[bytes] = deque()
+        self._bytes = 0
+        self._last_keys: Optional[frozenset] = None
+        self._last_time = 0.0
+        self._undo_spill = _SpillStack(spill_path) if spill_path else None
+        self._redo_spill = _SpillStack(spill_path + '.redo') if spill_path else None
+        self.stats = {'merged': 0, 'spilled': 0, 'dropped': 0, 'dropped_redo': 0}
+
+    @staticmethod
+    def _size(blob: bytes) -> int:
+        return sys.getsizeof(blob) + 8
+
+    def nbytes(self) -> int:
+        """Память истории: упакованные дельты отмены и повтора, которые не ушли в файл."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._undo) + (self._undo_spill.count if self._undo_spill else 0)
+
+    def execute(self, command: Command) -> None:
+        reverse = command.execute()
+        self._bytes -= sum(map(self._size, self._redo))
+        self._redo.clear()
+        if self._redo_spill is not None:
+            self._redo_spill.clear()
+        now = monotonic()
+        keys = frozenset(reverse)
+        if (self.merge_window and self._undo and keys == self._last_keys
+                and now - self._last_time <= self.merge_window):
+            # В прошлой дельте уже лежат более старые значения этих полей: новый шаг не нужен
+            self.stats['merged'] += 1
+        else:
+            self._push(self._undo, pickle.dumps(reverse, pickle.HIGHEST_PROTOCOL))
+        self._last_keys, self._last_time = keys, now
+
+    def _push(self, steps: Deque[bytes], blob: bytes) -> bool:
+        """Кладёт шаг и вытесняет лишнее. Возвращает True, если какой-то шаг пришлось выбросить."""
+        steps.append(blob)
+        self._bytes += self._size(blob)
+        dropped = False
+        while self._bytes > self.max_bytes and (self._undo or self._redo):
+            redo_first = self._redo_spill is not None or not self._undo
+            steps, spill = (self._redo, self._redo_spill) if self._redo and redo_first else (self._undo, self._undo_spill)
+            farthest = steps.popleft()
+            self._bytes -= self._size(farthest)
+            if spill is None:
+                self.stats['dropped_redo' if steps is self._redo else 'dropped'] += 1
+                dropped = True
+            else:
+                # Вытесняемый шаг ближе к текущему состоянию, чем всё, что уже в файле, — он ложится на вершину
+                spill.push(farthest)
+                self.stats['spilled'] += 1
+        return dropped
+
+    def _pop(self, steps: Deque[bytes], spill: Optional[_SpillStack]) -> Optional[bytes]:
+        if steps:
+            blob = steps.pop()
+            self._bytes -= self._size(blob)
+            return blob
+        if spill is not None and spill.count:
+            return spill.pop()
+        return None
+
+    def undo(self) -> bool:
+        blob = self._pop(self._undo, self._undo_spill)
+        if blob is None:
+            return False
+        redo = self.document.apply(pickle.loads(blob))
+        self._push(self._redo, pickle.dumps(redo, pickle.HIGHEST_PROTOCOL))
+        self._last_keys = None
+        return True
+
+    def redo(self) -> bool:
+        blob = self._pop(self._redo, self._redo_spill)
+        if blob is None:
+            return False
+        reverse = self.document.apply(pickle.loads(blob))
+        self._push(self._undo, pickle.dumps(reverse, pickle.HIGHEST_PROTOCOL))
+        self._last_keys = None
+        return True
+
+    def close(self) -> None:
+        for spill in (self._undo_spill, self._redo_spill):
+            if spill is not None:
+                spill.close()
+
+
+class Button:
+    """Кнопка не знает, что делает: она лишь отправляет свою команду в шину."""
+
+    def __init__(self, text: str, bus: CommandBus, command_factory):
+        self.text = text
+        self.bus = bus
+        self.command_factory = command_factory
+
+    def click(self) -> Future:
+        return self.bus.submit(self.command_factory())
+
+
+def percentile(values: List[float], share: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def benchmark_bus(commands: int = 20_000, fields: int = 200, documents: int = 8, producers: int = 4,
+                  workers: int = 4, apply_cost: float = 0.0002) -> None:
+    """
+    producers потоков отправляют commands команд SetFieldCommand по fields полям (частые поля — чаще)
+    в documents документов, каждое обращение к которым стоит apply_cost секунд. Шина по одной команде, с пачками
+    и с пачками и схлопыванием: команды в секунду и задержка от submit до выполнения.
+    """
+    rng = random.Random(1)
+    names = rng.choices([f'field{number}' for number in range(fields)],
+                        [1 / rank for rank in range(1, fields + 1)], k=commands)
+    targets = [rng.randrange(documents) for _ in range(commands)]
+    print(f'{commands} команд, {fields} полей, {documents} документов, {producers} отправителей, {workers} исполнителей, '
+          f'обращение к документу {apply_cost * 1e6:.0f} мкс')
+
+    for title, max_batch, coalesce in (('по одной', 1, False), ('пачки', 256, False),
+                                       ('пачки+схлопывание', 256, True)):
+        pool = [Document(apply_cost) for _ in range(documents)]
+        bus = CommandBus(workers, max_pending=2_000, max_batch=max_batch, coalesce=coalesce)
+        latencies: List[float] = []
+        urgent: List[float] = []
+
+        def produce(part: int) -> None:
+            for number in range(part, commands, producers):
+                # Каждая сотая команда — срочная
+                priority = -1 if number % 100 == 0 else 0
+                started = perf_counter()
+                future = bus.submit(SetFieldCommand(pool[targets[number]], names[number], number, priority))
+                target = urgent if priority else latencies
+                future.add_done_callback(lambda _, started=started, target=target:
+                                         target.append(perf_counter() - started))
+
+        started = perf_counter()
+        threads = [threading.Thread(target=produce, args=(part,)) for part in range(producers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        bus.close()
+        elapsed = perf_counter() - started
+        latencies.sort()
+        urgent.sort()
+        print(f'  {title:>17}: {commands / elapsed:8.0f} команд/с, p50 {percentile(latencies, 0.5) * 1000:6.1f} мс, '
+              f'p99 {percentile(latencies, 0.99) * 1000:6.1f} мс, срочные p99 {percentile(urgent, 0.99) * 1000:6.1f} мс, '
+              f'обращений к документам {sum(document.applies for document in pool)}, очередь не длиннее {bus.stats["max_pending"]}')
+
+
+def benchmark_history(commands: int = 1_000_000, fields: int = 1_000, undo_steps: int = 1_000,
+                      max_bytes: int = 16 * 1024 * 1024) -> None:
+    """
+    Память истории после commands команд SetFieldCommand и время отмены undo_steps шагов:
+    полные снимки документа (оценка по первым 10 000 командам), дельты словарями, упакованные дельты
+    без ограничения, с ограничением max_bytes и с вытеснением в файл.
+    """
+    rng = random.Random(1)
+    names = [f'field{number}' for number in range(fields)]
+    plan = [(names[rng.randrange(fields)], number) for number in range(commands)]
+    print(f'{commands} команд по {fields} полям, ограничение {max_bytes / 1e6:.0f} МБ')
+
+    document = Document()
+    snapshots = []
+    sample = 10_000
+    tracemalloc.start()
+    for field, value in plan[:sample]:
+        document.apply({field: value})
+        snapshots.append(dict(document.fields))
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del snapshots
+    print(f'  {"снимки":>16}: ~{used / sample * commands / 1e9:.1f} ГБ (оценка)')
+
+    document = Document()
+    deltas = []
+    tracemalloc.start()
+    for field, value in plan:
+        deltas.append(document.apply({field: value}))
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del deltas
+    print(f'  {"дельты-словари":>16}: {used / 1e6:7.1f} МБ')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for title, limit, spill in (('упакованные', 1 << 40, None), ('с ограничением', max_bytes, None),
+                                    ('с файлом', max_bytes, os.path.join(directory, 'history.bin'))):
+            document = Document()
+            history = History(document, limit, spill)
+            started = perf_counter()
+            tracemalloc.start()
+            for field, value in plan:
+                history.execute(SetFieldCommand(document, field, value))
+            used, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            elapsed = perf_counter() - started
+
+            before = dict(document.fields)
+            started = perf_counter()
+            for _ in range(undo_steps):
+                history.undo()
+            undo_time = perf_counter() - started
+            for _ in range(undo_steps):
+                history.redo()
+            assert document.fields == before
+
+            # Откат из файла: отменяем всё, что в памяти, и ещё undo_steps шагов
+            spilled_undo = ''
+            if spill is not None:
+                for _ in range(len(history._undo)):
+                    history.undo()
+                started = perf_counter()
+                for _ in range(undo_steps):
+                    history.undo()
+                spilled_undo = f', {undo_steps} отмен из файла {(perf_counter() - started) * 1000:.1f} мс'
+            history.close()
+            print(f'  {title:>16}: {used / 1e6:7.1f} МБ (история {history.nbytes() / 1e6:.1f} МБ), '
+                  f'{commands / elapsed:.0f} команд/с, {undo_steps} отмен {undo_time * 1000:.1f} мс, '
+                  f'шагов {len(history)}, вытеснено {history.stats["spilled"]}, '
+                  f'выброшено {history.stats["dropped"]}{spilled_undo}')
+
+
+if __name__ == '__main__':
+    if 'bench' in sys.argv[1:]:
+        benchmark_bus()
+        benchmark_history()
+    else:
+        document = Document()
+        bus = CommandBus(workers=2)
+        bold = Button('Жирный', bus, lambda: SetFieldCommand(document, 'font-weight', 'bold'))
+        italic = Button('Курсив', bus, lambda: SetFieldCommand(document, 'font-style', 'italic'))
+        for button in (bold, italic, bold):
+            button.click()
+        bus.submit(SetFieldCommand(document, 'title', 'Отчёт', priority=-1)).result()
+        bus.close()
+        print(f'Документ: {document.fields}, обращений к документу: {document.applies}, статистика шины: {bus.stats}')
+
+        history = History(document, merge_window=1.0)
+        history.execute(SetFieldCommand(document, 'title', 'Отчёт за май'))
+        history.execute(SetFieldCommand(document, 'title', 'Отчёт за июнь'))
+        history.execute(SetFieldCommand(document, 'author', 'Иванов'))
+        history.undo()
+        print(f'После отмены: {document.fields}')
+        history.undo()
+        print(f'После второй отмены (правки заголовка слились в один шаг): {document.fields}')
+        history.redo()
+        print(f'После повтора: {document.fields}')
@@ -16,30 +16,191 @@
 пока не будут посчитаны все составные части.
 """
 from abc import ABC, abstractmethod
-from typing import List
+from collections import deque
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import sys
+
+
+class Rect(NamedTuple):
+    """Прямоугольная область: левая/верхняя граница включительно, правая/нижняя — нет."""
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    def union(self, other: 'Rect') -> 'Rect':
+        return Rect(min(self.left, other.left), min(self.top, other.top),
+                    max(self.right, other.right), max(self.bottom, other.bottom))
+
+    def intersects(self, other: 'Rect') -> bool:
+        return (self.left < other.right and other.left < self.right
+                and self.top < other.bottom and other.top < self.bottom)
+
+    def contains_strictly(self, other: 'Rect') -> bool:
+        """Лежит ли other внутри, не касаясь ни одной из границ."""
+        return (self.left < other.left and other.right < self.right
+                and self.top < other.top and other.bottom < self.bottom)
+
+    def area(self) -> int:
+        return (self.right - self.left) * (self.bottom - self.top)
+
+
+def merge_damage(rects: List[Rect], max_rects: int = 8) -> List[Rect]:
+    """
+    Сливает повреждённые области в небольшой набор прямоугольников.
+    Пересекающиеся области объединяются всегда, а пока прямоугольников больше max_rects —
+    объединяется пара, чьё объединение добавляет меньше всего лишней площади.
+    """
+    merged: List[Rect] = []
+    for rect in rects:
+        # Поглощаем все уже накопленные области, которые пересекаются с новой
+        changed = True
+        while changed:
+            changed = False
+            for i, other in enumerate(merged):
+                if rect.intersects(other):
+                    rect = rect.union(other)
+                    merged.pop(i)
+                    changed = True
+                    break
+        merged.append(rect)
+
+    while len(merged) > max_rects:
+        best = None
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                union = merged[i].union(merged[j])
+                waste = union.area() - merged[i].area() - merged[j].area()
+                if best is None or waste < best[0]:
+                    best = (waste, i, j, union)
+        _, i, j, union = best
+        merged.pop(j)
+        merged[i] = union
+    return merged
+
+
+class Renderer(ABC):
+    """Цель отрисовки. Графические объекты ничего не знают о том, куда именно они рисуются."""
+
+    @abstractmethod
+    def draw_dot(self, x: int, y: int) -> None:
+        pass
+
+    @abstractmethod
+    def draw_circle(self, x: int, y: int, radius: int) -> None:
+        pass
+
+    @abstractmethod
+    def draw_frame(self, rect: Rect) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self, rect: Rect) -> None:
+        pass
+
+
+class ConsoleRenderer(Renderer):
+    def draw_dot(self, x: int, y: int) -> None:
+        print(f'Нарисовать точку в координате {x}, {y}')
+
+    def draw_circle(self, x: int, y: int, radius: int) -> None:
+        print(f'Нарисовать окружность в координате {x}, {y} и с радиусом {radius}')
+
+    def draw_frame(self, rect: Rect) -> None:
+        print(f'Нарисовать пунктирную границу вокруг области {tuple(rect)}')
+
+    def clear(self, rect: Rect) -> None:
+        print(f'Очистить область {tuple(rect)}')
+
+
+class HeadlessRenderer(Renderer):
+    """
+    Рендерер без экрана: ничего не рисует, а только считает операции.
+    Позволяет измерять стоимость перерисовки на серверах без дисплея.
+    """
+
+    def __init__(self) -> None:
+        self.stats: Dict[str, int] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.stats = {'dots': 0, 'circles': 0, 'frames': 0, 'clears': 0}
+
+    @property
+    def primitives(self) -> int:
+        return self.stats['dots'] + self.stats['circles'] + self.stats['frames']
+
+    def draw_dot(self, x: int, y: int) -> None:
+        self.stats['dots'] += 1
+
+    def draw_circle(self, x: int, y: int, radius: int) -> None:
+        self.stats['circles'] += 1
+
+    def draw_frame(self, rect: Rect) -> None:
+        self.stats['frames'] += 1
+
+    def clear(self, rect: Rect) -> None:
+        self.stats['clears'] += 1
 
 
 class Graphic(ABC):
+    parent: Optional['CompoundGraphic'] = None
+
     @abstractmethod
     def move(self, x: int, y: int) -> None:
         pass
 
     @abstractmethod
-    def draw(self) -> None:
+    def draw(self, renderer: Optional[Renderer] = None) -> None:
         pass
 
+    @abstractmethod
+    def bounds(self) -> Optional[Rect]:
+        pass
+
+    def _changed(self, old: Optional[Rect]) -> None:
+        """
+        Сообщает предкам, что область объекта изменилась: их закешированные границы обновляются,
+        а старая и новая области попадают в список повреждений корня дерева.
+        Прежние рамки предков запоминаются в корне, чтобы redraw стёр те из них, что сдвинулись.
+        """
+        new = self.bounds()
+        node = self.parent
+        root = None
+        frames = []
+        while node is not None:
+            frames.append((node, node._bounds))
+            node._child_changed(old, new)
+            root = node
+            node = node.parent
+        if root is not None:
+            root._remember_frames(frames)
+            if old is not None:
+                root.damage.append(old)
+            if new is not None:
+                root.damage.append(new)
+
 
 class Dot(Graphic):
     def __init__(self, x: int, y: int) -> None:
         self.x = x
         self.y = y
 
+    def bounds(self) -> Optional[Rect]:
+        return Rect(self.x, self.y, self.x + 1, self.y + 1)
+
     def move(self, x: int, y: int) -> None:
+        old = self.bounds()
+        self._translate(x, y)
+        self._changed(old)
+
+    def _translate(self, x: int, y: int) -> None:
         self.x += x
         self.y += y
 
-    def draw(self):
-        print('Нарисовать точку в координате X, Y')
+    def draw(self, renderer: Optional[Renderer] = None) -> None:
+        (renderer or ConsoleRenderer()).draw_dot(self.x, self.y)
 
 
 class Circle(Dot):
@@ -48,29 +209,213 @@ class Circle(Dot):
         self.y = y
         self.radius = radius
 
-    def draw(self) -> None:
-        print('Нарисовать окружность в координате X, Y и с радиусом R')
+    def bounds(self) -> Optional[Rect]:
+        return Rect(self.x - self.radius, self.y - self.radius, self.x + self.radius + 1, self.y + self.radius + 1)
+
+    def draw(self, renderer: Optional[Renderer] = None) -> None:
+        (renderer or ConsoleRenderer()).draw_circle(self.x, self.y, self.radius)
 
 
 class CompoundGraphic(Graphic):
+    """
+    Составной объект кеширует свою границу и копит повреждённые области (damage),
+    чтобы redraw перерисовывал только изменившиеся участки, а не всю сцену.
+    """
+
     def __init__(self):
         self.children: List[Graphic] = []
+        self.damage: List[Rect] = []
+        self._bounds: Optional[Rect] = None
+        self._bounds_valid = True
+        # Контейнеры, чья граница могла измениться после последней отрисовки, и их рамки на экране
+        self._frames: Dict['CompoundGraphic', Optional[Rect]] = {}
 
     def add(self, child: Graphic) -> None:
-        print('Добавить компонент в список дочерних')
+        self.children.append(child)
+        child.parent = self
+        child._changed(None)
 
     def remove(self, child: Graphic) -> None:
-        print('Убрать компонент из списка дочерних')
+        if child not in self.children:
+            return
+        old = child.bounds()
+        self.children.remove(child)
+        child.parent = None
+        # Ребёнок уже отцеплен, поэтому об изменении сообщаем от имени контейнера
+        frames = [(self, self._bounds)]
+        self._child_changed(old, None)
+        self._changed_above(old, frames)
 
-    def move(self, x: int, y: int) -> None:
+    def bounds(self) -> Optional[Rect]:
+        if not self._bounds_valid:
+            # Пересчитываем снизу вверх только устаревшие контейнеры, актуальные поддеревья пропускаем.
+            # Граница актуального контейнера верна, даже если внутри него остался устаревший вложенный:
+            # такой пересчитается, когда кто-то спросит его собственную bounds()
+            stale = traverse(self, order='post',
+                             prune=lambda node: not isinstance(node, CompoundGraphic) or node._bounds_valid)
+            for node in stale:
+                node._recompute_bounds()
+        return self._bounds
+
+    def _recompute_bounds(self) -> None:
+        """Объединяет границы детей. Границы дочерних контейнеров к этому моменту уже актуальны."""
+        result = None
         for child in self.children:
-            child.move(x, y)
+            rect = child._bounds if isinstance(child, CompoundGraphic) else child.bounds()
+            if rect is not None:
+                result = rect if result is None else result.union(rect)
+        self._bounds = result
+        self._bounds_valid = True
+
+    def _child_changed(self, old: Optional[Rect], new: Optional[Rect]) -> None:
+        """
+        Обновляет кеш границы без полного пересчёта: граница пересчитывается лениво
+        только если старая область ребёнка касалась её края.
+        """
+        if not self._bounds_valid:
+            return
+        if self._bounds is None:
+            self._bounds = new
+            return
+        if old is not None and not self._bounds.contains_strictly(old):
+            self._bounds_valid = False
+            return
+        if new is not None:
+            self._bounds = self._bounds.union(new)
+
+    def _changed_above(self, old: Optional[Rect], frames: List[Tuple['CompoundGraphic', Optional[Rect]]]) -> None:
+        node = self
+        while node.parent is not None:
+            frames.append((node.parent, node.parent._bounds))
+            node.parent._child_changed(old, None)
+            node = node.parent
+        node._remember_frames(frames)
+        if old is not None:
+            node.damage.append(old)
+
+    def _remember_frames(self, frames: List[Tuple['CompoundGraphic', Optional[Rect]]]) -> None:
+        """Запоминает рамки контейнеров до первого изменения после отрисовки: именно они видны на экране."""
+        for node, rect in frames:
+            self._frames.setdefault(node, rect)
+
+    def _frame_damage(self) -> List[Rect]:
+        """Старая и новая рамка каждого контейнера, чья граница изменилась с последней отрисовки."""
+        damage = []
+        for node, old in self._frames.items():
+            root = node
+            while root.parent is not None:
+                root = root.parent
+            # Отцепленный от дерева контейнер больше не рисуется здесь: стереть нужно только старую рамку
+            new = node.bounds() if root is self else None
+            if new != old:
+                damage.extend(rect for rect in (old, new) if rect is not None)
+        self._frames.clear()
+        return damage
+
+    def move(self, x: int, y: int) -> None:
+        old = self.bounds()
+        self._translate(x, y)
+        self._changed(old)
+
+    def _translate(self, x: int, y: int) -> None:
+        for node in traverse(self):
+            if isinstance(node, CompoundGraphic):
+                node._shift_bounds(x, y)
+            else:
+                node._translate(x, y)
+
+    def _shift_bounds(self, x: int, y: int) -> None:
+        if self._bounds is not None:
+            self._bounds = Rect(self._bounds.left + x, self._bounds.top + y,
+                                self._bounds.right + x, self._bounds.bottom + y)
+
+    def draw(self, renderer: Optional[Renderer] = None) -> None:
+        """
+        Полная отрисовка:
+        1. Для каждого дочернего компонента отрисовать компонент.
+        2. Нарисовать пунктирную границу вокруг всей области.
+        """
+        renderer = renderer or ConsoleRenderer()
+        # Обход в обратном порядке: сначала все дети, затем рамка их контейнера
+        for node in traverse(self, order='post'):
+            if isinstance(node, CompoundGraphic):
+                rect = node.bounds()
+                if rect is not None:
+                    renderer.draw_frame(rect)
+            else:
+                node.draw(renderer)
+        self.damage.clear()
+        self._frames.clear()
 
-    def draw(self) -> None:
-        print(" 1. Для каждого дочернего компонента:"
-              "- Отрисовать компонент."
-              "- Определить координаты максимальной границы."
-              "2. Нарисовать пунктирную границу вокруг всей области.")
+    def redraw(self, renderer: Optional[Renderer] = None) -> List[Rect]:
+        """
+        Инкрементальная отрисовка: очищает только повреждённые области и заново выводит
+        компоненты, которые с ними пересекаются. Поддеревья вне повреждений пропускаются целиком.
+        Возвращает список перерисованных областей.
+        """
+        self.damage.extend(self._frame_damage())
+        if not self.damage:
+            return []
+        renderer = renderer or ConsoleRenderer()
+        regions = merge_damage(self.damage)
+        self.damage.clear()
+        for rect in regions:
+            renderer.clear(rect)
+
+        def untouched(node: Graphic) -> bool:
+            rect = node.bounds()
+            return rect is None or not any(rect.intersects(region) for region in regions)
+
+        for node in traverse(self, order='post', prune=untouched):
+            if isinstance(node, CompoundGraphic):
+                renderer.draw_frame(node.bounds())
+            else:
+                node.draw(renderer)
+        return regions
+
+
+def traverse(root: Graphic, order: str = 'pre',
+             prune: Optional[Callable[[Graphic], bool]] = None) -> Iterator[Graphic]:
+    """
+    Обходит дерево графики без рекурсии, на явном стеке (или очереди для 'bfs'), и отдаёт узлы по одному.
+    order: 'pre' — родитель перед детьми, 'post' — дети перед родителем, 'bfs' — по уровням.
+    prune: если вернула True, узел пропускается вместе со всем своим поддеревом.
+    Глубина дерева ограничена только памятью, а не лимитом рекурсии.
+    """
+    if prune is not None and prune(root):
+        return
+    if order == 'pre':
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            yield node
+            if isinstance(node, CompoundGraphic):
+                if prune is None:
+                    stack.extend(reversed(node.children))
+                else:
+                    stack.extend(child for child in reversed(node.children) if not prune(child))
+    elif order == 'post':
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded or not isinstance(node, CompoundGraphic):
+                yield node
+                continue
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children)
+                         if prune is None or not prune(child))
+    elif order == 'bfs':
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            yield node
+            if isinstance(node, CompoundGraphic):
+                if prune is None:
+                    queue.extend(node.children)
+                else:
+                    queue.extend(child for child in node.children if not prune(child))
+    else:
+        raise ValueError(f'Неизвестный порядок обхода: {order}')
 
 
 class ImageEditor:
@@ -85,14 +430,102 @@ class ImageEditor:
     def group_selected(self, components: List[Graphic]) -> None:
         group = CompoundGraphic()
         for component in components:
-            group.add(component)
             self.all.remove(component)
+            group.add(component)
         self.all.add(group)
         self.all.draw()
 
 
+def benchmark_redraw(elements: int = 100_000, group_size: int = 100) -> None:
+    """
+    Кадр «сдвинуть одну точку в сцене из elements элементов»: сравнивает полную отрисовку
+    с инкрементальной по числу выведенных примитивов и времени.
+    """
+    scene = CompoundGraphic()
+    for start in range(0, elements, group_size):
+        group = CompoundGraphic()
+        for i in range(start, min(start + group_size, elements)):
+            group.add(Dot((i % 1000) * 4, (i // 1000) * 4))
+        scene.add(group)
+    renderer = HeadlessRenderer()
+
+    started = perf_counter()
+    scene.draw(renderer)
+    full_time = perf_counter() - started
+    full_ops = renderer.primitives
+
+    target = scene.children[len(scene.children) // 2].children[0]
+    renderer.reset()
+    started = perf_counter()
+    target.move(1, 1)
+    regions = scene.redraw(renderer)
+    incremental_time = perf_counter() - started
+
+    print(f'Сцена: {elements} элементов, групп: {len(scene.children)}')
+    print(f'Полная отрисовка:        {full_ops} примитивов, {full_time * 1000:.2f} мс')
+    print(f'Инкрементальная (1 dot): {renderer.primitives} примитивов, {incremental_time * 1000:.2f} мс, '
+          f'областей: {len(regions)}')
+
+
+def benchmark_traversal(depth: int = 1_000_000, shallow_depth: int = 500, repeats: int = 200) -> None:
+    """
+    Сравнивает рекурсивный move (как было раньше) с обходом на явном стеке.
+    На shallow_depth работают обе версии, на depth рекурсивная падает с RecursionError.
+    """
+
+    def recursive_move(node: Graphic, x: int, y: int) -> None:
+        if isinstance(node, CompoundGraphic):
+            node._shift_bounds(x, y)
+            for child in node.children:
+                recursive_move(child, x, y)
+        else:
+            node._translate(x, y)
+
+    def build(levels: int) -> CompoundGraphic:
+        # Строим снизу вверх, чтобы add не проходил каждый раз по всей цепочке предков
+        node = CompoundGraphic()
+        node.add(Dot(0, 0))
+        for _ in range(levels - 1):
+            parent = CompoundGraphic()
+            parent.add(Dot(0, 0))
+            parent.add(node)
+            node = parent
+        return node
+
+    shallow = build(shallow_depth)
+    started = perf_counter()
+    for _ in range(repeats):
+        recursive_move(shallow, 1, 1)
+    recursive_time = perf_counter() - started
+    started = perf_counter()
+    for _ in range(repeats):
+        shallow._translate(1, 1)
+    iterative_time = perf_counter() - started
+    print(f'Глубина {shallow_depth}, {repeats} сдвигов: рекурсивно {recursive_time * 1000:.1f} мс, '
+          f'на стеке {iterative_time * 1000:.1f} мс')
+
+    deep = build(depth)
+    try:
+        recursive_move(deep, 1, 1)
+        print(f'Глубина {depth}: рекурсивный move отработал')
+    except RecursionError:
+        print(f'Глубина {depth}: рекурсивный move — RecursionError')
+    for order in ('pre', 'post', 'bfs'):
+        started = perf_counter()
+        count = sum(1 for _ in traverse(deep, order=order))
+        print(f'Глубина {depth}: обход {order} по {count} узлам за {(perf_counter() - started) * 1000:.1f} мс')
+    started = perf_counter()
+    deep.move(1, 1)
+    deep.draw(HeadlessRenderer())
+    print(f'Глубина {depth}: move + draw на стеке за {(perf_counter() - started) * 1000:.1f} мс')
+
+
 if __name__ == '__main__':
-    editor = ImageEditor()
-    editor.load()
-    components_to_group = [Dot(3, 4), Circle(6, 7, 15)]
-    editor.group_selected(components_to_group)
+    if 'bench' in sys.argv[1:]:
+        benchmark_redraw()
+        benchmark_traversal()
+    else:
+        editor = ImageEditor()
+        editor.load()
+        components_to_group = [Dot(3, 4), Circle(6, 7, 15)]
+        editor.group_selected(components_to_group)
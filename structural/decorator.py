@@ -20,93 +20,1243 @@
 """
 
 
+import asyncio
+import hashlib
+import lzma
+import mmap
+import os
+import queue
+import random
+import struct
+import sys
+import tempfile
+import threading
+import tracemalloc
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class ChunkCodec:
+    """
+    Пошаговое преобразование потока кусков: update вызывается на каждый входной кусок, flush — один раз в конце.
+    Шаги можно выполнять где угодно, в том числе по одному в пуле потоков из асинхронного кода.
+    Базовый кодек ничего не меняет.
+    """
+
+    def update(self, chunk: Buffer) -> Iterator[Buffer]:
+        yield chunk
+
+    def flush(self) -> Iterator[Buffer]:
+        return iter(())
+
+
+def run_codec(codec: ChunkCodec, chunks: Iterable[Buffer]) -> Iterator[Buffer]:
+    for chunk in chunks:
+        yield from codec.update(chunk)
+    yield from codec.flush()
+
+
+class Rechunker(ChunkCodec):
+    """
+    Перенарезает поток кусков произвольной длины на куски ровно по size байт (последний может быть короче).
+    Куски, целиком лежащие внутри одного входного куска, отдаются как memoryview без копирования.
+    Склеиваются только куски на стыке — в один заранее выделенный и переиспользуемый буфер.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.buffer = bytearray(size)
+        self.filled = 0
+
+    def update(self, chunk: Buffer) -> Iterator[Buffer]:
+        size = self.size
+        view = memoryview(chunk)
+        if self.filled:
+            take = min(size - self.filled, len(view))
+            self.buffer[self.filled:self.filled + take] = view[:take]
+            self.filled += take
+            view = view[take:]
+            if self.filled < size:
+                return
+            yield memoryview(self.buffer)
+            self.filled = 0
+        while len(view) >= size:
+            yield view[:size]
+            view = view[size:]
+        if view:
+            self.buffer[:len(view)] = view
+            self.filled = len(view)
+
+    def flush(self) -> Iterator[Buffer]:
+        if self.filled:
+            yield memoryview(self.buffer)[:self.filled]
+            self.filled = 0
+
+
+def rechunk(chunks: Iterable[Buffer], size: int) -> Iterator[Buffer]:
+    return run_codec(Rechunker(size), chunks)
+
+
 class DataSource:
     """
-    Общий интерфейс компонентов
+    Общий интерфейс компонентов.
+    Данные можно записать и прочитать целиком (write_data/read_data) или потоком кусков (write_chunks/read_chunks).
+    В потоковом режиме через весь стек декораторов одновременно проходит лишь несколько кусков,
+    поэтому память не зависит от размера данных.
+
+    Данные передаются как bytes-like буферы (bytes, bytearray, memoryview). Слой может отдавать дальше
+    представление своего переиспользуемого буфера, поэтому кусок действителен только до запроса следующего:
+    кто хочет сохранить кусок, обязан его скопировать.
     """
 
-    def __init__(self, data: str):
-        self.data = data
+    def write_data(self, data: Buffer) -> None:
+        self.write_chunks((data,))
 
-    def write_data(self, data: str) -> None:
-        pass
+    def read_data(self) -> bytearray:
+        data = bytearray()
+        for chunk in self.read_chunks():
+            data += chunk
+        return data
 
-    def read_data(self) -> None:
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
         pass
 
+    def read_chunks(self) -> Iterator[Buffer]:
+        return iter(())
+
 
 class FileDataSource(DataSource):
     """
-     Один из конкретных компонентов реализует базовую функциональность
+    Один из конкретных компонентов реализует базовую функциональность: буферизованный ввод-вывод в файл.
+    С use_mmap=True файл читается через отображение в память, без промежуточного буфера ввода-вывода.
     """
 
-    def write_data(self, data: str) -> None:
-        print('записать данные в файл')
+    def __init__(self, filename: str, buffer_size: int = DEFAULT_CHUNK_SIZE, use_mmap: bool = False) -> None:
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.use_mmap = use_mmap
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        with open(self.filename, 'wb', buffering=self.buffer_size) as file:
+            for chunk in chunks:
+                file.write(chunk)
+
+    def read_chunks(self) -> Iterator[Buffer]:
+        with open(self.filename, 'rb', buffering=self.buffer_size) as file:
+            # Пустой файл отобразить в память нельзя, его читаем обычным способом
+            if self.use_mmap and os.fstat(file.fileno()).st_size:
+                # Срезы mmap копируются: отображение закрывается вместе с генератором,
+                # а живые memoryview на него не дали бы его закрыть
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for offset in range(0, len(mapped), self.buffer_size):
+                        yield mapped[offset:offset + self.buffer_size]
+                return
+            buffer = bytearray(self.buffer_size)
+            view = memoryview(buffer)
+            while size := file.readinto(buffer):
+                yield view[:size]
+
+    def read_range(self, offset: int, size: int) -> bytes:
+        """Произвольный доступ: читает size байт начиная с offset."""
+        with open(self.filename, 'rb', buffering=0) as file:
+            file.seek(offset)
+            return file.read(size)
+
 
-    def read_data(self) -> None:
-        print('прочитать данные из файла')
+class MemoryDataSource(DataSource):
+    """Конкретный компонент, хранящий данные в памяти. Удобен как приёмник в примерах и замерах."""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self.buffer = bytearray()
+        self.chunk_size = chunk_size
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        self.buffer.clear()
+        for chunk in chunks:
+            self.buffer += chunk
+
+    def read_chunks(self) -> Iterator[Buffer]:
+        view = memoryview(bytes(self.buffer))
+        for offset in range(0, len(view), self.chunk_size):
+            yield view[offset:offset + self.chunk_size]
 
 
 class DataSourceDecorator(DataSource):
     """
-    Родитель всех декораторов содержит код обёртывания
+    Родитель всех декораторов содержит код обёртывания.
+    Конкретные декораторы переопределяют encoder/decoder — фабрики кодеков, которые преобразуют поток кусков
+    по пути вниз и вверх. Синхронные encode/decode и асинхронный стек работают поверх этих кодеков.
+
+    Чистые обёртки, которые ничего не переопределяют, при fuse=True пропускаются на пути данных:
+    декоратор отдаёт куски сразу первому нечистому объекту под собой, а чистая обёртка — напрямую ему же.
+    Сам стек при этом не меняется, wrapper указывает ровно на то, что передали в конструктор.
     """
     wrapper: DataSource
 
-    def __init__(self, source: DataSource) -> None:
+    def __init__(self, source: DataSource, fuse: bool = True) -> None:
         self.wrapper = source
+        self.fuse = fuse
+        self._pass_through = self.is_pass_through()
+        self._fused_for: Optional[DataSource] = None
+        self._fused: DataSource = source
+
+    @classmethod
+    def is_pass_through(cls) -> bool:
+        """Не переопределяет ни одного метода DataSource и DataSourceDecorator, а значит, не трогает данные."""
+        return all(getattr(cls, name) is getattr(DataSourceDecorator, name) for name in _OVERRIDABLE)
+
+    def target(self) -> DataSource:
+        """Кому на самом деле уходят данные: wrapper, а при fuse — первый слой под ним, который не чистая обёртка."""
+        if self._fused_for is not self.wrapper:
+            target = self.wrapper
+            if self.fuse:
+                while isinstance(target, DataSourceDecorator) and target._pass_through:
+                    target = target.wrapper
+            self._fused_for, self._fused = self.wrapper, target
+        return self._fused
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        self.target().write_chunks(chunks if self.fuse and self._pass_through else self.encode(chunks))
+
+    def read_chunks(self) -> Iterator[Buffer]:
+        chunks = self.target().read_chunks()
+        return chunks if self.fuse and self._pass_through else self.decode(chunks)
+
+    def encoder(self) -> ChunkCodec:
+        return ChunkCodec()
+
+    def decoder(self) -> ChunkCodec:
+        return ChunkCodec()
+
+    def encode(self, chunks: Iterable[Buffer]) -> Iterable[Buffer]:
+        return run_codec(self.encoder(), chunks)
+
+    def decode(self, chunks: Iterable[Buffer]) -> Iterable[Buffer]:
+        return run_codec(self.decoder(), chunks)
+
+    def encode_frame(self, frame: bytes, index: int) -> bytes:
+        """Преобразует один независимый кадр целиком. Нужен FramedPipeline для параллельной обработки."""
+        return frame
+
+    def decode_frame(self, frame: bytes, index: int) -> bytes:
+        return frame
 
-    def write_data(self, data: str) -> None:
-        self.wrapper.write_data(data)
 
-    def read_data(self) -> None:
-        return self.wrapper.read_data()
+# Всё, что наследник может переопределить и тем самым изменить данные на пути через слой
+_OVERRIDABLE = tuple(name for name, value in {**vars(DataSource), **vars(DataSourceDecorator)}.items()
+                     if callable(value) and not name.startswith('_'))
 
 
 class EncryptedDataSource(DataSourceDecorator):
     """
     Конкретные декораторы добавляют что-то своё к базовому поведению обёрнутого компонента.
+    Здесь это потоковый шифр: каждый блок складывается по XOR с гаммой SHAKE-256(key || номер блока).
+    Это учебный пример, а не криптостойкая схема.
     """
+    BLOCK_SIZE = 64 * 1024
+    GAMMA_CACHE_BLOCKS = 16
+
+    def __init__(self, source: DataSource, key: bytes, fuse: bool = True) -> None:
+        super().__init__(source, fuse)
+        self.key = key
+        self._gamma: Dict[int, int] = {}
+
+    def keystream(self, index: int) -> bytes:
+        return hashlib.shake_256(self.key + index.to_bytes(8, 'little')).digest(self.BLOCK_SIZE)
+
+    def gamma(self, index: int) -> int:
+        """Гамма блока в виде целого числа. Первые блоки кешируются: короткие записи всегда начинаются с блока 0."""
+        value = self._gamma.get(index)
+        if value is None:
+            value = int.from_bytes(self.keystream(index), 'little')
+            if index < self.GAMMA_CACHE_BLOCKS:
+                self._gamma[index] = value
+        return value
+
+    def encoder(self) -> ChunkCodec:
+        return KeystreamCodec(self)
+
+    # Операция XOR обратна сама себе
+    decoder = encoder
+
+    def encode_frame(self, frame: bytes, index: int) -> bytes:
+        # Гамма кадра зависит только от его номера, поэтому кадры шифруются независимо друг от друга
+        gamma = hashlib.shake_256(self.key + b'frame' + index.to_bytes(8, 'little')).digest(len(frame))
+        return (int.from_bytes(frame, 'little') ^ int.from_bytes(gamma, 'little')).to_bytes(len(frame), 'little')
+
+    decode_frame = encode_frame
+
+
+class KeystreamCodec(ChunkCodec):
+    """Складывает блоки потока по XOR с гаммой EncryptedDataSource. Применённый дважды, возвращает исходные данные."""
+
+    def __init__(self, source: EncryptedDataSource) -> None:
+        self.source = source
+        self.blocks = Rechunker(source.BLOCK_SIZE)
+        self.index = 0
+
+    def _xor(self, blocks: Iterator[Buffer]) -> Iterator[Buffer]:
+        for block in blocks:
+            size = len(block)
+            gamma = self.source.gamma(self.index)
+            if size < self.source.BLOCK_SIZE:
+                gamma &= (1 << (8 * size)) - 1
+            self.index += 1
+            # XOR больших блоков через целые числа выполняется в C, а не побайтно в Python
+            yield (int.from_bytes(block, 'little') ^ gamma).to_bytes(size, 'little')
+
+    def update(self, chunk: Buffer) -> Iterator[Buffer]:
+        return self._xor(self.blocks.update(chunk))
+
+    def flush(self) -> Iterator[Buffer]:
+        return self._xor(self.blocks.flush())
+
 
-    def write_data(self, data: str) -> None:
-        print(f"1. Зашифровать поданные данные."
-              f"2. Передать зашифрованные данные в метод writeData обёрнутого объекта (wrappee)")
+class CompressCodec(ChunkCodec):
+    def __init__(self, method: str, level: int, chunk_size: int) -> None:
+        if method == 'lzma':
+            self.compressor = lzma.LZMACompressor(preset=level)
+        else:
+            self.compressor = zlib.compressobj(level)
+        self.pieces = Rechunker(chunk_size)
 
-    def read_data(self) -> None:
-        print(f"1. Получить данные из метода readData обёрнутого объекта (wrappee)."
-              f"2. Расшифровать их, если они зашифрованы."
-              f"3. Вернуть результат.")
+    def _compress(self, pieces: Iterator[Buffer]) -> Iterator[Buffer]:
+        for piece in pieces:
+            packed = self.compressor.compress(piece)
+            if packed:
+                yield packed
+
+    def update(self, chunk: Buffer) -> Iterator[Buffer]:
+        return self._compress(self.pieces.update(chunk))
+
+    def flush(self) -> Iterator[Buffer]:
+        yield from self._compress(self.pieces.flush())
+        tail = self.compressor.flush()
+        if tail:
+            yield tail
+
+
+class DecompressCodec(ChunkCodec):
+    """
+    Распаковка, которая никогда не выдаёт больше chunk_size байт за раз.
+    Оборванный поток и данные после его конца не принимаются молча: flush бросает ValueError.
+    """
+
+    def __init__(self, method: str, chunk_size: int) -> None:
+        self.method = method
+        self.chunk_size = chunk_size
+        if method == 'lzma':
+            self.decompressor = lzma.LZMADecompressor()
+        else:
+            self.decompressor = zlib.decompressobj()
+
+    def update(self, chunk: Buffer) -> Iterator[Buffer]:
+        decompressor = self.decompressor
+        if self.method == 'lzma':
+            if decompressor.eof:
+                if chunk:
+                    raise ValueError('Данные после конца сжатого потока')
+                return
+            unpacked = decompressor.decompress(chunk, max_length=self.chunk_size)
+            if unpacked:
+                yield unpacked
+            while not decompressor.needs_input and not decompressor.eof:
+                yield decompressor.decompress(b'', max_length=self.chunk_size)
+            return
+        while chunk:
+            if decompressor.eof:
+                raise ValueError('Данные после конца сжатого потока')
+            unpacked = decompressor.decompress(chunk, self.chunk_size)
+            if unpacked:
+                yield unpacked
+            chunk = decompressor.unconsumed_tail
+
+    def flush(self) -> Iterator[Buffer]:
+        decompressor = self.decompressor
+        if self.method == 'zlib':
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+        if not decompressor.eof:
+            raise ValueError('Сжатый поток оборван')
+        if decompressor.unused_data:
+            raise ValueError('Данные после конца сжатого потока')
 
 
 class CompressionDecorator(DataSourceDecorator):
     """
     Декорировать можно не только базовые компоненты, но и уже обёрнутые объекты.
+    Сжатие идёт порциями по chunk_size байт, а распаковка никогда не выдаёт больше chunk_size байт за раз,
+    так что даже многогигабайтные данные проходят через декоратор в постоянной памяти.
     """
 
-    def write_data(self, data: str) -> None:
-        print(f"1. Запаковать поданные данные."
-              f"2. Передать запакованные данные в метод writeData обёрнутого объекта (wrappee)")
+    def __init__(self, source: DataSource, method: str = 'zlib', level: int = 6,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, fuse: bool = True) -> None:
+        super().__init__(source, fuse)
+        if method not in ('zlib', 'lzma'):
+            raise ValueError(f'Неизвестный метод сжатия: {method}')
+        self.method = method
+        self.level = level
+        self.chunk_size = chunk_size
 
-    def read_data(self) -> None:
-        print(f"1. Получить данные из метода readData обёрнутого объекта (wrappee)."
-              f"2. Распаковать их, если они запакованы."
-              f"3. Вернуть результат.")
+    def encoder(self) -> ChunkCodec:
+        return CompressCodec(self.method, self.level, self.chunk_size)
 
-if __name__ == '__main__':
-    file_data_source = FileDataSource('example.txt')
+    def decoder(self) -> ChunkCodec:
+        return DecompressCodec(self.method, self.chunk_size)
+
+    def encode_frame(self, frame: bytes, index: int) -> bytes:
+        if self.method == 'lzma':
+            return lzma.compress(frame, preset=self.level)
+        return zlib.compress(frame, self.level)
+
+    def decode_frame(self, frame: bytes, index: int) -> bytes:
+        if self.method == 'lzma':
+            return lzma.decompress(frame)
+        return zlib.decompress(frame)
+
+
+def encode_frame(layers: List[DataSourceDecorator], frame: bytes, index: int) -> bytes:
+    """Пропускает кадр через слои сверху вниз. Функция модульного уровня, чтобы её можно было отдать в пул процессов."""
+    for layer in layers:
+        frame = layer.encode_frame(frame, index)
+    return frame
+
+
+def decode_frame(layers: List[DataSourceDecorator], frame: bytes, index: int) -> bytes:
+    for layer in reversed(layers):
+        frame = layer.decode_frame(frame, index)
+    return frame
+
+
+class FramedPipeline(DataSource):
+    """
+    Параллельный конвейер для стека декораторов над FileDataSource.
+    Данные режутся на независимые кадры по frame_size байт. Каждый кадр проходит все слои стека в пуле потоков
+    (zlib отпускает GIL) или процессов, а результаты записываются строго по порядку.
+    В пути одновременно не больше max_in_flight кадров, поэтому память ограничена.
+
+    Формат файла: MAGIC, кадры подряд, таблица кадров (смещение, размер на диске, исходный размер)
+    и хвост (смещение таблицы, число кадров, MAGIC). По таблице любой кадр читается отдельно.
+    """
+    MAGIC = b'PPFR'
+    ENTRY = struct.Struct('<QII')
+    FOOTER = struct.Struct('<QI4s')
+
+    def __init__(self, source: DataSource, frame_size: int = 1024 * 1024, workers: Optional[int] = None,
+                 use_processes: bool = False, max_in_flight: Optional[int] = None) -> None:
+        self.layers: List[DataSourceDecorator] = []
+        while isinstance(source, DataSourceDecorator):
+            if not source.is_pass_through():
+                self.layers.append(source)
+            source = source.wrapper
+        if not isinstance(source, FileDataSource):
+            raise TypeError('FramedPipeline работает только поверх FileDataSource')
+        self.file = source
+        self.frame_size = frame_size
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self._index: Optional[List[Tuple[int, int, int]]] = None
+
+    def _executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(self.workers)
+        return ThreadPoolExecutor(self.workers)
+
+    def _map_ordered(self, executor: Executor, function, layers, items: Iterable[Tuple[int, bytes]]) -> Iterator[bytes]:
+        """Как executor.map, но с ограниченным числом задач в полёте и ленивым чтением входа."""
+        pending = deque()
+        for index, frame in items:
+            if len(pending) >= self.max_in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(function, layers, frame, index))
+        while pending:
+            yield pending.popleft().result()
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        index: List[Tuple[int, int, int]] = []
+
+        def framed() -> Iterator[bytes]:
+            yield self.MAGIC
+            offset = len(self.MAGIC)
+            raw_sizes = deque()
+
+            def numbered() -> Iterator[Tuple[int, bytes]]:
+                for number, frame in enumerate(rechunk(chunks, self.frame_size)):
+                    raw_sizes.append(len(frame))
+                    # Кадр живёт в пуле дольше, чем кусок от rechunk, поэтому его нужно скопировать
+                    yield number, bytes(frame)
+
+            with self._executor() as executor:
+                for stored in self._map_ordered(executor, encode_frame, self.layers, numbered()):
+                    index.append((offset, len(stored), raw_sizes.popleft()))
+                    offset += len(stored)
+                    yield stored
+            yield b''.join(self.ENTRY.pack(*entry) for entry in index)
+            yield self.FOOTER.pack(offset, len(index), self.MAGIC)
+
+        self.file.write_chunks(framed())
+        self._index = index
+
+    def frame_index(self) -> List[Tuple[int, int, int]]:
+        """Таблица кадров: (смещение, размер на диске, исходный размер). Читается из хвоста файла один раз."""
+        if self._index is None:
+            size = os.path.getsize(self.file.filename)
+            offset, count, magic = self.FOOTER.unpack(self.file.read_range(size - self.FOOTER.size, self.FOOTER.size))
+            if magic != self.MAGIC:
+                raise ValueError(f'{self.file.filename} не является файлом с кадрами')
+            table = self.file.read_range(offset, count * self.ENTRY.size)
+            self._index = list(self.ENTRY.iter_unpack(table))
+        return self._index
+
+    def frame_count(self) -> int:
+        return len(self.frame_index())
+
+    def read_frame(self, number: int) -> bytes:
+        """Читает и декодирует один кадр, не трогая остальные."""
+        offset, stored, _ = self.frame_index()[number]
+        return decode_frame(self.layers, self.file.read_range(offset, stored), number)
+
+    def read_chunks(self) -> Iterator[bytes]:
+        index = self.frame_index()
+
+        def stored_frames() -> Iterator[Tuple[int, bytes]]:
+            with open(self.file.filename, 'rb') as file:
+                for number, (offset, stored, _) in enumerate(index):
+                    file.seek(offset)
+                    yield number, file.read(stored)
+
+        with self._executor() as executor:
+            yield from self._map_ordered(executor, decode_frame, self.layers, stored_frames())
+
+
+class LRUBlockCache:
+    """Кеш блоков, ограниченный суммарным размером в байтах. Вытесняется блок, к которому дольше всего не обращались."""
+
+    def __init__(self, capacity_bytes: int) -> None:
+        self.capacity_bytes = capacity_bytes
+        self.size = 0
+        self._blocks: 'OrderedDict[int, bytes]' = OrderedDict()
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: int) -> Optional[bytes]:
+        block = self._blocks.get(key)
+        if block is None:
+            self.stats['misses'] += 1
+            return None
+        self._blocks.move_to_end(key)
+        self.stats['hits'] += 1
+        return block
+
+    def put(self, key: int, block: bytes) -> None:
+        old = self._blocks.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._blocks[key] = block
+        self.size += len(block)
+        while self.size > self.capacity_bytes and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self.size -= len(evicted)
+            self.stats['evictions'] += 1
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._blocks
+
+    def clear(self) -> None:
+        self._blocks.clear()
+        self.size = 0
+
+
+class ARCBlockCache:
+    """
+    Адаптивный кеш замещения (ARC): делит место между недавно и часто используемыми блоками
+    и сам подстраивает границу по «призракам» — ключам недавно вытесненных блоков.
+    Однократное сканирование не вымывает горячие блоки, как в LRU.
+    Ёмкость считается в блоках: capacity_bytes // block_size.
+    """
+
+    def __init__(self, capacity_bytes: int, block_size: int) -> None:
+        self.capacity = max(capacity_bytes // block_size, 1)
+        self.target = 0.0
+        self.size = 0
+        # t1/t2 — блоки, увиденные один раз и не менее двух раз; b1/b2 — их призраки
+        self._t1: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._t2: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._b1: 'OrderedDict[int, None]' = OrderedDict()
+        self._b2: 'OrderedDict[int, None]' = OrderedDict()
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: int) -> Optional[bytes]:
+        if key in self._t1:
+            block = self._t1.pop(key)
+            self._t2[key] = block
+        elif key in self._t2:
+            block = self._t2[key]
+            self._t2.move_to_end(key)
+        else:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return block
+
+    def _replace(self, key: int) -> None:
+        if self._t1 and (len(self._t1) > self.target or (key in self._b2 and len(self._t1) == self.target)):
+            evicted, block = self._t1.popitem(last=False)
+            self._b1[evicted] = None
+        else:
+            evicted, block = self._t2.popitem(last=False)
+            self._b2[evicted] = None
+        self.size -= len(block)
+        self.stats['evictions'] += 1
+
+    def put(self, key: int, block: bytes) -> None:
+        for resident in (self._t1, self._t2):
+            if key in resident:
+                self.size += len(block) - len(resident[key])
+                resident[key] = block
+                return
+        if key in self._b1:
+            self.target = min(self.capacity, self.target + max(len(self._b2) / len(self._b1), 1))
+            self._replace(key)
+            del self._b1[key]
+            self._t2[key] = block
+        elif key in self._b2:
+            self.target = max(0.0, self.target - max(len(self._b1) / len(self._b2), 1))
+            self._replace(key)
+            del self._b2[key]
+            self._t2[key] = block
+        else:
+            if len(self._t1) + len(self._b1) == self.capacity:
+                if len(self._t1) < self.capacity:
+                    self._b1.popitem(last=False)
+                    self._replace(key)
+                else:
+                    _, evicted = self._t1.popitem(last=False)
+                    self.size -= len(evicted)
+                    self.stats['evictions'] += 1
+            else:
+                total = len(self._t1) + len(self._t2) + len(self._b1) + len(self._b2)
+                if total >= self.capacity:
+                    if total == 2 * self.capacity:
+                        self._b2.popitem(last=False)
+                    self._replace(key)
+            self._t1[key] = block
+        self.size += len(block)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._t1 or key in self._t2
+
+    def clear(self) -> None:
+        for part in (self._t1, self._t2, self._b1, self._b2):
+            part.clear()
+        self.target = 0.0
+        self.size = 0
+
+
+class CachingDataSource(DataSourceDecorator):
+    """
+    Кеширует уже декодированные блоки по их номеру (смещение / block_size), чтобы повторное чтение
+    горячих участков не шло в файл и не распаковывало и не расшифровывало их заново.
 
-    encrypted_data_source = EncryptedDataSource(file_data_source)
+    Поверх FramedPipeline блоком служит кадр и читается напрямую. Поверх обычного стека блоки берутся
+    из потока распаковки; открытый поток запоминается, поэтому последовательное чтение не начинается
+    каждый раз с начала. При последовательном чтении заранее подгружается read_ahead следующих блоков.
+    Любая запись сбрасывает кеш.
+    """
+
+    def __init__(self, source: DataSource, capacity_bytes: int = 64 * 1024 * 1024,
+                 block_size: int = DEFAULT_CHUNK_SIZE, read_ahead: int = 4, policy: str = 'lru',
+                 fuse: bool = True) -> None:
+        super().__init__(source, fuse)
+        target = self.target()
+        if isinstance(target, FramedPipeline):
+            block_size = target.frame_size
+        if policy == 'lru':
+            self.cache = LRUBlockCache(capacity_bytes)
+        elif policy == 'arc':
+            self.cache = ARCBlockCache(capacity_bytes, block_size)
+        else:
+            raise ValueError(f'Неизвестная политика кеша: {policy}')
+        self.block_size = block_size
+        self.read_ahead = read_ahead
+        self._last_block = -1
+        self._block_count: Optional[int] = None
+        self._stream: Optional[Iterator[Buffer]] = None
+        self._stream_next = 0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = dict(self.cache.stats)
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+        stats['cached_bytes'] = self.cache.size
+        return stats
+
+    def invalidate(self) -> None:
+        self.cache.clear()
+        self._last_block = -1
+        self._block_count = None
+        self._stream = None
+        self._stream_next = 0
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        self.invalidate()
+        self.target().write_chunks(chunks)
+
+    def _load(self, first: int, last: int) -> Optional[bytes]:
+        """
+        Загружает в кеш блоки с first по last включительно, которых там ещё нет.
+        Возвращает блок first, если он был загружен (read-ahead может тут же вытеснить его из маленького кеша).
+        """
+        loaded = None
+        target = self.target()
+        if isinstance(target, FramedPipeline):
+            if self._block_count is None:
+                self._block_count = target.frame_count()
+            for number in range(first, min(last + 1, self._block_count)):
+                if number not in self.cache:
+                    block = target.read_frame(number)
+                    self.cache.put(number, block)
+                    if number == first:
+                        loaded = block
+            return loaded
+
+        if self._stream is None or self._stream_next > first:
+            self._stream = rechunk(target.read_chunks(), self.block_size)
+            self._stream_next = 0
+        while self._stream_next <= last:
+            chunk = next(self._stream, None)
+            if chunk is None:
+                self._block_count = self._stream_next
+                self._stream = None
+                break
+            if self._stream_next >= first and self._stream_next not in self.cache:
+                block = bytes(chunk)
+                self.cache.put(self._stream_next, block)
+                if self._stream_next == first:
+                    loaded = block
+            self._stream_next += 1
+        return loaded
+
+    def read_block(self, number: int) -> bytes:
+        """Декодированный блок с номером number; за концом данных — пустой блок."""
+        if self._block_count is not None and number >= self._block_count:
+            return b''
+        sequential = number == self._last_block + 1
+        self._last_block = number
+        block = self.cache.get(number)
+        if block is None:
+            block = self._load(number, number + (self.read_ahead if sequential else 0))
+            if block is None:
+                return b''
+        elif sequential and self.read_ahead and number + self.read_ahead not in self.cache:
+            self._load(number + 1, number + self.read_ahead)
+        return block
+
+    def read_range(self, offset: int, size: int) -> bytes:
+        result = bytearray()
+        number = offset // self.block_size
+        skip = offset % self.block_size
+        while len(result) < size:
+            block = self.read_block(number)
+            if not block:
+                break
+            result += block[skip:skip + size - len(result)]
+            skip = 0
+            number += 1
+        return bytes(result)
+
+    def read_chunks(self) -> Iterator[Buffer]:
+        number = 0
+        while block := self.read_block(number):
+            yield block
+            number += 1
+
+
+async def aiterate(chunks: Iterable[Buffer]) -> AsyncIterator[Buffer]:
+    for chunk in chunks:
+        yield chunk
+
+
+def _next_copy(iterator: Iterator[Buffer]) -> Optional[bytes]:
+    """Следующий кусок синхронного потока в виде собственной копии или None в конце потока."""
+    chunk = next(iterator, None)
+    return None if chunk is None else bytes(chunk)
+
+
+class AsyncDataSource:
+    """
+    Асинхронный двойник DataSource: куски приходят и уходят асинхронными итераторами,
+    а блокирующий ввод-вывод и тяжёлые вычисления не останавливают цикл событий.
+    Между await успевают поработать другие задачи, поэтому здесь куски всегда принадлежат получателю:
+    представления переиспользуемых буферов наружу не отдаются.
+    """
+
+    async def awrite_data(self, data: Buffer) -> None:
+        await self.awrite_chunks(aiterate((data,)))
+
+    async def aread_data(self) -> bytearray:
+        data = bytearray()
+        async for chunk in self.aread_chunks():
+            data += chunk
+        return data
+
+    async def awrite_chunks(self, chunks: AsyncIterable[Buffer]) -> None:
+        pass
+
+    def aread_chunks(self) -> AsyncIterator[Buffer]:
+        return aiterate(())
+
+
+class AsyncFileDataSource(AsyncDataSource):
+    """Файловый компонент для асинхронного стека: каждая операция с файлом выполняется в пуле потоков."""
+
+    def __init__(self, filename: str, buffer_size: int = DEFAULT_CHUNK_SIZE, executor: Optional[Executor] = None) -> None:
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.executor = executor
+
+    async def awrite_chunks(self, chunks: AsyncIterable[Buffer]) -> None:
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(self.executor, open, self.filename, 'wb')
+        try:
+            async for chunk in chunks:
+                await loop.run_in_executor(self.executor, file.write, chunk)
+        finally:
+            await loop.run_in_executor(self.executor, file.close)
+
+    async def aread_chunks(self) -> AsyncIterator[Buffer]:
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(self.executor, open, self.filename, 'rb')
+        try:
+            while chunk := await loop.run_in_executor(self.executor, file.read, self.buffer_size):
+                yield chunk
+        finally:
+            await loop.run_in_executor(self.executor, file.close)
+
+
+class AsyncDataSourceDecorator(AsyncDataSource):
+    """
+    Родитель асинхронных декораторов. Преобразование данных берётся у обычного синхронного декоратора layer:
+    его кодек шагает по одному куску, и крупные куски (от OFFLOAD_THRESHOLD байт) обрабатываются в пуле потоков.
+    Поток не занимается на всё время передачи, поэтому тысячи потоков данных делят один небольшой пул.
+    """
+    OFFLOAD_THRESHOLD = 16 * 1024
+
+    def __init__(self, source: AsyncDataSource, layer: Optional[DataSourceDecorator] = None,
+                 executor: Optional[Executor] = None) -> None:
+        self.wrapper = source
+        self.layer = layer
+        self.executor = executor
+
+    def encoder(self) -> ChunkCodec:
+        return self.layer.encoder() if self.layer is not None else ChunkCodec()
+
+    def decoder(self) -> ChunkCodec:
+        return self.layer.decoder() if self.layer is not None else ChunkCodec()
+
+    async def awrite_chunks(self, chunks: AsyncIterable[Buffer]) -> None:
+        await self.wrapper.awrite_chunks(self.aencode(chunks))
+
+    def aread_chunks(self) -> AsyncIterator[Buffer]:
+        return self.adecode(self.wrapper.aread_chunks())
+
+    def aencode(self, chunks: AsyncIterable[Buffer]) -> AsyncIterator[Buffer]:
+        return self._run(self.encoder(), chunks)
+
+    def adecode(self, chunks: AsyncIterable[Buffer]) -> AsyncIterator[Buffer]:
+        return self._run(self.decoder(), chunks)
+
+    async def _run(self, codec: ChunkCodec, chunks: AsyncIterable[Buffer]) -> AsyncIterator[Buffer]:
+        try:
+            async for chunk in chunks:
+                for piece in await self._step(codec.update, chunk):
+                    yield piece
+            for piece in await self._step(codec.flush):
+                yield piece
+        finally:
+            # Брошенное чтение закрывает нижний поток сразу, а не когда до него доберётся сборщик мусора
+            aclose = getattr(chunks, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+
+    async def _step(self, step: Callable[..., Iterator[Buffer]], *args: Buffer) -> List[bytes]:
+        def run() -> List[bytes]:
+            return [bytes(piece) for piece in step(*args)]
+
+        if args and len(args[0]) < self.OFFLOAD_THRESHOLD:
+            return run()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
+
+class AsyncDataSourceAdapter(AsyncDataSource):
+    """
+    Адаптер синхронного компонента к асинхронному интерфейсу.
+    Чтение шагает по синхронному потоку в пуле потоков. Запись синхронному компоненту нужно отдать
+    как итератор, который он сам тянет, поэтому на время записи она занимает поток пула write_executor
+    (по умолчанию общего для всех адаптеров), а куски передаются ей через очередь не длиннее queue_size.
+    Пул записей отделён от executor: долгие записи не должны занимать потоки, в которых шагают кодеки
+    вышестоящих слоёв, иначе запись ждала бы данных, которые некому закодировать.
+    """
+    _writers: Optional[ThreadPoolExecutor] = None
+    _writers_lock = threading.Lock()
+
+    def __init__(self, source: DataSource, executor: Optional[Executor] = None, queue_size: int = 4,
+                 write_executor: Optional[Executor] = None) -> None:
+        self.source = source
+        self.executor = executor
+        self.queue_size = queue_size
+        self.write_executor = write_executor
+
+    @classmethod
+    def shared_writers(cls) -> Executor:
+        with cls._writers_lock:
+            if cls._writers is None:
+                cls._writers = ThreadPoolExecutor(thread_name_prefix='AsyncDataSourceAdapter')
+            return cls._writers
+
+    async def aread_chunks(self) -> AsyncIterator[Buffer]:
+        loop = asyncio.get_running_loop()
+        iterator = iter(self.source.read_chunks())
+        while (chunk := await loop.run_in_executor(self.executor, _next_copy, iterator)) is not None:
+            yield chunk
+
+    async def awrite_chunks(self, chunks: AsyncIterable[Buffer]) -> None:
+        loop = asyncio.get_running_loop()
+        inbox: queue.SimpleQueue = queue.SimpleQueue()
+        # Места в очереди считаются на стороне цикла событий: отправитель ждёт их, не занимая поток пула
+        slots = asyncio.Semaphore(self.queue_size)
+        end = object()
+
+        def feed() -> Iterator[Buffer]:
+            while (chunk := inbox.get()) is not end:
+                loop.call_soon_threadsafe(slots.release)
+                yield chunk
+
+        writer = loop.run_in_executor(self.write_executor or self.shared_writers(), self.source.write_chunks, feed())
+        try:
+            async for chunk in chunks:
+                if slots.locked():
+                    acquire = asyncio.ensure_future(slots.acquire())
+                    await asyncio.wait((acquire, writer), return_when=asyncio.FIRST_COMPLETED)
+                    if not acquire.done():
+                        # Запись оборвалась и больше ничего не заберёт
+                        acquire.cancel()
+                        break
+                else:
+                    await slots.acquire()
+                inbox.put(bytes(chunk))
+        finally:
+            inbox.put(end)
+        await writer
+
+
+class SyncDataSourceAdapter(DataSource):
+    """Обратный адаптер: даёт синхронному коду работать с асинхронным компонентом, чей цикл событий крутится в другом потоке."""
+
+    def __init__(self, source: AsyncDataSource, loop: asyncio.AbstractEventLoop) -> None:
+        self.source = source
+        self.loop = loop
+
+    async def _feed(self, chunks: Iterable[Buffer]) -> AsyncIterator[Buffer]:
+        loop = asyncio.get_running_loop()
+        iterator = iter(chunks)
+        while (chunk := await loop.run_in_executor(None, _next_copy, iterator)) is not None:
+            yield chunk
+
+    def write_chunks(self, chunks: Iterable[Buffer]) -> None:
+        asyncio.run_coroutine_threadsafe(self.source.awrite_chunks(self._feed(chunks)), self.loop).result()
+
+    def read_chunks(self) -> Iterator[Buffer]:
+        chunks = self.source.aread_chunks()
+        try:
+            while True:
+                try:
+                    chunk = asyncio.run_coroutine_threadsafe(chunks.__anext__(), self.loop).result()
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            asyncio.run_coroutine_threadsafe(chunks.aclose(), self.loop).result()
+
+
+def _codec_only(layer: DataSource) -> bool:
+    """
+    Меняет ли декоратор данные только через encoder/decoder. Лишь такие слои можно перенести в асинхронный стек,
+    остальное (свои encode/decode, write_chunks, write_data...) умеет только синхронный путь.
+    """
+    return isinstance(layer, DataSourceDecorator) and all(
+        getattr(type(layer), name) is getattr(DataSourceDecorator, name)
+        for name in ('write_data', 'read_data', 'write_chunks', 'read_chunks', 'target', 'encode', 'decode'))
+
+
+def to_async(source: DataSource, executor: Optional[Executor] = None) -> AsyncDataSource:
+    """
+    Строит асинхронный двойник готового синхронного стека. Декораторы, которые только преобразуют данные
+    кодеками, переиспользуются через них, FileDataSource заменяется на AsyncFileDataSource,
+    а всё остальное (например, CachingDataSource, FramedPipeline или слой со своими encode/decode)
+    вместе со всем, что под ним, оборачивается в AsyncDataSourceAdapter и работает синхронно в пуле.
+    """
+    layers: List[DataSourceDecorator] = []
+    while _codec_only(source):
+        if not source.is_pass_through():
+            layers.append(source)
+        source = source.wrapper
+    if isinstance(source, FileDataSource):
+        result: AsyncDataSource = AsyncFileDataSource(source.filename, source.buffer_size, executor)
+    else:
+        result = AsyncDataSourceAdapter(source, executor)
+    for layer in reversed(layers):
+        result = AsyncDataSourceDecorator(result, layer, executor)
+    return result
+
+
+def payload_pool(size: int) -> bytes:
+    """Пул сжимаемых примерно вдвое данных (hex случайных байт), из которого нарезается синтетическая нагрузка."""
+    return os.urandom(size // 2 + 1).hex().encode()[:size]
+
+
+def synthetic_payload(size: int, chunk_size: int, pool: bytes) -> Iterator[bytes]:
+    """Поток из size байт, нарезанный из пула. Пул больше окна сжатия, поэтому повторы не упрощают сжатие."""
+    for offset in range(0, size, chunk_size):
+        start = offset % (len(pool) - chunk_size)
+        yield pool[start:start + min(chunk_size, size - offset)]
+
+
+def benchmark_compression(size_mb: int = 64, chunk_sizes: Sequence[int] = (16 * 1024, 64 * 1024, 1024 * 1024),
+                          levels: Dict[str, Sequence[int]] = None) -> None:
+    """
+    Пропускная способность (МБ/с) записи и чтения через CompressionDecorator поверх файла
+    и пиковая память Python-объектов (tracemalloc) для разных размеров кусков и уровней сжатия.
+    """
+    levels = levels or {'zlib': (1, 6, 9), 'lzma': (0,)}
+    size = size_mb * 1024 * 1024
+    # Пул создаётся до замеров памяти: в пике должна учитываться только память конвейера
+    pool = payload_pool(16 * 1024 * 1024 + max(chunk_sizes))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payload.bin')
+        print(f'{"метод":>6} {"ур.":>3} {"кусок":>8} {"запись МБ/с":>12} {"чтение МБ/с":>12} '
+              f'{"пик, КБ":>9} {"сжато, МБ":>10}')
+        for method, method_levels in levels.items():
+            for level in method_levels:
+                for chunk_size in chunk_sizes:
+                    source = CompressionDecorator(FileDataSource(path, buffer_size=chunk_size),
+                                                  method=method, level=level, chunk_size=chunk_size)
+                    tracemalloc.start()
+                    started = perf_counter()
+                    source.write_chunks(synthetic_payload(size, chunk_size, pool))
+                    write_time = perf_counter() - started
+                    started = perf_counter()
+                    read = sum(len(chunk) for chunk in source.read_chunks())
+                    read_time = perf_counter() - started
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    assert read == size
+                    print(f'{method:>6} {level:>3} {chunk_size // 1024:>6}КБ {size_mb / write_time:>12.1f} '
+                          f'{size_mb / read_time:>12.1f} {peak // 1024:>9} '
+                          f'{os.path.getsize(path) / 1024 / 1024:>10.1f}')
+
+
+def benchmark_pipeline(size_mb: int = 128, frame_size: int = 1024 * 1024,
+                       workers: Sequence[int] = None) -> None:
+    """
+    МБ/с записи и чтения стека Compression -> Encrypted -> File: последовательный потоковый режим
+    против FramedPipeline на пуле потоков и процессов с разным числом исполнителей.
+    """
+    cpus = os.cpu_count() or 1
+    workers = workers or sorted({1, 2, 4, cpus})
+    size = size_mb * 1024 * 1024
+    pool = payload_pool(16 * 1024 * 1024 + frame_size)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payload.bin')
+
+        def stack() -> DataSource:
+            return CompressionDecorator(EncryptedDataSource(FileDataSource(path), key=b'secret'), level=6)
+
+        def measure(source: DataSource) -> Tuple[float, float]:
+            started = perf_counter()
+            source.write_chunks(synthetic_payload(size, frame_size, pool))
+            write_time = perf_counter() - started
+            started = perf_counter()
+            assert sum(len(chunk) for chunk in source.read_chunks()) == size
+            return size_mb / write_time, size_mb / (perf_counter() - started)
+
+        print(f'Ядер: {cpus}, объём: {size_mb} МБ, кадр: {frame_size // 1024} КБ')
+        print(f'{"режим":>22} {"запись МБ/с":>12} {"чтение МБ/с":>12}')
+        write_speed, read_speed = measure(stack())
+        print(f'{"последовательно":>22} {write_speed:>12.1f} {read_speed:>12.1f}')
+        for use_processes in (False, True):
+            for count in workers:
+                pipeline = FramedPipeline(stack(), frame_size=frame_size, workers=count, use_processes=use_processes)
+                write_speed, read_speed = measure(pipeline)
+                mode = f'{"процессы" if use_processes else "потоки"} x{count}'
+                print(f'{mode:>22} {write_speed:>12.1f} {read_speed:>12.1f}')
+
+
+def benchmark_buffers(writes: int = 20_000, write_size: int = 100, stream_mb: int = 32) -> None:
+    """
+    Два стека по пять декораторов над MemoryDataSource: смешанный (три чистые обёртки, шифрование, сжатие)
+    и только из чистых обёрток. Для каждого — задержка коротких записей со слиянием обёрток и без него,
+    а также пиковая временная память (tracemalloc) на МБ при потоковой записи.
+    """
+    payload = os.urandom(write_size)
+    pool = payload_pool(16 * 1024 * 1024 + DEFAULT_CHUNK_SIZE)
+
+    def mixed(fuse: bool) -> DataSource:
+        source: DataSource = DataSourceDecorator(DataSourceDecorator(MemoryDataSource(), fuse), fuse)
+        source = CompressionDecorator(EncryptedDataSource(source, key=b'secret', fuse=fuse), level=1, fuse=fuse)
+        return DataSourceDecorator(source, fuse)
+
+    def wrappers_only(fuse: bool) -> DataSource:
+        source: DataSource = MemoryDataSource()
+        for _ in range(5):
+            source = DataSourceDecorator(source, fuse)
+        return source
+
+    print(f'{"стек":>28} {"мкс/запись":>11} {"пик КБ/МБ":>10}')
+    for name, build in (('смешанный', mixed), ('чистые обёртки', wrappers_only)):
+        for fuse in (False, True):
+            source = build(fuse)
+            started = perf_counter()
+            for _ in range(writes):
+                source.write_data(payload)
+            latency = (perf_counter() - started) / writes * 1_000_000
+
+            tracemalloc.start()
+            source.write_chunks(synthetic_payload(stream_mb * 1024 * 1024, DEFAULT_CHUNK_SIZE, pool))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # Приёмник хранит результат целиком, поэтому его размер вычитаем из пика
+            sink = source
+            while isinstance(sink, DataSourceDecorator):
+                sink = sink.wrapper
+            transient = max(peak - len(sink.buffer), 0)
+            mode = f'{name}, {"со слиянием" if fuse else "без слияния"}'
+            print(f'{mode:>28} {latency:>11.2f} {transient / 1024 / stream_mb:>10.1f}')
+
+
+def benchmark_cache(size_mb: int = 64, frame_size: int = 256 * 1024, reads: int = 20_000, read_size: int = 4096,
+                    capacity_mb: int = 16, zipf_s: float = 1.1) -> None:
+    """
+    Чтение горячих участков со Zipf-распределением по кадрам через FramedPipeline(Compression -> Encrypted -> File):
+    без кеша, с LRU и с ARC. Каждые reads // 4 обращений вклинивается полное последовательное сканирование,
+    которое вымывает LRU, но почти не трогает горячие блоки в ARC.
+    """
+    size = size_mb * 1024 * 1024
+    frames = size // frame_size
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) ** zipf_s for rank in range(frames)]
+    order = list(range(frames))
+    rng.shuffle(order)
+    targets = rng.choices(order, weights=weights, k=reads)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payload.bin')
+        pipeline = FramedPipeline(CompressionDecorator(EncryptedDataSource(FileDataSource(path), key=b'secret')),
+                                  frame_size=frame_size)
+        pipeline.write_chunks(synthetic_payload(size, frame_size, payload_pool(16 * 1024 * 1024 + frame_size)))
+
+        print(f'{"кеш":>6} {"время, с":>9} {"чтений/с":>10} {"попадания":>10} {"вытеснения":>11}')
+        for policy in (None, 'lru', 'arc'):
+            source = pipeline if policy is None else CachingDataSource(
+                pipeline, capacity_bytes=capacity_mb * 1024 * 1024, policy=policy, read_ahead=0)
+            started = perf_counter()
+            for number, frame in enumerate(targets):
+                if number and number % (reads // 4) == 0:
+                    for _ in source.read_chunks():
+                        pass
+                local = rng.randrange(frame_size - read_size)
+                if policy is None:
+                    pipeline.read_frame(frame)[local:local + read_size]
+                else:
+                    source.read_range(frame * frame_size + local, read_size)
+            elapsed = perf_counter() - started
+            stats = source.stats if policy else {'hit_rate': 0.0, 'evictions': 0}
+            print(f'{policy or "нет":>6} {elapsed:>9.2f} {reads / elapsed:>10.0f} '
+                  f'{stats["hit_rate"]:>10.1%} {stats["evictions"]:>11}')
+
+
+def benchmark_async(streams: int = 256, stream_kb: int = 512, workers: Optional[int] = None) -> None:
+    """
+    Одновременная запись и чтение streams потоков данных через Compression -> Encrypted -> File:
+    все на одном цикле событий с общим небольшим пулом потоков против отдельного потока на каждый поток данных.
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    size = stream_kb * 1024
+    pool = payload_pool(16 * 1024 * 1024 + DEFAULT_CHUNK_SIZE)
+    total_mb = streams * stream_kb / 1024
+    with tempfile.TemporaryDirectory() as directory:
+        def stack(number: int) -> DataSource:
+            path = os.path.join(directory, f'stream{number}.bin')
+            return CompressionDecorator(EncryptedDataSource(FileDataSource(path), key=b'secret'), level=1)
+
+        def run_sync(number: int) -> None:
+            source = stack(number)
+            source.write_chunks(synthetic_payload(size, DEFAULT_CHUNK_SIZE, pool))
+            for _ in source.read_chunks():
+                pass
+
+        started = perf_counter()
+        threads = [threading.Thread(target=run_sync, args=(number,)) for number in range(streams)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        threaded_time = perf_counter() - started
+
+        async def run_async(source: AsyncDataSource) -> None:
+            await source.awrite_chunks(aiterate(synthetic_payload(size, DEFAULT_CHUNK_SIZE, pool)))
+            async for _ in source.aread_chunks():
+                pass
+
+        async def run_all() -> None:
+            with ThreadPoolExecutor(workers) as executor:
+                await asyncio.gather(*(run_async(to_async(stack(number), executor)) for number in range(streams)))
+
+        started = perf_counter()
+        asyncio.run(run_all())
+        async_time = perf_counter() - started
+
+    print(f'Потоков данных: {streams} по {stream_kb} КБ')
+    print(f'{"режим":>26} {"потоков ОС":>11} {"время, с":>9} {"МБ/с":>8}')
+    print(f'{"поток на поток данных":>26} {streams:>11} {threaded_time:>9.2f} {total_mb * 2 / threaded_time:>8.1f}')
+    print(f'{"один цикл событий":>26} {workers + 1:>11} {async_time:>9.2f} {total_mb * 2 / async_time:>8.1f}')
+
+
+def demo(directory: str) -> None:
+    file_data_source = FileDataSource(os.path.join(directory, 'example.txt'))
+
+    encrypted_data_source = EncryptedDataSource(file_data_source, key=b'secret')
 
     compressed_and_encrypted_data_source = CompressionDecorator(encrypted_data_source)
 
     print("Используем FileDataSource:")
-    file_data_source.write_data("Hello, World!")
-    file_data_source.read_data()
+    file_data_source.write_data(b"Hello, World!")
+    print(file_data_source.read_data().decode())
 
     print("Используем EncryptedDataSource:")
-    encrypted_data_source.write_data("Hello, World!")
-    encrypted_data_source.read_data()
+    encrypted_data_source.write_data(b"Hello, World!")
+    print(encrypted_data_source.read_data().decode())
 
     print("Используем CompressionDecorator поверх EncryptedDataSource:")
-    compressed_and_encrypted_data_source.write_data("Hello, World!")
-    compressed_and_encrypted_data_source.read_data()
+    compressed_and_encrypted_data_source.write_data(b"Hello, World!")
+    print(compressed_and_encrypted_data_source.read_data().decode())
+
+
+if __name__ == '__main__':
+    if 'bench' in sys.argv[1:]:
+        benchmark_compression()
+        benchmark_pipeline()
+        benchmark_buffers()
+        benchmark_cache()
+        benchmark_async()
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            demo(tmp)
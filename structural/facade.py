@@ -10,6 +10,23 @@
 системе и отделу доставки.
 """
 
+import hashlib
+import mmap
+import os
+import queue
+import sys
+import tempfile
+import threading
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from time import perf_counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Type
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Метка, на месте которой в текстовом результате этапа стоят его входные данные
+CONTENT = '\0'
+
 """Классы сложного стороннего фреймворка конвертации видео. Мы не контролируем этот код, поэтому не можем его упростить"""
 
 
@@ -46,42 +63,614 @@ class BitrateReader:
     def convert(buffer, destination_codec):
         return f"converted {buffer} to {destination_codec.codec_type}"
 
+    @staticmethod
+    def read_chunks(filename, source_code, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Потоковое чтение: файл отдаётся кусками по chunk_size байт, а не одним буфером."""
+        try:
+            file = open(filename, 'rb')
+        except FileNotFoundError:
+            # Учебные примеры конвертируют файлы, которых нет на диске: буфером служит то, что вернул бы read
+            yield BitrateReader.read(filename, source_code).encode()
+            return
+        with file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    @staticmethod
+    def convert_chunks(chunks, destination_codec):
+        return wrap_chunks(chunks, BitrateReader.convert(CONTENT, destination_codec))
+
 
 class AudioMixer:
     @staticmethod
     def fix(result):
         return f"fixed audio in {result}"
 
+    @staticmethod
+    def fix_chunks(chunks):
+        return wrap_chunks(chunks, AudioMixer.fix(CONTENT))
+
+
+def wrap_chunks(chunks, template: str):
+    """
+    Потоковый вариант строкового этапа: template — его результат для входа CONTENT. Текст до и после метки
+    отдаётся отдельными кусками, а сами куски проходят без копирования, поэтому итог совпадает со строковым этапом.
+    """
+    prefix, suffix = template.encode().split(CONTENT.encode())
+    if prefix:
+        yield prefix
+    yield from chunks
+    if suffix:
+        yield suffix
+
 
 class File:
     def __init__(self, data):
         self.data = data
 
     def save(self):
-        print(f"Saving file with data: {self.data}")
+        data = self.data
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode(errors='replace')
+        print(f"Saving file with data: {data}")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StreamFile:
+    """Результат потоковой конвертации: данные не лежат в памяти целиком, а записываются кусками при save."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def save(self, path):
+        written = 0
+        with open(path, 'wb') as file:
+            for chunk in self.chunks:
+                file.write(chunk)
+                written += len(chunk)
+        return written
 
 
 """Вместо этого мы создаём Фасад — простой интерфейс для работы со сложным фреймворком. Фасад не имеет всей функциональности 
 фреймворка, но зато скрывает его сложность от клиентов."""
 
 
+class CachedFile(File):
+    """
+    Результат, загруженный из кеша конвертаций. Файл кеша отображается в память, поэтому
+    buffer доступен без чтения с диска целиком; data декодируется лишь при обращении.
+    Отображение держит дескриптор, поэтому результат закрывают через close или with.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def data(self):
+        return self.buffer[:]
+
+    def close(self):
+        self.buffer.close()
+
+    def __reduce__(self):
+        # Отображение в память не передать в другой процесс, поэтому туда уходит обычный File
+        return File, (self.data,)
+
+
+class CodecProber:
+    """
+    Определяет кодек по заголовку контейнера, а не по расширению имени.
+    Читаются только первые PROBE_SIZE байт через отображение в память. Результат кешируется по пути,
+    размеру и mtime, поэтому повторная проверка неизменённого файла не трогает его содержимое.
+    Если файла нет или заголовок не распознан, используется догадка CodecFactory по расширению.
+    """
+    PROBE_SIZE = 4096
+
+    def __init__(self, max_entries: int = 65536):
+        self.max_entries = max_entries
+        self._probes: 'OrderedDict[str, Tuple[int, int, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Блокировку нельзя передать в другой процесс, поэтому в пул уходит пустой кеш проб
+        return {'max_entries': self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(state['max_entries'])
+
+    @staticmethod
+    def sniff(header: bytes) -> Optional[str]:
+        if header.startswith(b'OggS'):
+            return 'ogg'
+        # Контейнер ISO BMFF (mp4) начинается с размера бокса и его типа ftyp
+        if header[4:8] == b'ftyp':
+            return 'mp4'
+        return None
+
+    def probe(self, filename: str) -> str:
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return CodecFactory.extract(VideoFile(filename))
+        path = os.path.abspath(filename)
+        with self._lock:
+            cached = self._probes.get(path)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                self._probes.move_to_end(path)
+                return cached[2]
+
+        codec = None
+        if stat.st_size:
+            with open(filename, 'rb') as file:
+                with mmap.mmap(file.fileno(), min(stat.st_size, self.PROBE_SIZE), access=mmap.ACCESS_READ) as header:
+                    codec = self.sniff(header[:])
+        codec = codec or CodecFactory.extract(VideoFile(filename))
+
+        with self._lock:
+            self._probes[path] = (stat.st_size, stat.st_mtime_ns, codec)
+            if len(self._probes) > self.max_entries:
+                self._probes.popitem(last=False)
+        return codec
+
+
+class ConversionCache:
+    """
+    Дисковый кеш результатов конвертации с адресацией по содержимому.
+    Ключ — хеш содержимого входного файла, целевой кодек и версия конвейера. Чтобы не хешировать
+    большой файл при каждом обращении, запоминается соответствие путь + размер + mtime -> хеш содержимого.
+    Запись атомарна (временный файл + os.replace), поэтому параллельные конвертеры, в том числе
+    в других процессах, не видят недописанных записей. При превышении max_bytes вытесняются записи,
+    к которым дольше всего не обращались (время обращения хранится в mtime записи).
+    Имя записи начинается с хеша содержимого, поэтому вместе с последней записью для содержимого
+    из fast/ уходят и указывающие на него соответствия путь -> хеш.
+    """
+    HASH_BLOCK = 1024 * 1024
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.objects = os.path.join(directory, 'objects')
+        self.fast = os.path.join(directory, 'fast')
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.fast, exist_ok=True)
+
+    def _atomic_write(self, path: str, chunks: Iterable[bytes]) -> None:
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def content_hash(self, filename: str) -> str:
+        """
+        Хеш содержимого входного файла. Для файла, которого нет на диске (как в учебных примерах),
+        хешируется само имя: читатель получает на вход только его.
+        """
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return hashlib.sha256(f'name:{filename}'.encode()).hexdigest()
+
+        fast_key = hashlib.sha256(f'{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}'.encode()).hexdigest()
+        fast_path = os.path.join(self.fast, fast_key)
+        try:
+            with open(fast_path) as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as file:
+            while block := file.read(self.HASH_BLOCK):
+                digest.update(block)
+        content = digest.hexdigest()
+        self._atomic_write(fast_path, (content.encode(),))
+        return content
+
+    def key(self, filename: str, codec_type: str, version: str) -> str:
+        variant = hashlib.sha256(f'{codec_type}|{version}'.encode()).hexdigest()
+        return f'{self.content_hash(filename)}-{variant}'
+
+    def get(self, key: str) -> Optional[CachedFile]:
+        path = os.path.join(self.objects, key)
+        try:
+            result = CachedFile(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # Записи нет, её только что вытеснили или она пустая (mmap не отображает пустые файлы)
+            return None
+        return result
+
+    def put(self, key: str, chunks: Iterable[bytes]) -> Optional[CachedFile]:
+        """
+        Записывает результат кусками, не собирая его в памяти. Возвращает запись, отображённую до вытеснения,
+        так что её можно прочитать, даже если она сама превысила max_bytes; для пустого результата — None.
+        """
+        path = os.path.join(self.objects, key)
+        self._atomic_write(path, chunks)
+        try:
+            result: Optional[CachedFile] = CachedFile(path)
+        except ValueError:
+            result = None
+        self.evict()
+        return result
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.objects) as scan:
+            for entry in scan:
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self._prune_fast({os.path.basename(path).partition('-')[0] for _, _, path in entries[evicted:]})
+
+    def _prune_fast(self, alive: Set[str]) -> None:
+        """
+        Удаляет соответствия путь -> хеш, для содержимого которых не осталось записей.
+        Соответствие, которое другой конвертер записал перед своим put, тоже может уйти: тогда файл просто
+        захешируется заново.
+        """
+        with os.scandir(self.fast) as scan:
+            for entry in scan:
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    with open(entry.path) as file:
+                        if file.read() not in alive:
+                            os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+
+
+class ConversionResult(NamedTuple):
+    """Итог конвертации одного файла в пакетном режиме. При ошибке file равен None, а error содержит её описание."""
+    filename: str
+    file: Optional[File]
+    seconds: float
+    error: Optional[str] = None
+
+
 class VideoConvertor:
-    def convert(self, filename, file_format):
-        file = VideoFile(filename)
-        source_code = CodecFactory.extract(file)
+    # Меняется при любом изменении конвейера, которое меняет результат, и тем самым сбрасывает кеш
+    PIPELINE_VERSION = 3
 
-        if file == 'mp4':
-            destination_codec = MPEG4CompressionCodec()
-        else:
-            destination_codec = OggCompressionCodec()
+    def __init__(self, reader: Type[BitrateReader] = BitrateReader, cache: Optional[ConversionCache] = None,
+                 prober: Optional[CodecProber] = None):
+        self.reader = reader
+        self.cache = cache
+        self.prober = prober or CodecProber()
+
+    @staticmethod
+    def destination_codec(file_format):
+        if file_format == 'mp4':
+            return MPEG4CompressionCodec()
+        if file_format == 'ogg':
+            return OggCompressionCodec()
+        raise ValueError(f'unsupported file format: {file_format!r}')
+
+    def convert(self, filename, file_format, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Конвертирует файл через те же потоковые этапы, что и convert_stream. В памяти собирается только
+        итог, а с кешем не собирается и он: куски пишутся прямо в запись кеша, и результат отображается из неё.
+        """
+        source_code = self.prober.probe(filename)
+        destination_codec = self.destination_codec(file_format)
+
+        # Файл уже в нужном формате: конвертировать и чинить звук незачем
+        if source_code == destination_codec.codec_type:
+            return File(b''.join(self.reader.read_chunks(filename, source_code, chunk_size)))
+
+        key = None
+        if self.cache is not None:
+            version = f'{self.PIPELINE_VERSION}:{self.reader.__module__}.{self.reader.__qualname__}'
+            key = self.cache.key(filename, destination_codec.codec_type, version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        stages = self._stages(filename, source_code, destination_codec, chunk_size)
+        try:
+            if key is None:
+                return File(b''.join(stages[-1]))
+            return self.cache.put(key, stages[-1]) or File(b'')
+        finally:
+            close_stages(stages)
+
+    def _stages(self, filename: str, source_code: str, destination_codec, chunk_size: int,
+                threaded: bool = False, queue_size: int = 4) -> List[Iterator[bytes]]:
+        """
+        Этапы read -> convert -> fix от первого к последнему; результат отдаёт последний.
+        С threaded=True за каждым этапом стоит staged, который перебирает его в своём потоке.
+        """
+        stages: List[Iterator[bytes]] = []
+
+        def add(stage: Iterator[bytes]) -> None:
+            stages.append(stage)
+            if threaded:
+                stages.append(staged(stage, queue_size))
+
+        add(self.reader.read_chunks(filename, source_code, chunk_size))
+        if source_code != destination_codec.codec_type:
+            add(self.reader.convert_chunks(stages[-1], destination_codec))
+            add(AudioMixer.fix_chunks(stages[-1]))
+        return stages
+
+    def convert_stream(self, filename: str, file_format: str, output_path: str,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, threaded: bool = False, queue_size: int = 4) -> int:
+        """
+        Потоковая конвертация: куски по chunk_size байт идут через read -> convert -> fix -> save,
+        и ни на одном этапе файл не собирается в памяти целиком. С threaded=True каждый этап работает
+        в своём потоке, а между этапами стоят очереди на queue_size кусков, так что в памяти одновременно
+        не больше нескольких кусков. Возвращает число записанных байт.
+        """
+        source_code = self.prober.probe(filename)
+        destination_codec = self.destination_codec(file_format)
+        stages = self._stages(filename, source_code, destination_codec, chunk_size, threaded, queue_size)
+        try:
+            return StreamFile(stages[-1]).save(output_path)
+        finally:
+            close_stages(stages)
+
+    def convert_many(self, filenames: Iterable[str], file_format: str, workers: Optional[int] = None,
+                     max_in_flight: Optional[int] = None,
+                     cancel: Optional[threading.Event] = None) -> Iterator[ConversionResult]:
+        """
+        Пакетная конвертация на пуле процессов. Результаты отдаются по мере готовности, а не в порядке filenames.
+        Одновременно в работе не больше max_in_flight файлов, поэтому память не растёт с размером пакета.
+        Установленный cancel (или прекращение перебора результатов) отменяет ещё не начатые конвертации.
+        """
+        workers = workers or os.cpu_count() or 1
+        max_in_flight = max_in_flight or workers * 2
+        names = iter(filenames)
+        pending: Set[Future] = set()
+        executor = ProcessPoolExecutor(workers)
+        try:
+            while True:
+                while len(pending) < max_in_flight and not (cancel and cancel.is_set()):
+                    filename = next(names, None)
+                    if filename is None:
+                        break
+                    pending.add(executor.submit(timed_convert, self, filename, file_format))
+                if not pending:
+                    return
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                if cancel and cancel.is_set():
+                    for future in pending:
+                        future.cancel()
+                    pending = {future for future in pending if not future.cancelled()}
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def staged(chunks: Iterator[bytes], queue_size: int) -> Iterator[bytes]:
+    """
+    Переносит перебор chunks в отдельный поток и отдаёт куски через ограниченную очередь.
+    Если получатель бросит перебор, поток-производитель останавливается и закрывает chunks,
+    а закрытие самого staged дожидается этого. Ошибка производителя пробрасывается получателю.
+    """
+    channel: queue.Queue = queue.Queue(queue_size)
+    stop = threading.Event()
+    end = object()
+
+    def send(item) -> bool:
+        while not stop.is_set():
+            try:
+                channel.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                if not send(chunk):
+                    return
+        except BaseException as error:
+            send(error)
+            return
+        finally:
+            # Генератор закрывается в том же потоке, который его перебирал
+            chunks.close()
+        send(end)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (item := channel.get()) is not end:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def close_stages(stages: List[Iterator[bytes]]) -> None:
+    """Закрывает этапы конвейера от последнего к первому, не дожидаясь сборщика мусора."""
+    for stage in reversed(stages):
+        stage.close()
 
-        buffer = BitrateReader.read(filename, source_code)
-        result = BitrateReader.convert(buffer, destination_codec)
-        result = AudioMixer.fix(result)
-        return File(result)
+
+def timed_convert(convertor: VideoConvertor, filename: str, file_format: str) -> ConversionResult:
+    """Выполняется в процессе пула: конвертирует один файл и замеряет время. Ошибка не обрывает весь пакет."""
+    started = perf_counter()
+    try:
+        file = convertor.convert(filename, file_format)
+    except Exception as error:
+        return ConversionResult(filename, None, perf_counter() - started, repr(error))
+    return ConversionResult(filename, file, perf_counter() - started)
+
+
+class CPUBoundBitrateReader(BitrateReader):
+    """Синтетический декодер для замеров: convert_chunks честно нагружает процессор на work шагов."""
+    work = 2_000_000
+
+    @classmethod
+    def convert_chunks(cls, chunks, destination_codec):
+        checksum = 0
+        for step in range(cls.work):
+            checksum = (checksum * 31 + step) & 0xFFFFFFFF
+        yield from wrap_chunks(chunks, f"{BitrateReader.convert(CONTENT, destination_codec)} ({checksum})")
+
+
+class SyntheticBitrateReader(BitrateReader):
+    """Источник для замеров: вместо чтения с диска отдаёт size байт синтетических данных."""
+    size = 2 * 1024 * 1024 * 1024
+
+    @classmethod
+    def read_chunks(cls, filename, source_code, chunk_size=DEFAULT_CHUNK_SIZE):
+        block = os.urandom(chunk_size)
+        for offset in range(0, cls.size, chunk_size):
+            yield block[:min(chunk_size, cls.size - offset)]
+
+
+def benchmark_stream(size_mb: int = 256, chunk_sizes: Iterable[int] = (256 * 1024, 4 * 1024 * 1024),
+                     full_buffer_mb: int = 64) -> None:
+    """
+    Потоковая конвертация size_mb синтетических данных в os.devnull: последовательно и с этапами в своих потоках.
+    По умолчанию объёмы небольшие, чтобы замер шёл секунды; многогигабайтный прогон — через size_mb.
+    Для сравнения тот же конвейер с полным буфером на каждом этапе прогоняется на full_buffer_mb.
+    Пиковая память — по tracemalloc.
+    """
+    reader = type('Reader', (SyntheticBitrateReader,), {'size': size_mb * 1024 * 1024})
+    convertor = VideoConvertor(reader)
+    print(f'{"режим":>24} {"объём, МБ":>10} {"МБ/с":>8} {"пик, МБ":>8}')
+
+    def report(mode: str, megabytes: int, run) -> None:
+        tracemalloc.start()
+        started = perf_counter()
+        run()
+        elapsed = perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{mode:>24} {megabytes:>10} {megabytes / elapsed:>8.0f} {peak / 1024 / 1024:>8.1f}')
+
+    full_reader = type('Reader', (SyntheticBitrateReader,), {'size': full_buffer_mb * 1024 * 1024})
+
+    def full_buffer() -> None:
+        codec = OggCompressionCodec()
+        buffer = b''.join(full_reader.read_chunks('synthetic.mp4', 'mp4'))
+        result = b''.join(full_reader.convert_chunks([buffer], codec))
+        del buffer
+        result = b''.join(AudioMixer.fix_chunks([result]))
+        with open(os.devnull, 'wb') as file:
+            file.write(result)
+
+    report('полный буфер', full_buffer_mb, full_buffer)
+    for chunk_size in chunk_sizes:
+        for threaded in (False, True):
+            mode = f'{chunk_size // 1024} КБ, {"потоки" if threaded else "подряд"}'
+            report(mode, size_mb, lambda: convertor.convert_stream('synthetic.mp4', 'ogg', os.devnull,
+                                                                   chunk_size=chunk_size, threaded=threaded))
+
+
+def benchmark_batch(files: int = 32, workers_list: Iterable[int] = None) -> None:
+    """Пакет из files синтетических файлов: последовательный convert против convert_many на разном числе процессов."""
+    cpus = os.cpu_count() or 1
+    workers_list = workers_list or sorted({1, 2, 4, cpus})
+    convertor = VideoConvertor(CPUBoundBitrateReader)
+    filenames = [f'video{number}.mp4' for number in range(files)]
+
+    started = perf_counter()
+    for filename in filenames:
+        convertor.convert(filename, 'ogg')
+    serial = perf_counter() - started
+    print(f'Ядер: {cpus}, файлов: {files}')
+    print(f'{"режим":>16} {"время, с":>9} {"файлов/с":>9} {"ср. на файл, с":>15}')
+    print(f'{"последовательно":>16} {serial:>9.2f} {files / serial:>9.1f} {serial / files:>15.3f}')
+    for workers in workers_list:
+        started = perf_counter()
+        results = list(convertor.convert_many(filenames, 'ogg', workers=workers))
+        elapsed = perf_counter() - started
+        per_file = sum(result.seconds for result in results) / len(results)
+        print(f'{f"процессов: {workers}":>16} {elapsed:>9.2f} {files / elapsed:>9.1f} {per_file:>15.3f}')
+
+
+def benchmark_probe(files: int = 40, already_ogg: float = 0.9) -> None:
+    """
+    Пакет, где доля already_ogg файлов уже в Ogg, хоть и названа .mp4: кодек определяется по заголовку,
+    и такие файлы не конвертируются. Для сравнения — тот же пакет, где конвертировать нужно всё.
+    """
+    convertor = VideoConvertor(CPUBoundBitrateReader)
+    with tempfile.TemporaryDirectory() as directory:
+        def make_batch(ogg_share: float) -> list:
+            filenames = []
+            for number in range(files):
+                path = os.path.join(directory, f'{ogg_share}-{number}.mp4')
+                header = b'OggS' if number < files * ogg_share else b'\x00\x00\x00\x18ftypisom'
+                with open(path, 'wb') as file:
+                    file.write(header + bytes(1024))
+                filenames.append(path)
+            return filenames
+
+        for title, share in (('всё конвертируется', 0.0), (f'{already_ogg:.0%} уже в Ogg', already_ogg)):
+            filenames = make_batch(share)
+            started = perf_counter()
+            for filename in filenames:
+                convertor.convert(filename, 'ogg')
+            elapsed = perf_counter() - started
+            print(f'{title:>20}: {elapsed:.2f} с на {files} файлов')
+
+
+def benchmark_cache(files: int = 16) -> None:
+    """Повторная конвертация тех же файлов с кешем: первый проход считает, второй берёт результаты из кеша."""
+    with tempfile.TemporaryDirectory() as directory:
+        convertor = VideoConvertor(CPUBoundBitrateReader, ConversionCache(directory))
+        filenames = [f'video{number}.mp4' for number in range(files)]
+        for attempt in ('холодный', 'тёплый'):
+            started = perf_counter()
+            for filename in filenames:
+                with convertor.convert(filename, 'ogg') as file:
+                    file.data
+            elapsed = perf_counter() - started
+            print(f'{attempt} проход: {elapsed:.3f} с, {elapsed / files * 1000:.2f} мс на файл')
 
 
 if __name__ == '__main__':
-    converter = VideoConvertor()
-    ogg = converter.convert('test.mp4', file_format='ogg')
-    ogg.save()
+    if 'bench' in sys.argv[1:]:
+        benchmark_batch()
+        benchmark_cache()
+        benchmark_stream()
+        benchmark_probe()
+    else:
+        converter = VideoConvertor()
+        ogg = converter.convert('test.mp4', file_format='ogg')
+        ogg.save()
+
+        for result in converter.convert_many(['a.mp4', 'b.ogg', 'c.mp4'], file_format='ogg', workers=2):
+            print(f'{result.filename}: {result.seconds * 1000:.2f} мс')
+            result.file.save()
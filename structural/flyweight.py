@@ -18,11 +18,33 @@
 Таким образом, одни и те же объекты можно будет повторно использовать в различных контекстах.
 Но главное — понадобится гораздо меньше объектов, ведь теперь они будут отличаться только внутренним состоянием, а оно имеет не так много вариаций.
 """
-import tkinter as tk
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import tracemalloc
+import weakref
+import zlib
+from array import array
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, MutableMapping, Optional, Sequence, Tuple, Union
+
+# Габариты дерева относительно точки посадки: left, top, right, bottom
+TREE_EXTENT = (-5, 0, 15, 50)
+
+Viewport = Tuple[int, int, int, int]
+Column = Union[array, memoryview]
 
 
 class Canvas:
     def __init__(self, width: int, height: int) -> None:
+        # tkinter импортируется только здесь: на серверах без дисплея рисуют в RasterCanvas
+        import tkinter as tk
+
+        self.width = width
+        self.height = height
         self.root = tk.Tk()
         self.canvas = tk.Canvas(self.root, width=width, height=height)
         self.canvas.pack()
@@ -32,35 +54,150 @@ class Canvas:
         self.canvas.create_rectangle(x, y, x + 10, y + 30, fill=color)
         self.canvas.create_rectangle(x - 5, y + 30, x + 15, y + 50, fill="brown")
 
+    def draw_trees(self, xs: Sequence[int], ys: Sequence[int], color: str) -> None:
+        for x, y in zip(xs, ys):
+            self.draw_tree(x, y, color)
+
     def mainloop(self) -> None:
         self.root.mainloop()
 
 
+class RasterCanvas:
+    """
+    Холст без окна: RGB-пиксели в bytearray, строка за строкой.
+    Прямоугольники заливаются срезами строк, так что кадр можно рисовать и замерять на сервере без дисплея.
+    """
+    PALETTE = {
+        'green': (0, 128, 0),
+        'darkgreen': (0, 100, 0),
+        'lightgreen': (144, 238, 144),
+        'brown': (165, 42, 42),
+        'white': (255, 255, 255),
+    }
+
+    def __init__(self, width: int, height: int, background: str = 'white') -> None:
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(self.rgb(background) * (width * height))
+        self.rectangles = 0
+
+    def rgb(self, color: str) -> bytes:
+        if color.startswith('#') and len(color) == 7:
+            return bytes.fromhex(color[1:])
+        if color in self.PALETTE:
+            return bytes(self.PALETTE[color])
+        # Неизвестное имя цвета: стабильный цвет из контрольной суммы имени
+        return zlib.crc32(color.encode()).to_bytes(4, 'little')[:3]
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, row: bytes) -> None:
+        """Заливает [x0, x1) x [y0, y1) строкой row длиной 3 * (x1 - x0) байт, обрезая по краям холста."""
+        left, top = max(x0, 0), max(y0, 0)
+        right, bottom = min(x1, self.width), min(y1, self.height)
+        if left >= right or top >= bottom:
+            return
+        if left != x0 or right != x1:
+            row = row[(left - x0) * 3:(right - x0) * 3]
+        stride = self.width * 3
+        pixels = self.pixels
+        start = top * stride + left * 3
+        for offset in range(start, bottom * stride, stride):
+            pixels[offset:offset + len(row)] = row
+        self.rectangles += 1
+
+    def draw_tree(self, x: int, y: int, color: str) -> None:
+        self.draw_trees((x,), (y,), color)
+
+    def draw_trees(self, xs: Sequence[int], ys: Sequence[int], color: str) -> None:
+        # Строки заливки готовятся один раз на всю пачку деревьев одного типа
+        crown = self.rgb(color) * 10
+        trunk = self.rgb('brown') * 20
+        fill_rect = self.fill_rect
+        for x, y in zip(xs, ys):
+            fill_rect(x, y, x + 10, y + 30, crown)
+            fill_rect(x - 5, y + 30, x + 15, y + 50, trunk)
+
+    def pixel(self, x: int, y: int) -> bytes:
+        offset = (y * self.width + x) * 3
+        return bytes(self.pixels[offset:offset + 3])
+
+    def save_ppm(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(b'P6 %d %d 255\n' % (self.width, self.height))
+            file.write(self.pixels)
+
+    def mainloop(self) -> None:
+        pass
+
+
 class TreeType:
+    """
+    Внутреннее состояние дерева. Объект неизменяем: один экземпляр разделяют все деревья этого типа,
+    и изменение через одно дерево тихо изменило бы остальные.
+    """
+    __slots__ = ('name', 'color', 'texture', '__weakref__')
+
     def __init__(self, name: str, color: str, texture: str):
-        self.name = name
-        self.color = color
-        self.texture = texture
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'color', color)
+        object.__setattr__(self, 'texture', texture)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f'TreeType({self.name!r}, {self.color!r}, {self.texture!r})'
 
     def draw(self, canvas: Canvas, x: int, y: int) -> None:
         canvas.draw_tree(x, y, self.color)
 
+    def draw_many(self, canvas: Canvas, xs: Sequence[int], ys: Sequence[int]) -> None:
+        canvas.draw_trees(xs, ys, self.color)
+
 
 class TreeFactory:
-    tree_types = []
+    """
+    Таблица интернирования типов деревьев: словарь по ключу (name, color, texture).
+    Поиск существующего типа идёт без блокировки, под блокировкой создаётся только новый тип,
+    поэтому параллельная посадка не плодит дубликатов.
+    В режиме weak=True типы хранятся по слабым ссылкам и исчезают из таблицы, когда на них не осталось деревьев.
+    """
+    tree_types: MutableMapping[Tuple[str, str, str], TreeType] = {}
+    _lock = threading.Lock()
 
     @staticmethod
     def get_tree_type(name: str, color: str, texture: str) -> TreeType:
-        for tree_type in TreeFactory.tree_types:
-            if tree_type.name == name and tree_type.color == color and tree_type.texture == texture:
-                return tree_type
-        new_type = TreeType(name, color, texture)
-        TreeFactory.tree_types.append(new_type)
+        key = (name, color, texture)
+        tree_type = TreeFactory.tree_types.get(key)
+        if tree_type is not None:
+            return tree_type
 
-        return new_type
+        with TreeFactory._lock:
+            tree_type = TreeFactory.tree_types.get(key)
+            if tree_type is None:
+                tree_type = TreeType(name, color, texture)
+                TreeFactory.tree_types[key] = tree_type
+        return tree_type
+
+    @staticmethod
+    def configure(weak: bool) -> None:
+        """Переключает таблицу между сильными и слабыми ссылками, сохраняя уже созданные типы."""
+        with TreeFactory._lock:
+            table: MutableMapping[Tuple[str, str, str], TreeType] = weakref.WeakValueDictionary() if weak else {}
+            table.update(TreeFactory.tree_types)
+            TreeFactory.tree_types = table
+
+    @staticmethod
+    def clear() -> None:
+        with TreeFactory._lock:
+            TreeFactory.tree_types.clear()
 
 
 class Tree:
+    __slots__ = ('x', 'y', 'tree_type')
+
     def __init__(self, x: int, y: int, tree_type: TreeType):
         self.x = x
         self.y = y
@@ -74,26 +211,457 @@ class Tree:
 
 
 class Forest:
+    """
+    Лес хранит внешнее состояние по столбцам: координаты в типизированных массивах
+    и маленький номер типа в таблице types вместо ссылки на объект в каждом дереве.
+    Объекты Tree создаются только при обращении к конкретному дереву.
+    Для отрисовки лес строит равномерную сетку ячеек по CELL_SIZE пикселей и обходит только ячейки,
+    попадающие в окно просмотра.
+
+    Формат файла (little-endian): заголовок HEADER, таблица типов (три строки UTF-8 с длиной u16 на тип),
+    затем столбцы xs и ys (int32) и kinds (u16, или u32 при флаге WIDE_KINDS), каждый выровнен по 8 байт.
+    """
+    CELL_SIZE = 64
+    MAGIC = b'PPFO'
+    VERSION = 1
+    # magic, version, flags, число типов, число деревьев, смещение столбцов
+    HEADER = struct.Struct('<4sHHIQQ')
+    WIDE_KINDS = 1
+
     def __init__(self):
-        self.trees = []
+        self.xs: Column = array('i')
+        self.ys: Column = array('i')
+        self.kinds: Column = array('H')
+        self.types: List[TreeType] = []
+        self._type_index: Dict[TreeType, int] = {}
+        self._grid: Optional[Dict[Tuple[int, int], array]] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def _kind(self, tree_type: TreeType) -> int:
+        index = self._type_index.get(tree_type)
+        if index is None:
+            index = len(self.types)
+            if index > 0xFFFF and self.kinds.typecode == 'H':
+                self.kinds = array('I', self.kinds)
+            self.types.append(tree_type)
+            self._type_index[tree_type] = index
+        return index
 
     def plant_tree(self, x: int, y: int, name: str, color: str, texture: str) -> None:
-        tree_type = TreeFactory.get_tree_type(name, color, texture)
-        tree = Tree(x, y, tree_type)
-        self.trees.append(tree)
+        self._ensure_writable()
+        kind = self._kind(TreeFactory.get_tree_type(name, color, texture))
+        self.xs.append(x)
+        try:
+            self.ys.append(y)
+        except (OverflowError, TypeError):
+            # Столбцы не должны расходиться по длине: x уже дописан, убираем его
+            self.xs.pop()
+            raise
+        self.kinds.append(kind)
+        if self._grid is not None:
+            self._index_trees(len(self.xs) - 1)
 
-    def draw(self, canvas: Canvas) -> None:
-        for tree in self.trees:
-            tree.draw(canvas)
+    def plant_many(self, xs: Iterable[int], ys: Iterable[int], name: str, color: str, texture: str) -> int:
+        """
+        Сажает деревья одного типа пачкой: координаты дописываются в массивы целиком. Возвращает число деревьев.
+        Координаты сначала собираются в массивы int32, так что при ошибке в данных лес не меняется.
+        """
+        self._ensure_writable()
+        xs, ys = (values if isinstance(values, array) and values.typecode == 'i' else array('i', values)
+                  for values in (xs, ys))
+        if len(xs) != len(ys):
+            raise ValueError('xs and ys must have the same length')
+        kind = self._kind(TreeFactory.get_tree_type(name, color, texture))
+        before = len(self.xs)
+        count = len(xs)
+        self.xs.extend(xs)
+        self.ys.extend(ys)
+        self.kinds.extend(array(self.kinds.typecode, [kind]) * count)
+        if self._grid is not None:
+            self._index_trees(before)
+        return count
 
+    def _index_trees(self, start: int) -> None:
+        """Раскладывает деревья с номерами от start до конца леса по ячейкам сетки."""
+        grid, cell = self._grid, self.CELL_SIZE
+        xs, ys = self.xs, self.ys
+        for index in range(start, len(xs)):
+            key = (xs[index] // cell, ys[index] // cell)
+            bucket = grid.get(key)
+            if bucket is None:
+                bucket = grid[key] = array('I')
+            bucket.append(index)
 
-if __name__ == '__main__':
+    def cull(self, viewport: Viewport) -> Dict[int, Tuple[array, array]]:
+        """
+        Деревья, задевающие окно (x0, y0, x1, y1), сгруппированные по номеру типа: {kind: (xs, ys)}.
+        Сетка строится при первом вызове и дальше дополняется при посадке.
+        """
+        if self._grid is None:
+            self._grid = {}
+            self._index_trees(0)
+
+        left, top, right, bottom = TREE_EXTENT
+        x0, y0, x1, y1 = viewport
+        # Точки посадки, при которых дерево пересекает окно
+        min_x, max_x = x0 - right, x1 - left
+        min_y, max_y = y0 - bottom, y1 - top
+
+        cell = self.CELL_SIZE
+        xs, ys, kinds, grid = self.xs, self.ys, self.kinds, self._grid
+        batches: Dict[int, Tuple[array, array]] = {}
+        for cell_y in range(min_y // cell, (max_y - 1) // cell + 1):
+            for cell_x in range(min_x // cell, (max_x - 1) // cell + 1):
+                bucket = grid.get((cell_x, cell_y))
+                if bucket is None:
+                    continue
+                for index in bucket:
+                    x, y = xs[index], ys[index]
+                    if min_x < x < max_x and min_y < y < max_y:
+                        batch = batches.get(kinds[index])
+                        if batch is None:
+                            batch = batches[kinds[index]] = (array('i'), array('i'))
+                        batch[0].append(x - x0)
+                        batch[1].append(y - y0)
+        return batches
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def __getitem__(self, index: int) -> Tree:
+        return Tree(self.xs[index], self.ys[index], self.types[self.kinds[index]])
+
+    def __iter__(self) -> Iterator[Tree]:
+        types = self.types
+        for x, y, kind in zip(self.xs, self.ys, self.kinds):
+            yield Tree(x, y, types[kind])
+
+    @property
+    def trees(self) -> 'Forest':
+        # Раньше деревья лежали в списке; теперь сам лес — ленивая последовательность деревьев
+        return self
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in (self.xs, self.ys, self.kinds))
+
+    def save(self, path: str) -> None:
+        kinds = array('I' if self.kinds.itemsize == 4 else 'H', self.kinds)
+        columns = [array('i', self.xs), array('i', self.ys), kinds]
+        if sys.byteorder != 'little':
+            for column in columns:
+                column.byteswap()
+
+        table = bytearray()
+        for tree_type in self.types:
+            for field in (tree_type.name, tree_type.color, tree_type.texture):
+                encoded = field.encode()
+                table += struct.pack('<H', len(encoded)) + encoded
+
+        offset = self.HEADER.size + len(table)
+        offset += -offset % 8
+        flags = self.WIDE_KINDS if kinds.typecode == 'I' else 0
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.VERSION, flags, len(self.types), len(self.xs), offset))
+            file.write(table)
+            for column in columns:
+                file.write(bytes(-file.tell() % 8))
+                column.tofile(file)
+
+    @classmethod
+    def load(cls, path: str, lazy: bool = True) -> 'Forest':
+        """
+        Читает лес из файла. Заголовок и таблица типов разбираются сразу (типы интернируются через TreeFactory),
+        а при lazy=True столбцы остаются срезами отображённого в память файла: загрузка не зависит от числа деревьев,
+        страницы подтягиваются при обращении. Первая посадка копирует столбцы в обычные массивы.
+        """
+        forest = cls()
+        with open(path, 'rb') as file:
+            header = file.read(cls.HEADER.size)
+            if len(header) < cls.HEADER.size:
+                raise ValueError(f'{path}: truncated forest header')
+            magic, version, flags, type_count, tree_count, offset = cls.HEADER.unpack(header)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f'{path}: not a forest file (version {cls.VERSION})')
+
+            for _ in range(type_count):
+                fields = []
+                for _ in range(3):
+                    prefix = file.read(2)
+                    if len(prefix) < 2:
+                        raise ValueError(f'{path}: truncated forest type table')
+                    length, = struct.unpack('<H', prefix)
+                    field = file.read(length)
+                    if len(field) < length:
+                        raise ValueError(f'{path}: truncated forest type table')
+                    fields.append(field.decode())
+                tree_type = TreeFactory.get_tree_type(*fields)
+                # Номера типов в столбце kinds — это позиции в таблице: повтор сдвинул бы все следующие
+                if tree_type in forest._type_index:
+                    raise ValueError(f'{path}: duplicate tree type {tuple(fields)} in forest type table')
+                forest._kind(tree_type)
+
+            kind_code = 'I' if flags & cls.WIDE_KINDS else 'H'
+            kind_size = 4 if kind_code == 'I' else 2
+            layout = []
+            for code, size in (('i', 4), ('i', 4), (kind_code, kind_size)):
+                offset += -offset % 8
+                layout.append((code, offset, tree_count * size))
+                offset += tree_count * size
+
+            if os.fstat(file.fileno()).st_size < offset:
+                raise ValueError(f'{path}: truncated forest records')
+
+            if lazy and tree_count and sys.byteorder == 'little':
+                forest._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(forest._mmap)
+                forest.xs, forest.ys, forest.kinds = (view[start:start + size].cast(code) for code, start, size in layout)
+                return forest
+
+            columns = []
+            for code, start, size in layout:
+                file.seek(start)
+                column = array(code)
+                column.frombytes(file.read(size))
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                columns.append(column)
+            forest.xs, forest.ys, forest.kinds = columns
+        return forest
+
+    def _ensure_writable(self) -> None:
+        if self._mmap is None:
+            return
+        self.xs, self.ys, self.kinds = (array(column.format, column) for column in (self.xs, self.ys, self.kinds))
+        self._mmap.close()
+        self._mmap = None
+
+    def close(self) -> None:
+        """Отпускает отображённый файл; лес остаётся пустым, если был загружен лениво."""
+        if self._mmap is None:
+            return
+        for column in (self.xs, self.ys, self.kinds):
+            column.release()
+        self.xs, self.ys, self.kinds = array('i'), array('i'), array('H')
+        self._grid = None
+        self._mmap.close()
+        self._mmap = None
+
+    def draw(self, canvas: Canvas, viewport: Optional[Viewport] = None) -> None:
+        """
+        Рисует деревья, попавшие в окно просмотра (по умолчанию — весь холст от начала координат),
+        сдвигая их в координаты холста. Вызовы рисования идут пачками, по одной на тип дерева.
+        """
+        if viewport is None:
+            viewport = (0, 0, canvas.width, canvas.height)
+        for kind, (xs, ys) in self.cull(viewport).items():
+            self.types[kind].draw_many(canvas, xs, ys)
+
+
+def benchmark_intern(trees: int = 10_000_000, types: int = 10_000, legacy_trees: int = 20_000) -> None:
+    """
+    Посадка trees деревьев по types типам: только поиск типа в фабрике, без хранения деревьев.
+    Старый линейный поиск по списку меряется на legacy_trees деревьях и пересчитывается на полный объём.
+    """
+    keys = [(f'Tree{number}', f'color{number % 64}', f'texture{number % 16}') for number in range(types)]
+
+    tree_types = []
+
+    def linear_lookup(name: str, color: str, texture: str) -> TreeType:
+        for tree_type in tree_types:
+            if tree_type.name == name and tree_type.color == color and tree_type.texture == texture:
+                return tree_type
+        new_type = TreeType(name, color, texture)
+        tree_types.append(new_type)
+        return new_type
+
+    started = perf_counter()
+    for number in range(legacy_trees):
+        linear_lookup(*keys[number % types])
+    legacy = (perf_counter() - started) / legacy_trees * trees
+
+    TreeFactory.clear()
+    get_tree_type = TreeFactory.get_tree_type
+    started = perf_counter()
+    for number in range(trees):
+        get_tree_type(*keys[number % types])
+    interned = perf_counter() - started
+
+    print(f'{trees} деревьев, {types} типов')
+    print(f'  линейный список: ~{legacy:.0f} с (оценка по {legacy_trees} деревьям)')
+    print(f'  словарь:          {interned:.2f} с, {trees / interned / 1e6:.2f} млн/с, типов: {len(TreeFactory.tree_types)}')
+
+    TreeFactory.clear()
+    threads = [threading.Thread(target=lambda: [get_tree_type(*key) for key in keys]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f'  8 потоков сажают одни и те же {types} типов: в таблице {len(TreeFactory.tree_types)}')
+
+    TreeFactory.configure(weak=True)
+    TreeFactory.clear()
+    alive = [get_tree_type(*key) for key in keys]
+    del alive[types // 2:]
+    print(f'  weak-режим: после освобождения половины деревьев типов {len(TreeFactory.tree_types)}')
+    TreeFactory.configure(weak=False)
+    TreeFactory.clear()
+
+
+def benchmark_forest(trees: int = 1_000_000, types: int = 100) -> None:
+    """Байты на дерево и скорость посадки: список объектов Tree против столбцов в массивах."""
+    keys = [(f'Tree{number}', f'color{number % 8}', 'rough') for number in range(types)]
+
+    class LegacyTree:
+        def __init__(self, x: int, y: int, tree_type: TreeType):
+            self.x = x
+            self.y = y
+            self.tree_type = tree_type
+
+    def legacy() -> list:
+        planted = []
+        for number in range(trees):
+            planted.append(LegacyTree(number, number, TreeFactory.get_tree_type(*keys[number % types])))
+        return planted
+
+    def columnar() -> Forest:
+        forest = Forest()
+        for number in range(trees):
+            forest.plant_tree(number, number, *keys[number % types])
+        return forest
+
+    def bulk() -> Forest:
+        forest = Forest()
+        per_type = trees // types
+        for number, key in enumerate(keys):
+            coordinates = range(number * per_type, (number + 1) * per_type)
+            forest.plant_many(coordinates, coordinates, *key)
+        return forest
+
+    for key in keys:
+        TreeFactory.get_tree_type(*key)
+    print(f'{trees} деревьев, {types} типов')
+    for title, plant in (('список Tree', legacy), ('столбцы', columnar), ('plant_many', bulk)):
+        tracemalloc.start()
+        started = perf_counter()
+        planted = plant()
+        elapsed = perf_counter() - started
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'  {title:>12}: {used / len(planted):6.1f} байт/дерево, {len(planted) / elapsed / 1e6:6.2f} млн деревьев/с')
+        del planted
+
+
+def benchmark_draw(trees: int = 500_000, world: int = 20_000, frames: int = 4) -> None:
+    """
+    Кадр 800x600 на RasterCanvas в мире world x world: прежний обход всех деревьев с отсечением на холсте
+    против сетки и отрисовки пачками по типам. Окно просмотра сдвигается от кадра к кадру.
+    """
+    import random
+
+    rng = random.Random(1)
+    forest = Forest()
+    colors = ('green', 'darkgreen', 'lightgreen', 'olive')
+    for number, color in enumerate(colors):
+        count = trees // len(colors)
+        forest.plant_many([rng.randrange(world) for _ in range(count)], [rng.randrange(world) for _ in range(count)],
+                          f'Tree{number}', color, 'rough')
+
+    width, height = 800, 600
+    viewports = [(x, x // 2, x + width, x // 2 + height) for x in range(0, world - width, (world - width) // frames)]
+
+    def naive(viewport: Viewport) -> int:
+        canvas = RasterCanvas(width, height)
+        x0, y0 = viewport[:2]
+        types = forest.types
+        for x, y, kind in zip(forest.xs, forest.ys, forest.kinds):
+            types[kind].draw(canvas, x - x0, y - y0)
+        return canvas.rectangles
+
+    def culled(viewport: Viewport) -> int:
+        canvas = RasterCanvas(width, height)
+        forest.draw(canvas, viewport)
+        return canvas.rectangles
+
+    started = perf_counter()
+    forest.cull((0, 0, 0, 0))
+    print(f'{len(forest)} деревьев, мир {world}x{world}, окно {width}x{height}')
+    print(f'  построение сетки: {(perf_counter() - started) * 1000:.0f} мс')
+    for title, draw in (('все деревья', naive), ('сетка + пачки', culled)):
+        started = perf_counter()
+        rectangles = [draw(viewport) for viewport in viewports]
+        elapsed = (perf_counter() - started) / len(rectangles)
+        print(f'  {title:>14}: {elapsed * 1000:8.1f} мс/кадр, {sum(rectangles) // len(rectangles)} прямоугольников')
+
+
+def benchmark_persistence(trees: int = 5_000_000, types: int = 1_000) -> None:
+    """
+    Сохранение и загрузка леса: ленивая загрузка через mmap, полное чтение столбцов и пересадка заново.
+    Попутно сверяет, что лес после загрузки совпадает с исходным.
+    """
+    import random
+
+    rng = random.Random(2)
     forest = Forest()
-    forest.plant_tree(20, 50, "Oak", "green", "rough")
-    forest.plant_tree(80, 50, "Pine", "darkgreen", "smooth")
-    forest.plant_tree(50, 50, "Birch", "lightgreen", "smooth")
-    forest.plant_tree(50, 70, "Oak", "green", "rough")
-
-    canvas = Canvas(100, 100)
-    forest.draw(canvas)
-    canvas.mainloop()
+    per_type = trees // types
+    for number in range(types):
+        forest.plant_many(array('i', (rng.randrange(100_000) for _ in range(per_type))),
+                          array('i', (rng.randrange(100_000) for _ in range(per_type))),
+                          f'Tree{number}', f'color{number % 32}', 'rough')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'forest.bin')
+        started = perf_counter()
+        forest.save(path)
+        saved = perf_counter() - started
+        print(f'{len(forest)} деревьев, {types} типов: файл {os.path.getsize(path) / 1e6:.1f} МБ, '
+              f'сохранение {saved * 1000:.0f} мс')
+
+        for title, lazy in (('mmap', True), ('чтение', False)):
+            started = perf_counter()
+            loaded = Forest.load(path, lazy=lazy)
+            elapsed = perf_counter() - started
+            first = loaded[0]
+            print(f'  {title:>8}: загрузка {elapsed * 1000:8.2f} мс, первое дерево {first.tree_type.name} '
+                  f'({first.x}, {first.y})')
+            _check_same(loaded, forest)
+            loaded.close()
+
+        started = perf_counter()
+        replanted = Forest()
+        for x, y, kind in zip(forest.xs, forest.ys, forest.kinds):
+            tree_type = forest.types[kind]
+            replanted.plant_tree(x, y, tree_type.name, tree_type.color, tree_type.texture)
+        print(f'  {"plant_tree":>8}: пересадка {(perf_counter() - started) * 1000:8.0f} мс')
+
+
+def _check_same(loaded: Forest, forest: Forest) -> None:
+    if len(loaded) != len(forest) or loaded.types != forest.types:
+        raise AssertionError('loaded forest differs from the saved one: size or type table')
+    for name in ('xs', 'ys', 'kinds'):
+        if list(getattr(loaded, name)) != list(getattr(forest, name)):
+            raise AssertionError(f'loaded forest differs from the saved one: column {name}')
+
+
+if __name__ == '__main__':
+    if 'bench' in sys.argv[1:]:
+        benchmark_intern()
+        benchmark_forest()
+        benchmark_draw()
+        benchmark_persistence()
+    else:
+        forest = Forest()
+        forest.plant_tree(20, 50, "Oak", "green", "rough")
+        forest.plant_tree(80, 50, "Pine", "darkgreen", "smooth")
+        forest.plant_tree(50, 50, "Birch", "lightgreen", "smooth")
+        forest.plant_tree(50, 70, "Oak", "green", "rough")
+
+        try:
+            canvas = Canvas(100, 100)
+        except Exception as error:
+            # Нет дисплея (или tkinter): рисуем в память
+            print(f'Canvas unavailable ({error}), drawing to RasterCanvas')
+            canvas = RasterCanvas(100, 100)
+        forest.draw(canvas)
+        if isinstance(canvas, RasterCanvas):
+            print(f'Drawn {canvas.rectangles} rectangles, pixel at (25, 60): {canvas.pixel(25, 60).hex()}')
+        canvas.mainloop()
@@ -1,10 +1,33 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import pickle
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
 from abc import abstractmethod, ABC
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import accumulate, count
+from time import monotonic, perf_counter
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+
+class VideoNotFoundError(LookupError):
+    pass
 
 
 class ThirdPartyYouTubeLib(ABC):
     """
-    Интерфейс удалённого сервиса
+    Интерфейс удалённого сервиса. Для несуществующего видео методы бросают VideoNotFoundError.
     """
 
     @abstractmethod
@@ -19,6 +42,31 @@ class ThirdPartyYouTubeLib(ABC):
     def download_video(self, video_id: str) -> str:
         pass
 
+    def video_size(self, video_id: str) -> int:
+        """Размер видео в байтах. По умолчанию — размер полного скачивания."""
+        return len(self.download_video(video_id).encode())
+
+    def download_range(self, video_id: str, start: int, end: int) -> bytes:
+        """Байты видео [start, end). По умолчанию — срез полного скачивания, сервисы с Range-запросами переопределяют."""
+        return self.download_video(video_id).encode()[start:end]
+
+    def supports_ranges(self) -> bool:
+        """Умеет ли сервис отдавать диапазоны сам. Если нет, каждый download_range — это полное скачивание."""
+        return type(self).download_range is not ThirdPartyYouTubeLib.download_range
+
+    def get_videos_info(self, video_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Информация о нескольких видео за один запрос. Несуществующих id в ответе нет.
+        Реализация по умолчанию для сервисов без пакетного API просто спрашивает по одному.
+        """
+        infos = {}
+        for video_id in video_ids:
+            try:
+                infos[video_id] = self.get_video_info(video_id)
+            except VideoNotFoundError:
+                pass
+        return infos
+
 
 class ThirdPartyYouTubeClass(ThirdPartyYouTubeLib):
     """
@@ -39,12 +87,562 @@ class ThirdPartyYouTubeClass(ThirdPartyYouTubeLib):
         print(f"Запрос информации о видео: {video_id}")
         return f"Информация о видео: {video_id}"
 
+    def get_videos_info(self, video_ids: Iterable[str]) -> Dict[str, str]:
+        # Получить информацию о пачке видеороликов одним запросом.
+        video_ids = list(video_ids)
+        print(f"Запрос информации о видео: {', '.join(video_ids)}")
+        return {video_id: f"Информация о видео: {video_id}" for video_id in video_ids}
+
     def download_video(self, video_id: str) -> str:
         # Скачать видео с YouTube.
         print(f"Скачивание видео: {video_id}")
         return f"Скачивание видео: {video_id}"
 
 
+class CacheEntry(NamedTuple):
+    value: Any
+    expires_at: float
+    # Закешированный промах: value хранит аргументы VideoNotFoundError. Бросается каждый раз новое исключение,
+    # иначе traceback одного и того же экземпляра рос бы с каждым попаданием и держал чужие кадры стека
+    negative: bool
+
+
+MISSING = object()
+
+
+class CacheEngine:
+    """
+    Ограниченный по числу записей кеш с TTL.
+    policy='lru' вытесняет запись, к которой дольше всего не обращались.
+    policy='slru' (сегментированный LRU) держит новые записи в испытательном сегменте и переводит в защищённый
+    только при повторном обращении, так что поток одноразовых ключей не вымывает популярные.
+    Просроченные записи удаляются при обращении к ним. Все операции потокобезопасны.
+    """
+
+    def __init__(self, max_entries: int = 1024, policy: str = 'lru', protected_ratio: float = 0.8,
+                 clock: Callable[[], float] = monotonic):
+        if policy not in ('lru', 'slru'):
+            raise ValueError(f'Unknown cache policy: {policy}')
+        self.max_entries = max_entries
+        self.policy = policy
+        self.protected_size = int(max_entries * protected_ratio) if policy == 'slru' else 0
+        self.clock = clock
+        self._probation: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self._protected: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'evictions': 0, 'expirations': 0}
+
+    def __len__(self) -> int:
+        return len(self._probation) + len(self._protected)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Есть ли живая запись по ключу. В отличие от get не трогает счётчики и порядок вытеснения."""
+        with self._lock:
+            entry = self._protected.get(key) or self._probation.get(key)
+            return entry is not None and entry.expires_at > self.clock()
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или MISSING. Закешированный промах возвращается как CacheEntry с negative=True."""
+        with self._lock:
+            segment = self._protected if key in self._protected else self._probation
+            entry = segment.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return MISSING
+            if entry.expires_at <= self.clock():
+                del segment[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return MISSING
+
+            if segment is self._protected or self.policy == 'lru':
+                segment.move_to_end(key)
+            else:
+                # Повторное обращение: запись переходит в защищённый сегмент
+                del segment[key]
+                self._protected[key] = entry
+                if len(self._protected) > self.protected_size:
+                    demoted, demoted_entry = self._protected.popitem(last=False)
+                    self._probation[demoted] = demoted_entry
+
+            if entry.negative:
+                self.stats['negative_hits'] += 1
+                return entry
+            self.stats['hits'] += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None, negative: bool = False) -> None:
+        with self._lock:
+            self._insert(key, value, ttl, negative)
+
+    def add(self, key: Hashable, value: Any, ttl: Optional[float] = None, negative: bool = False) -> bool:
+        """Кладёт запись, только если ключа ещё нет: при прогреве не затирает более свежие значения."""
+        with self._lock:
+            if key in self._probation or key in self._protected:
+                return False
+            self._insert(key, value, ttl, negative)
+            return True
+
+    def _insert(self, key: Hashable, value: Any, ttl: Optional[float], negative: bool) -> None:
+        """Под блокировкой: кладёт запись в испытательный сегмент и вытесняет лишние."""
+        expires_at = self.clock() + ttl if ttl is not None else float('inf')
+        self._protected.pop(key, None)
+        self._probation.pop(key, None)
+        self._probation[key] = CacheEntry(value, expires_at, negative)
+        while len(self) > self.max_entries:
+            segment = self._probation if self._probation else self._protected
+            segment.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._protected.pop(key, None) is not None or self._probation.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._protected.clear()
+            self._probation.clear()
+
+
+class SingleFlight:
+    """
+    Схлопывание одновременных запросов: пока по ключу идёт загрузка, остальные вызовы с тем же ключом
+    не идут в сервис, а ждут её результат (или её исключение).
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            flight.set_result(fetch())
+        except BaseException as error:
+            flight.set_exception(error)
+        finally:
+            with self._lock:
+                del self._flights[key]
+        return flight.result()
+
+
+class AsyncSingleFlight:
+    """
+    То же для asyncio: загрузка по ключу — одна общая задача. Отмена одного ожидающего её не прерывает,
+    задача отменяется, только если ушли все.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Tuple[asyncio.Task, List[int]]] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fetch())
+            flight = self._flights[key] = (task, [0])
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.shared += 1
+        task, waiters = flight
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and waiters[0] == 1:
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+
+class BatchLoader:
+    """
+    Собирает отдельные запросы по ключам в пачки: первый ключ новой пачки взводит таймер на window секунд,
+    пачка уходит в batch_fn по таймеру или сразу, как наберёт max_batch ключей.
+    batch_fn получает список ключей и возвращает словарь найденных; для отсутствующих load бросает VideoNotFoundError.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Dict[Hashable, Any]], window: float = 0.002,
+                 max_batch: int = 50):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[Hashable, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'keys': 0}
+
+    def load(self, key: Hashable) -> Any:
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+            if len(self._pending) >= self.max_batch:
+                batch = self._take()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            self._dispatch(batch)
+        return future.result()
+
+    def _take(self) -> Dict[Hashable, Future]:
+        batch, self._pending = self._pending, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def flush(self) -> None:
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: Dict[Hashable, Future]) -> None:
+        self.stats['batches'] += 1
+        self.stats['keys'] += len(batch)
+        try:
+            values = self.batch_fn(list(batch))
+        except BaseException as error:
+            for future in batch.values():
+                future.set_exception(error)
+            return
+        for key, future in batch.items():
+            if key in values:
+                future.set_result(values[key])
+            else:
+                future.set_exception(VideoNotFoundError(key))
+
+
+class DownloadCache:
+    """
+    Кеш скачанных видео на диске. Видео делится на сегменты по segment_size байт, недостающие сегменты
+    качаются параллельно (workers потоков) Range-запросами и пишутся на свои места в заранее размеченный файл.
+    Рядом ведётся журнал: по строке «номер sha256» на каждый записанный сегмент. Прерванное скачивание
+    продолжается с недостающих сегментов, а сегменты, чья сумма не сошлась с журналом, качаются заново.
+    Сервис без Range-запросов (см. supports_ranges) скачивает видео один раз целиком, и сегменты режутся локально.
+    Готовое видео отдаётся прямо с диска: через sendfile или отображение в память.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 1024 * 1024, workers: int = 4):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.workers = workers
+        os.makedirs(directory, exist_ok=True)
+        self.stats = {'segments_fetched': 0, 'segments_reused': 0, 'segments_corrupt': 0}
+        self._lock = threading.Lock()
+
+    def path(self, video_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(video_id.encode()).hexdigest())
+
+    def _journal(self, video_id: str) -> Tuple[Optional[int], Dict[int, str]]:
+        """Размер видео и суммы записанных сегментов. Оборванная последняя строка журнала отбрасывается."""
+        try:
+            with open(self.path(video_id) + '.journal') as journal:
+                lines = journal.read().split('\n')
+        except FileNotFoundError:
+            return None, {}
+        size, digests = None, {}
+        for line in lines[:-1]:
+            fields = line.split()
+            if len(fields) == 2 and fields[0] == 'size':
+                size = int(fields[1])
+            elif len(fields) == 2 and size is not None:
+                digests[int(fields[0])] = fields[1]
+        return size, digests
+
+    def segments(self, size: int) -> int:
+        return (size + self.segment_size - 1) // self.segment_size
+
+    def is_complete(self, video_id: str) -> bool:
+        """Все ли сегменты в журнале и лежит ли на диске файл нужного размера. Суммы здесь не проверяются."""
+        size, digests = self._journal(video_id)
+        if size is None or len(digests) != self.segments(size):
+            return False
+        try:
+            return os.path.getsize(self.path(video_id)) == size
+        except FileNotFoundError:
+            return False
+
+    def _verified(self, video_id: str, size: int, digests: Dict[int, str]) -> Set[int]:
+        """Номера сегментов, которые лежат на диске и совпадают со своей суммой из журнала."""
+        valid = set()
+        try:
+            file = open(self.path(video_id), 'rb')
+        except FileNotFoundError:
+            return valid
+        with file:
+            for index, digest in digests.items():
+                file.seek(index * self.segment_size)
+                if hashlib.sha256(file.read(self.segment_size)).hexdigest() == digest:
+                    valid.add(index)
+                else:
+                    self.stats['segments_corrupt'] += 1
+        return valid
+
+    def fetch(self, video_id: str, service: ThirdPartyYouTubeLib, verify: bool = True) -> str:
+        """Докачивает недостающие сегменты видео и возвращает путь к готовому файлу."""
+        path = self.path(video_id)
+        size, digests = self._journal(video_id)
+        if size is not None and not os.path.exists(path):
+            # Данные удалили, а журнал остался: его суммы больше ни к чему не относятся
+            size, digests = None, {}
+        if size is not None and len(digests) == self.segments(size) and not verify:
+            return path
+        if not service.supports_ranges():
+            return self._fetch_whole(video_id, service, size, digests)
+
+        if size is None:
+            size = service.video_size(video_id)
+            with open(path, 'wb') as file:
+                file.truncate(size)
+            with open(path + '.journal', 'w') as journal:
+                journal.write(f'size {size}\n')
+            digests = {}
+
+        done = self._verified(video_id, size, digests)
+        self.stats['segments_reused'] += len(done)
+        missing = [index for index in range(self.segments(size)) if index not in done]
+        if not missing:
+            return path
+
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with open(path + '.journal', 'a') as journal:
+                def fetch_segment(index: int) -> None:
+                    start = index * self.segment_size
+                    data = service.download_range(video_id, start, min(start + self.segment_size, size))
+                    os.pwrite(descriptor, data, start)
+                    digest = hashlib.sha256(data).hexdigest()
+                    with self._lock:
+                        # Строка журнала пишется только после данных: сегмент без строки просто скачается снова
+                        journal.write(f'{index} {digest}\n')
+                        journal.flush()
+                        self.stats['segments_fetched'] += 1
+
+                pool = ThreadPoolExecutor(self.workers)
+                try:
+                    for future in [pool.submit(fetch_segment, index) for index in missing]:
+                        future.result()
+                finally:
+                    # После первой ошибки оставшиеся сегменты не качаем: скачивание продолжится при следующем fetch
+                    pool.shutdown(cancel_futures=True)
+        finally:
+            os.close(descriptor)
+        return path
+
+    def _fetch_whole(self, video_id: str, service: ThirdPartyYouTubeLib, size: Optional[int],
+                     digests: Dict[int, str]) -> str:
+        """Для сервиса без диапазонов: одно полное скачивание вместо отдельного на размер и на каждый сегмент."""
+        path = self.path(video_id)
+        if size is not None:
+            done = self._verified(video_id, size, digests)
+            if len(done) == self.segments(size):
+                self.stats['segments_reused'] += len(done)
+                return path
+
+        data = service.download_video(video_id).encode()
+        with open(path + '.journal', 'w') as journal:
+            journal.write(f'size {len(data)}\n')
+        with open(path, 'wb') as file:
+            file.write(data)
+        with open(path + '.journal', 'a') as journal:
+            # Как и при скачивании по сегментам, строки журнала пишутся только после данных
+            for index in range(self.segments(len(data))):
+                start = index * self.segment_size
+                journal.write(f'{index} {hashlib.sha256(data[start:start + self.segment_size]).hexdigest()}\n')
+                self.stats['segments_fetched'] += 1
+        return path
+
+    def open(self, video_id: str) -> mmap.mmap:
+        """Готовое видео, отображённое в память только для чтения."""
+        with open(self.path(video_id), 'rb') as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def send(self, video_id: str, destination: BinaryIO) -> int:
+        """Отдаёт готовое видео в файл или сокет, по возможности через sendfile без копирования в Python."""
+        with open(self.path(video_id), 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            sent = 0
+            try:
+                destination.flush()
+                while sent < size:
+                    count = os.sendfile(destination.fileno(), file.fileno(), sent, size - sent)
+                    if not count:
+                        break
+                    sent += count
+            except (AttributeError, OSError):
+                file.seek(sent)
+                shutil.copyfileobj(file, destination)
+                sent = size
+            return sent
+
+    def remove(self, video_id: str) -> None:
+        for suffix in ('', '.journal'):
+            try:
+                os.remove(self.path(video_id) + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class PersistentTier:
+    """
+    Постоянный уровень кеша в sqlite, переживающий перезапуск процесса.
+    Записи копятся в памяти и сбрасываются фоновым потоком пачками (write-behind): раз в flush_interval секунд
+    или сразу по набору batch_size штук. Срок жизни хранится как абсолютное время, так что после рестарта
+    у записи остаётся ровно недожитый TTL, а просроченные записи не поднимаются.
+    """
+    _DELETED = object()
+
+    def __init__(self, path: str, flush_interval: float = 0.5, batch_size: int = 512):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                                 '(key TEXT PRIMARY KEY, value BLOB, expires_at REAL, negative INTEGER)')
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, Any] = {}
+        self._pending_lock = threading.Lock()
+        # Пока идёт прогрев, сюда попадают ключи, записанные или удалённые после его начала:
+        # снимок, который читает прогрев, для них уже устарел
+        self._warming = 0
+        self._touched: Set[str] = set()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.stats = {'written': 0, 'flushes': 0, 'read_through': 0, 'warmed': 0}
+        self._writer = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _name(key: Tuple[str, ...]) -> str:
+        return '\x1f'.join(key)
+
+    def record(self, key: Tuple[str, ...], value: Any, ttl: Optional[float], negative: bool = False) -> None:
+        expires_at = time.time() + ttl if ttl is not None else float('inf')
+        self._enqueue(self._name(key), (pickle.dumps(value), expires_at, int(negative)))
+
+    def delete(self, key: Tuple[str, ...]) -> None:
+        self._enqueue(self._name(key), self._DELETED)
+
+    def _enqueue(self, name: str, row: Any) -> None:
+        with self._pending_lock:
+            self._pending[name] = row
+            if self._warming:
+                self._touched.add(name)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _write_behind(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        deleted = [(name,) for name, row in pending.items() if row is self._DELETED]
+        written = [(name, *row) for name, row in pending.items() if row is not self._DELETED]
+        with self._db_lock:
+            with self._connection:
+                self._connection.execute('BEGIN')
+                self._connection.executemany('DELETE FROM entries WHERE key = ?', deleted)
+                self._connection.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', written)
+        self.stats['written'] += len(pending)
+        self.stats['flushes'] += 1
+
+    def _row(self, value: bytes, expires_at: float, negative: int) -> Optional[Tuple[Any, Optional[float], bool]]:
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+        return pickle.loads(value), remaining if remaining != float('inf') else None, bool(negative)
+
+    def get(self, key: Tuple[str, ...]) -> Optional[Tuple[Any, Optional[float], bool]]:
+        """(значение, оставшийся TTL, negative) или None. Ещё не сброшенные записи тоже видны."""
+        name = self._name(key)
+        with self._pending_lock:
+            row = self._pending.get(name)
+        if row is None:
+            with self._db_lock:
+                row = self._connection.execute('SELECT value, expires_at, negative FROM entries WHERE key = ?',
+                                               (name,)).fetchone()
+        if row is None or row is self._DELETED:
+            return None
+        self.stats['read_through'] += 1
+        return self._row(*row)
+
+    def warm(self, cache: CacheEngine, limit: Optional[int] = None, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Поднимает в cache непросроченные записи (самые долгоживущие первыми, не больше limit, по умолчанию
+        по размеру кеша). С background=True идёт в отдельном потоке и не задерживает старт.
+        Ключи с ещё не сброшенной записью или удалением и ключи, изменённые во время прогрева, не поднимаются.
+        """
+        def load() -> None:
+            with self._pending_lock:
+                self._warming += 1
+                self._touched.update(self._pending)
+            # Отдельное соединение: в режиме WAL чтение прогрева не блокирует запросы и запись
+            connection = sqlite3.connect(self.path)
+            try:
+                rows = connection.execute(
+                    'SELECT key, value, expires_at, negative FROM entries WHERE expires_at > ? '
+                    'ORDER BY expires_at DESC LIMIT ?', (time.time(), limit or cache.max_entries))
+                while not self._closed:
+                    batch = rows.fetchmany(256)
+                    if not batch:
+                        break
+                    for name, *row in batch:
+                        entry = self._row(*row)
+                        if entry is None:
+                            continue
+                        # Проверка и вставка под одной блокировкой: удаление не проскочит между ними
+                        with self._pending_lock:
+                            if name in self._touched or name in self._pending:
+                                continue
+                            if cache.add(tuple(name.split('\x1f')), *entry):
+                                self.stats['warmed'] += 1
+            finally:
+                connection.close()
+                with self._pending_lock:
+                    self._warming -= 1
+                    if not self._warming:
+                        self._touched.clear()
+
+        if not background:
+            load()
+            return None
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        self._connection.close()
+
+
 class CachedYouTubeClass(ThirdPartyYouTubeLib):
     """
     С другой стороны, можно кешировать запросы к YouTube и не
@@ -54,54 +652,392 @@ class CachedYouTubeClass(ThirdPartyYouTubeLib):
     кеширования в отдельный класс-обёртку. Он будет делегировать
     запросы к сервисному объекту, только если нужно
     непосредственно выслать запрос.
+
+    Записи живут не дольше TTL своего метода (ttls), кеш ограничен по размеру (см. CacheEngine),
+    а ответ VideoNotFoundError кешируется на negative_ttl секунд, чтобы несуществующие id не долбили сервис.
+    Одновременные промахи по одному ключу схлопываются в одно обращение к сервису (single_flight).
+    При заданном batch_window промахи get_video_info из разных потоков, пришедшие в пределах окна,
+    уходят в сервис одним вызовом get_videos_info (не больше max_batch id за раз).
+    С downloads (DownloadCache) видео скачивается один раз и дальше берётся с диска: download_video возвращает
+    его содержимое как отображение в память только для чтения, а путь к файлу даёт download_path.
+    С persistent (PersistentTier) записи дублируются в sqlite, промах в памяти сначала проверяется там,
+    а при старте кеш прогревается в фоне.
     """
+    DEFAULT_TTLS = {'list_videos': 60.0, 'get_video_info': 300.0}
 
-    def __init__(self, service: ThirdPartyYouTubeLib):
+    def __init__(self, service: ThirdPartyYouTubeLib, cache: Optional[CacheEngine] = None,
+                 ttls: Optional[Dict[str, float]] = None, negative_ttl: float = 30.0, verbose: bool = True,
+                 single_flight: bool = True, batch_window: Optional[float] = None, max_batch: int = 50,
+                 downloads: Optional[DownloadCache] = None, persistent: Optional[PersistentTier] = None):
         self._service = service
-        self._list_cache: Optional[List[str]] = None
-        self._video_cache: Dict[str, str] = {}
-        self._cache_valid: bool = True
+        self.cache = cache if cache is not None else CacheEngine()
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.verbose = verbose
+        self.flights = SingleFlight() if single_flight else None
+        self.loader = BatchLoader(service.get_videos_info, batch_window, max_batch) if batch_window else None
+        self.downloads = downloads
+        self.persistent = persistent
+        if persistent is not None:
+            persistent.warm(self.cache)
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def lookup(self, key: Tuple[str, ...], persistent: bool = True) -> Any:
+        """
+        Значение из кеша или MISSING; закешированный промах бросается снова.
+        С persistent=False постоянный уровень не спрашивается: так можно звать из цикла событий, не трогая диск.
+        """
+        value = self.cache.get(key)
+        if isinstance(value, CacheEntry):
+            self._log(f"Использование кеша промаха: {key}")
+            raise VideoNotFoundError(*value.value)
+        if value is not MISSING:
+            self._log(f"Использование кеша: {key}")
+            return value
+        return self.lookup_persistent(key) if persistent else MISSING
+
+    def lookup_persistent(self, key: Tuple[str, ...]) -> Any:
+        """Значение из постоянного уровня (и заодно в память) или MISSING. Читает sqlite, поэтому блокирует."""
+        stored = self.persistent.get(key) if self.persistent is not None else None
+        if stored is None:
+            return MISSING
+        self._log(f"Использование постоянного кеша: {key}")
+        value, ttl, negative = stored
+        self.cache.add(key, value, ttl, negative)
+        if negative:
+            raise VideoNotFoundError(*value)
+        return value
+
+    def _put(self, key: Tuple[str, ...], value: Any, ttl: Optional[float], negative: bool = False) -> None:
+        self.cache.put(key, value, ttl, negative)
+        if self.persistent is not None:
+            self.persistent.record(key, value, ttl, negative)
+
+    def store(self, method: str, key: Tuple[str, ...], fetch: Callable[[], Any]) -> Any:
+        """Загружает значение из сервиса и кладёт в кеш вместе с промахом VideoNotFoundError."""
+        self._log(f"Кеш устарел или отсутствует. Обновление кеша: {key}")
+        try:
+            value = fetch()
+        except VideoNotFoundError as error:
+            self._put(key, error.args, self.negative_ttl, negative=True)
+            raise
+        self._put(key, value, self.ttls.get(method))
+        return value
+
+    def _cached(self, method: str, key: Tuple[str, ...], fetch: Callable[[], Any]) -> Any:
+        value = self.lookup(key)
+        if value is not MISSING:
+            return value
+        if self.flights is None:
+            return self.store(method, key, fetch)
+        return self.flights.do(key, lambda: self.store(method, key, fetch))
 
     def list_videos(self) -> List[str]:
-        if self._list_cache is None or not self._cache_valid:
-            print("Кеш устарел или отсутствует. Обновление кеша списка видеороликов.")
-            self._list_cache = self._service.list_videos()
-            self._cache_valid = True
-        else:
-            print("Использование кеша для списка видеороликов.")
-        return self._list_cache
+        return self._cached('list_videos', ('list_videos',), self._service.list_videos)
 
     def get_video_info(self, video_id: str) -> str:
-        if video_id not in self._video_cache or not self._cache_valid:
-            print(f"Кеш устарел или отсутствует. Обновление кеша информации о видео: {video_id}")
-            self._video_cache[video_id] = self._service.get_video_info(video_id)
-            self._cache_valid = True
+        fetch = self._service.get_video_info if self.loader is None else self.loader.load
+        return self._cached('get_video_info', ('get_video_info', video_id), lambda: fetch(video_id))
+
+    def get_videos_info(self, video_ids: Iterable[str]) -> Dict[str, str]:
+        infos, missing = {}, []
+        for video_id in video_ids:
+            try:
+                info = self.lookup(('get_video_info', video_id))
+            except VideoNotFoundError:
+                continue
+            if info is MISSING:
+                missing.append(video_id)
+            else:
+                infos[video_id] = info
+
+        if missing:
+            self._log(f"Кеш отсутствует для {len(missing)} видео, один пакетный запрос")
+            fetched = self._service.get_videos_info(missing)
+            ttl = self.ttls.get('get_video_info')
+            for video_id in missing:
+                key = ('get_video_info', video_id)
+                if video_id in fetched:
+                    self._put(key, fetched[video_id], ttl)
+                    infos[video_id] = fetched[video_id]
+                else:
+                    self._put(key, (video_id,), self.negative_ttl, negative=True)
+        return infos
+
+    def invalidate(self, video_id: Optional[str] = None) -> None:
+        """Сбрасывает информацию о видео video_id или, без аргумента, закешированный список видео."""
+        key = ('get_video_info', video_id) if video_id is not None else ('list_videos',)
+        # Сначала удаление в постоянный уровень: с этого момента прогрев уже не вернёт ключ в память
+        if self.persistent is not None:
+            self.persistent.delete(key)
+        self.cache.invalidate(key)
+
+    def download_video(self, video_id: str) -> Union[str, mmap.mmap]:
+        self._log(f"Запрос на скачивание видео: {video_id}")
+        if self.downloads is None:
+            return self._service.download_video(video_id)
+        self.download_path(video_id)
+        return self.downloads.open(video_id)
+
+    def download_path(self, video_id: str) -> str:
+        """Путь к видео в DownloadCache; недостающие части докачиваются. Без downloads путь взять неоткуда."""
+        if self.downloads is None:
+            raise ValueError('download_path requires a DownloadCache')
+        if self.downloads.is_complete(video_id):
+            self._log(f"Видео {video_id} уже на диске")
+            return self.downloads.path(video_id)
+
+        def fetch() -> str:
+            return self.downloads.fetch(video_id, self._service, verify=True)
+        return fetch() if self.flights is None else self.flights.do(('download_video', video_id), fetch)
+
+
+class AsyncCachedYouTubeClass:
+    """
+    Асинхронный фасад того же кеширующего заместителя для кода на asyncio.
+    Синхронный сервис вызывается в пуле потоков, а одновременные промахи по ключу схлопываются в одну задачу.
+    """
+
+    def __init__(self, proxy: CachedYouTubeClass, executor: Optional[Executor] = None):
+        self.proxy = proxy
+        self.executor = executor
+        self.flights = AsyncSingleFlight()
+
+    async def _cached(self, method: str, key: Tuple[str, ...], fetch: Callable[[], Any]) -> Any:
+        value = self.proxy.lookup(key, persistent=False)
+        if value is not MISSING:
+            return value
+
+        def read_through() -> Any:
+            # Чтение sqlite и обращение к сервису блокируют, поэтому оба идут в пуле, а не в цикле событий
+            stored = self.proxy.lookup_persistent(key)
+            return stored if stored is not MISSING else self.proxy.store(method, key, fetch)
+
+        async def load() -> Any:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, read_through)
+
+        return await self.flights.do(key, load)
+
+    async def list_videos(self) -> List[str]:
+        return await self._cached('list_videos', ('list_videos',), self.proxy._service.list_videos)
+
+    async def get_video_info(self, video_id: str) -> str:
+        return await self._cached('get_video_info', ('get_video_info', video_id),
+                                  lambda: self.proxy._service.get_video_info(video_id))
+
+    async def download_video(self, video_id: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.proxy.download_video, video_id)
+
+
+class RateLimiter:
+    """
+    Ведро токенов: не больше rate запросов в секунду в среднем и не больше burst подряд.
+    Один экземпляр может делить весь трафик к сервису (см. MeteredYouTubeClass). Запросы пользователя
+    списывают токен сразу через charge, даже в долг, и никогда не ждут. Фоновые запросы ждут в acquire,
+    пока бюджет не восстановится, поэтому при всплеске пользовательского трафика фон отступает.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def charge(self) -> None:
+        """Списывает токен без ожидания; баланс может уйти в минус, и тогда фон ждёт дольше."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+
+    def wait(self) -> None:
+        """Ждёт, пока в бюджете не появится токен, не забирая его."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    @contextmanager
+    def background(self) -> Iterator[None]:
+        """Внутри блока обращения этого потока к сервису ждут токена (acquire), а не списывают его в долг."""
+        previous = getattr(self._local, 'background', False)
+        self._local.background = True
+        try:
+            yield
+        finally:
+            self._local.background = previous
+
+    def take(self) -> None:
+        if getattr(self._local, 'background', False):
+            self.acquire()
         else:
-            print(f"Использование кеша для информации о видео: {video_id}")
-        return self._video_cache[video_id]
+            self.charge()
+
+
+class MeteredYouTubeClass(ThirdPartyYouTubeLib):
+    """
+    Заместитель, который учитывает каждое обращение к сервису в общем RateLimiter.
+    Ставится под кеширующим заместителем, так что попадания в кеш бюджет не тратят, а промахи
+    пользователя и прогрев тратят его поровну.
+    """
+
+    def __init__(self, service: ThirdPartyYouTubeLib, limiter: RateLimiter):
+        self._service = service
+        self.limiter = limiter
+
+    def list_videos(self) -> List[str]:
+        self.limiter.take()
+        return self._service.list_videos()
+
+    def get_video_info(self, video_id: str) -> str:
+        self.limiter.take()
+        return self._service.get_video_info(video_id)
+
+    def get_videos_info(self, video_ids: Iterable[str]) -> Dict[str, str]:
+        self.limiter.take()
+        return self._service.get_videos_info(video_ids)
 
     def download_video(self, video_id: str) -> str:
-        print(f"Запрос на скачивание видео: {video_id}")
+        self.limiter.take()
         return self._service.download_video(video_id)
 
+    def video_size(self, video_id: str) -> int:
+        self.limiter.take()
+        return self._service.video_size(video_id)
+
+    def download_range(self, video_id: str, start: int, end: int) -> bytes:
+        self.limiter.take()
+        return self._service.download_range(video_id, start, end)
+
+    def supports_ranges(self) -> bool:
+        return self._service.supports_ranges()
+
+
+class Prefetcher:
+    """
+    Фоновый прогрев информации о видео. Задания лежат в очереди с приоритетом (меньше — раньше) и выполняются
+    workers потоками. budget — общий лимит сервиса: тот же RateLimiter, что у MeteredYouTubeClass под прокси.
+    Запросы пользователя списывают из него без ожидания, а прогрев ждёт, пока в бюджете не появится токен,
+    так что вместе они не превышают лимит, а при нехватке бюджета отступает именно прогрев.
+    cancel() отменяет всё поставленное ранее: задания старого поколения выбрасываются, не доходя до сервиса.
+    Уже закешированные id пропускаются, а совпавший с пользователем запрос схлопывается single-flight прокси.
+    """
+
+    def __init__(self, service: ThirdPartyYouTubeLib, workers: int = 4, budget: Optional[RateLimiter] = None,
+                 max_queue: int = 1024):
+        self.service = service
+        self.budget = budget
+        # (приоритет, позиция в списке, порядок постановки, поколение, id видео или None для остановки)
+        self._queue: 'queue.PriorityQueue[Tuple[int, int, int, int, Optional[str]]]' = queue.PriorityQueue(max_queue)
+        self._order = count()
+        self._generation = 0
+        self.stats = {'scheduled': 0, 'fetched': 0, 'skipped': 0, 'cancelled': 0, 'dropped': 0, 'failed': 0}
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def prefetch(self, video_ids: Iterable[str], priority: int = 0) -> None:
+        """Ставит id в очередь; внутри одного вызова раньше идут первые id (они выше на экране)."""
+        generation = self._generation
+        for position, video_id in enumerate(video_ids):
+            try:
+                self._queue.put_nowait((priority, position, next(self._order), generation, video_id))
+                self.stats['scheduled'] += 1
+            except queue.Full:
+                self.stats['dropped'] += 1
+
+    def cancel(self) -> None:
+        self._generation += 1
+
+    def _cached(self, video_id: str) -> bool:
+        return isinstance(self.service, CachedYouTubeClass) and ('get_video_info', video_id) in self.service.cache
+
+    def _work(self) -> None:
+        while True:
+            *_, generation, video_id = self._queue.get()
+            if video_id is None:
+                return
+            if generation != self._generation:
+                self.stats['cancelled'] += 1
+                continue
+            if self._cached(video_id):
+                self.stats['skipped'] += 1
+                continue
+            if self.budget is not None:
+                self.budget.wait()
+                if generation != self._generation:
+                    self.stats['cancelled'] += 1
+                    continue
+            try:
+                if self.budget is None:
+                    self.service.get_video_info(video_id)
+                else:
+                    # Токен забирает сам MeteredYouTubeClass при обращении к сервису, и только при промахе кеша
+                    with self.budget.background():
+                        self.service.get_video_info(video_id)
+                self.stats['fetched'] += 1
+            except Exception:
+                self.stats['failed'] += 1
+
+    def close(self) -> None:
+        self.cancel()
+        for _ in self._workers:
+            self._queue.put((sys.maxsize, 0, next(self._order), self._generation, None))
+        for worker in self._workers:
+            worker.join()
+
 
 class YouTubeManager:
-    def __init__(self, service: ThirdPartyYouTubeLib):
+    def __init__(self, service: ThirdPartyYouTubeLib, prefetcher: Optional[Prefetcher] = None, verbose: bool = True):
         self.service = service
+        self.prefetcher = prefetcher
+        self.verbose = verbose
 
     def render_video_page(self, video_id: str) -> None:
         info = self.service.get_video_info(video_id)
-        print(f"Отображение страницы видео для {video_id}: {info}")
+        if self.verbose:
+            print(f"Отображение страницы видео для {video_id}: {info}")
         # Логика отображения страницы видеоролика
 
-    def render_list_panel(self) -> None:
+    def render_list_panel(self) -> List[str]:
         video_list = self.service.list_videos()
-        print(f"Отображение панели списка с видеороликами: {video_list}")
+        if self.prefetcher is not None:
+            # Новый список: прогрев прежнего больше не нужен
+            self.prefetcher.cancel()
+            self.prefetcher.prefetch(video_list)
+        if self.verbose:
+            print(f"Отображение панели списка с видеороликами: {video_list}")
         # Логика отображения списка превьюшек видеороликов
+        return video_list
 
     def download_video(self, video_id: str) -> None:
         self.service.download_video(video_id)
-        print(f"Скачивание видео: {video_id}")
+        if self.verbose:
+            print(f"Скачивание видео: {video_id}")
 
     def react_on_user_input(self) -> None:
         self.render_video_page("video1")
@@ -109,8 +1045,318 @@ class YouTubeManager:
         self.render_list_panel()
 
 
+def zipf_ids(catalog: int, requests: int, exponent: float = 1.1, seed: int = 1) -> List[str]:
+    weights = accumulate(1 / rank ** exponent for rank in range(1, catalog + 1))
+    ids = [f'video{number}' for number in range(catalog)]
+    return random.Random(seed).choices(ids, cum_weights=list(weights), k=requests)
+
+
+class LocalYouTubeClass(ThirdPartyYouTubeLib):
+    """
+    Локальная замена сервиса для замеров: без вывода, с подсчётом обращений и задержкой latency на запрос.
+    connections ограничивает число одновременных запросов, как пул соединений у настоящего клиента.
+    """
+
+    def __init__(self, catalog: int = 1_000_000, latency: float = 0.0, connections: Optional[int] = None,
+                 video_bytes: int = 16 * 1024 * 1024):
+        self.catalog = catalog
+        self.latency = latency
+        self.video_bytes = video_bytes
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._connections = threading.BoundedSemaphore(connections) if connections else None
+
+    def _request(self) -> None:
+        with self._lock:
+            self.calls += 1
+        if not self.latency:
+            return
+        if self._connections is None:
+            time.sleep(self.latency)
+            return
+        with self._connections:
+            time.sleep(self.latency)
+
+    def list_videos(self) -> List[str]:
+        self._request()
+        return [f'video{number}' for number in range(min(self.catalog, 50))]
+
+    def get_video_info(self, video_id: str) -> str:
+        self._request()
+        if int(video_id[5:]) >= self.catalog:
+            raise VideoNotFoundError(video_id)
+        return f"Информация о видео: {video_id}" + ' ' * 200
+
+    def get_videos_info(self, video_ids: Iterable[str]) -> Dict[str, str]:
+        self._request()
+        return {video_id: f"Информация о видео: {video_id}" + ' ' * 200
+                for video_id in video_ids if int(video_id[5:]) < self.catalog}
+
+    def download_video(self, video_id: str) -> str:
+        self._request()
+        return f"Скачивание видео: {video_id}"
+
+    def video_size(self, video_id: str) -> int:
+        self._request()
+        return self.video_bytes
+
+    def download_range(self, video_id: str, start: int, end: int) -> bytes:
+        # Содержимое детерминировано: байты идут по кругу со сдвигом, зависящим от id
+        self._request()
+        shift = sum(video_id.encode()) % 256
+        pattern = bytes((shift + number) % 256 for number in range(256))
+        offset = start % 256
+        repeated = pattern * ((end - start + offset) // 256 + 1)
+        return repeated[offset:offset + end - start]
+
+
+def benchmark_cache(catalog: int = 200_000, requests: int = 1_000_000, max_entries: int = 10_000) -> None:
+    """Zipf-распределённые запросы get_video_info: доля попаданий, задержка попадания и память кеша."""
+    ids = zipf_ids(catalog, requests)
+    print(f'{requests} запросов по {catalog} id (Zipf 1.1), кеш на {max_entries} записей')
+    for policy in ('unbounded', 'lru', 'slru'):
+        service = LocalYouTubeClass(catalog)
+        engine = CacheEngine(catalog if policy == 'unbounded' else max_entries,
+                             'lru' if policy == 'unbounded' else policy)
+        proxy = CachedYouTubeClass(service, engine, verbose=False)
+        tracemalloc.start()
+        for video_id in ids:
+            proxy.get_video_info(video_id)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        hot = ids[:10_000]
+        for video_id in hot:
+            proxy.get_video_info(video_id)
+        hits_before = engine.stats['hits']
+        started = perf_counter()
+        for video_id in hot:
+            proxy.get_video_info(video_id)
+        elapsed = perf_counter() - started
+        hit_latency = elapsed / max(engine.stats['hits'] - hits_before, 1)
+
+        print(f'  {policy:>9}: попаданий {1 - service.calls / requests:6.1%}, обращений к сервису {service.calls}, '
+              f'вытеснений {engine.stats["evictions"]}, попадание {hit_latency * 1e6:.2f} мкс, '
+              f'память {memory / 1e6:.1f} МБ')
+
+
+def benchmark_single_flight(callers: int = 64, keys: int = 4, latency: float = 0.05) -> None:
+    """callers потоков (и корутин) одновременно запрашивают keys ещё не закешированных видео у медленного сервиса."""
+    print(f'{callers} одновременных запросов по {keys} id, сервис отвечает за {latency * 1000:.0f} мс')
+    for single_flight in (False, True):
+        service = LocalYouTubeClass(latency=latency)
+        proxy = CachedYouTubeClass(service, verbose=False, single_flight=single_flight)
+        barrier = threading.Barrier(callers)
+
+        def call(number: int) -> None:
+            barrier.wait()
+            proxy.get_video_info(f'video{number % keys}')
+
+        threads = [threading.Thread(target=call, args=(number,)) for number in range(callers)]
+        started = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - started
+        title = 'single-flight' if single_flight else 'без схлопывания'
+        print(f'  потоки, {title:>15}: обращений к сервису {service.calls} ({service.calls / keys:.0f} на id), '
+              f'{elapsed * 1000:.0f} мс')
+
+    async def coroutines() -> None:
+        service = LocalYouTubeClass(latency=latency)
+        proxy = AsyncCachedYouTubeClass(CachedYouTubeClass(service, verbose=False))
+        started = perf_counter()
+        await asyncio.gather(*(proxy.get_video_info(f'video{number % keys}') for number in range(callers)))
+        elapsed = perf_counter() - started
+        print(f'  asyncio, {"single-flight":>15}: обращений к сервису {service.calls} '
+              f'({service.calls / keys:.0f} на id), {elapsed * 1000:.0f} мс')
+
+    asyncio.run(coroutines())
+
+
+def benchmark_batching(pages: int = 10, page_size: int = 50, latency: float = 0.02, connections: int = 4) -> None:
+    """
+    Страницы по page_size превьюшек: каждую превьюшку запрашивает свой поток (как делает UI),
+    у сервиса latency на запрос и connections соединений. Без пакетов, с окном BatchLoader и явный get_videos_info.
+    """
+    print(f'{pages} страниц по {page_size} видео, сервис: {latency * 1000:.0f} мс на запрос, {connections} соединения')
+
+    def render(proxy: CachedYouTubeClass, page: int) -> None:
+        ids = [f'video{page * page_size + number}' for number in range(page_size)]
+        threads = [threading.Thread(target=proxy.get_video_info, args=(video_id,)) for video_id in ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def render_batch(proxy: CachedYouTubeClass, page: int) -> None:
+        proxy.get_videos_info(f'video{page * page_size + number}' for number in range(page_size))
+
+    for title, window, page_render in (('по одному', None, render), ('окно 2 мс', 0.002, render),
+                                       ('get_videos_info', None, render_batch)):
+        service = LocalYouTubeClass(latency=latency, connections=connections)
+        proxy = CachedYouTubeClass(service, verbose=False, batch_window=window, max_batch=page_size)
+        latencies = []
+        for page in range(pages):
+            started = perf_counter()
+            page_render(proxy, page)
+            latencies.append(perf_counter() - started)
+        total = sum(latencies)
+        print(f'  {title:>15}: страница {total / pages * 1000:6.0f} мс, {pages * page_size / total:7.0f} видео/с, '
+              f'обращений к сервису {service.calls}')
+
+
+def benchmark_downloads(video_mb: int = 32, segment_kb: int = 1024, latency: float = 0.02) -> None:
+    """
+    Скачивание видео video_mb МБ сегментами по segment_kb КБ у сервиса с задержкой latency на запрос:
+    разное число потоков, докачка после обрыва на середине и повторная отдача с диска через sendfile.
+    """
+    video_bytes = video_mb * 1024 * 1024
+    expected = LocalYouTubeClass(video_bytes=video_bytes).download_range('video1', 0, video_bytes)
+    print(f'Видео {video_mb} МБ, сегменты по {segment_kb} КБ, {latency * 1000:.0f} мс на запрос')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in (1, 4, 8):
+            service = LocalYouTubeClass(latency=latency, video_bytes=video_bytes)
+            downloads = DownloadCache(os.path.join(directory, str(workers)), segment_kb * 1024, workers)
+            proxy = CachedYouTubeClass(service, verbose=False, downloads=downloads)
+            started = perf_counter()
+            path = proxy.download_path('video1')
+            elapsed = perf_counter() - started
+            with open(path, 'rb') as file:
+                assert file.read() == expected
+            print(f'  потоков {workers}: {elapsed * 1000:6.0f} мс, {video_mb / elapsed:6.1f} МБ/с')
+
+        class BrokenService(LocalYouTubeClass):
+            def download_range(self, video_id: str, start: int, end: int) -> bytes:
+                if start >= video_bytes // 2:
+                    raise ConnectionError('connection reset')
+                return super().download_range(video_id, start, end)
+
+        downloads = DownloadCache(os.path.join(directory, 'resume'), segment_kb * 1024, 4)
+        try:
+            downloads.fetch('video1', BrokenService(latency=latency, video_bytes=video_bytes))
+        except ConnectionError:
+            pass
+        # Портим один уже скачанный сегмент: докачка должна его заметить
+        with open(downloads.path('video1'), 'r+b') as file:
+            file.write(b'\xff' * 16)
+        service = LocalYouTubeClass(latency=latency, video_bytes=video_bytes)
+        downloads.stats = dict.fromkeys(downloads.stats, 0)
+        started = perf_counter()
+        path = downloads.fetch('video1', service)
+        elapsed = perf_counter() - started
+        with open(path, 'rb') as file:
+            assert file.read() == expected
+        print(f'  докачка после обрыва: {elapsed * 1000:6.0f} мс, сегментов скачано {downloads.stats["segments_fetched"]}, '
+              f'взято с диска {downloads.stats["segments_reused"]}, испорченных {downloads.stats["segments_corrupt"]}')
+
+        proxy = CachedYouTubeClass(service, verbose=False, downloads=downloads)
+        calls = service.calls
+        started = perf_counter()
+        proxy.download_path('video1')
+        with open(os.path.join(directory, 'copy'), 'wb') as destination:
+            sent = downloads.send('video1', destination)
+        elapsed = perf_counter() - started
+        print(f'  повторная отдача: {elapsed * 1000:6.1f} мс, {sent / elapsed / 1e9:.2f} ГБ/с, '
+              f'обращений к сервису {service.calls - calls}')
+
+
+def benchmark_warm_start(catalog: int = 50_000, requests: int = 200_000, max_entries: int = 20_000) -> None:
+    """
+    Процесс работает с кешем на sqlite, затем «перезапускается»: сравниваются обращения к сервису
+    за первые запросы после рестарта с холодным кешем и с постоянным уровнем, а также время старта.
+    """
+    ids = zipf_ids(catalog, requests)
+    after_restart = zipf_ids(catalog, 20_000, seed=2)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.sqlite')
+        tier = PersistentTier(path)
+        proxy = CachedYouTubeClass(LocalYouTubeClass(catalog), CacheEngine(max_entries), verbose=False,
+                                   persistent=tier)
+        started = perf_counter()
+        for video_id in ids:
+            proxy.get_video_info(video_id)
+        elapsed = perf_counter() - started
+        tier.close()
+        print(f'{requests} запросов до рестарта: {elapsed:.2f} с, записано в sqlite {tier.stats["written"]} '
+              f'за {tier.stats["flushes"]} сбросов')
+
+        for title, persistent in (('холодный', False), ('sqlite', True)):
+            service = LocalYouTubeClass(catalog)
+            started = perf_counter()
+            tier = PersistentTier(path) if persistent else None
+            proxy = CachedYouTubeClass(service, CacheEngine(max_entries), verbose=False, persistent=tier)
+            startup = perf_counter() - started
+            first = perf_counter()
+            proxy.get_video_info(after_restart[0])
+            first = perf_counter() - first
+            for video_id in after_restart:
+                proxy.get_video_info(video_id)
+            print(f'  {title:>9}: старт {startup * 1000:6.1f} мс, первый запрос {first * 1000:6.2f} мс, '
+                  f'обращений к сервису за {len(after_restart)} запросов: {service.calls}')
+            if tier is not None:
+                tier.close()
+
+
+def benchmark_prefetch(sessions: int = 100, page_size: int = 50, latency: float = 0.03, think: float = 0.3,
+                       workers: int = 8, rate: float = 200.0) -> None:
+    """
+    Пользователь открывает список из page_size видео, думает от 0 до think секунд и открывает одно из них
+    (верхние пункты выбирают чаще: вес 1 / позиция).
+    Замеряется задержка страницы видео (p50/p99) без прогрева и с Prefetcher (workers потоков).
+    Весь трафик к сервису, пользовательский и фоновый, делит общий бюджет rate запросов/с.
+    """
+    class PagedService(LocalYouTubeClass):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.pages = count()
+
+        def list_videos(self) -> List[str]:
+            self._request()
+            page = next(self.pages)
+            return [f'video{page * page_size + number}' for number in range(page_size)]
+
+    rng = random.Random(3)
+    positions = rng.choices(range(page_size), [1 / rank for rank in range(1, page_size + 1)], k=sessions)
+    behaviour = [(rng.uniform(0, think), position) for position in positions]
+    print(f'{sessions} сессий: список из {page_size} видео, сервис {latency * 1000:.0f} мс, '
+          f'размышление до {think * 1000:.0f} мс')
+    for prefetch in (False, True):
+        service = PagedService(latency=latency)
+        limiter = RateLimiter(rate, burst=workers)
+        # Каждый заход на панель — свежий список: кешировать его нельзя
+        proxy = CachedYouTubeClass(MeteredYouTubeClass(service, limiter), ttls={'list_videos': 0}, verbose=False)
+        prefetcher = Prefetcher(proxy, workers, limiter) if prefetch else None
+        manager = YouTubeManager(proxy, prefetcher, verbose=False)
+        latencies = []
+        for pause, position in behaviour:
+            video_id = manager.render_list_panel()[position]
+            time.sleep(pause)
+            started = perf_counter()
+            manager.render_video_page(video_id)
+            latencies.append(perf_counter() - started)
+        if prefetcher is not None:
+            prefetcher.close()
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        extra = f', прогрев: {prefetcher.stats}' if prefetcher is not None else ''
+        print(f'  {"с прогревом" if prefetch else "без прогрева":>12}: p50 {p50 * 1000:6.2f} мс, '
+              f'p99 {p99 * 1000:6.2f} мс, обращений к сервису {service.calls}{extra}')
+
+
 if __name__ == "__main__":
-    youtube_service = ThirdPartyYouTubeClass()
-    youtube_proxy = CachedYouTubeClass(youtube_service)
-    manager = YouTubeManager(youtube_proxy)
-    manager.react_on_user_input()
+    if 'bench' in sys.argv[1:]:
+        benchmark_cache()
+        benchmark_single_flight()
+        benchmark_batching()
+        benchmark_downloads()
+        benchmark_warm_start()
+        benchmark_prefetch()
+    else:
+        youtube_service = ThirdPartyYouTubeClass()
+        youtube_proxy = CachedYouTubeClass(youtube_service)
+        manager = YouTubeManager(youtube_proxy)
+        manager.react_on_user_input()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Модули примеров не оформлены пакетами и запускаются как скрипты, поэтому тесты импортируют их по имени
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('behavioral', 'creational', 'structural'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
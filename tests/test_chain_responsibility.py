@@ -0,0 +1,135 @@
+import random
+import sys
+
+import pytest
+
+from chain_responsibility import Application, Button, Container, Dialog, HitIndex, Panel, traverse
+
+
+@pytest.fixture
+def dialog():
+    dialog = Dialog('Отчёты', wiki_page_url='http://...')
+    panel = Panel(0, 0, 400, 800, modal_help_text='Эта панель предназначена для...')
+    panel.add_child(Button(250, 760, 50, 20, 'ОК', tooltip_text='Это кнопка OK'))
+    panel.add_child(Button(320, 760, 50, 20, 'Отмена'))
+    dialog.add_child(panel)
+    return dialog
+
+
+@pytest.mark.parametrize('order, expected', [
+    ('pre', [Dialog, Panel, 'ОК', 'Отмена']),
+    ('post', ['ОК', 'Отмена', Panel, Dialog]),
+    ('bfs', [Dialog, Panel, 'ОК', 'Отмена']),
+])
+def test_traverse_orders(dialog, order, expected):
+    assert [node.text if isinstance(node, Button) else type(node) for node in traverse(dialog, order)] == expected
+
+
+def test_traverse_prune_skips_subtree(dialog):
+    assert list(traverse(dialog, prune=lambda node: isinstance(node, Panel))) == [dialog]
+
+
+def test_help_chain_deeper_than_recursion_limit(capsys):
+    root = node = Dialog('Корень', wiki_page_url='http://root')
+    for _ in range(sys.getrecursionlimit() * 3):
+        child = Container()
+        node.add_child(child)
+        node = child
+    leaf = Button(0, 0, 1, 1, 'Глубоко')
+    node.add_child(leaf)
+    leaf.show_help()
+    assert 'http://root' in capsys.readouterr().out
+    assert leaf.help_handler() is root
+    assert sum(1 for _ in traverse(root, 'post')) == sys.getrecursionlimit() * 3 + 2
+
+
+def test_help_handler_is_memoized_and_forgotten_when_the_chain_changes(dialog, capsys):
+    panel = dialog.children[0]
+    ok, cancel = panel.children
+    cancel.show_help()
+    assert cancel.help_handler() is panel and panel.help_handler() is panel
+    asked = []
+    for component in (cancel, panel):
+        component.handle_help = lambda component=component: asked.append(component) or component is panel
+    cancel.show_help()
+    # Повторный запрос идёт сразу к запомненному обработчику, минуя кнопку
+    assert asked == [panel]
+    del cancel.handle_help, panel.handle_help
+
+    cancel.tooltip_next = 'Отменяет изменения'
+    assert cancel.help_handler() is None
+    cancel.show_help()
+    assert cancel.help_handler() is cancel
+
+    panel.modal_help_text = None
+    assert ok.help_handler() is None and cancel.help_handler() is cancel
+    ok.tooltip_next = None
+    ok.show_help()
+    assert ok.help_handler() is dialog
+
+    other = Dialog('Другой', wiki_page_url='http://other')
+    other.add_child(panel)
+    assert ok.help_handler() is None
+    ok.show_help()
+    assert ok.help_handler() is other and 'http://other' in capsys.readouterr().out
+
+
+def test_memoized_handler_that_refuses_falls_back_to_the_chain(dialog):
+    panel = dialog.children[0]
+    cancel = panel.children[1]
+    cancel.show_help()
+    # Обработчик отказался, не сбрасывая кеш: проход идёт дальше по цепочке
+    panel._modal_help_text = None
+    cancel.show_help()
+    assert cancel.help_handler() is dialog
+
+
+def topmost(root, x: int, y: int):
+    """Полный обход: последний в прямом порядке компонент под точкой, чьи предки её тоже накрывают."""
+    def outside(node) -> bool:
+        rect = node.rect()
+        return rect is not None and not (rect[0] <= x < rect[2] and rect[1] <= y < rect[3])
+
+    found = root
+    for node in traverse(root, prune=outside):
+        if node.rect() is not None:
+            found = node
+    return found
+
+
+def test_hit_index_matches_a_full_walk_through_edits():
+    rng = random.Random(6)
+    dialog = Dialog('Экран')
+    index = HitIndex(dialog, cell_size=16, max_cells=20)
+    panels = []
+    for _ in range(6):
+        panel = Panel(rng.randrange(200), rng.randrange(200), rng.randrange(20, 150), rng.randrange(20, 150))
+        dialog.add_child(panel)
+        panels.append(panel)
+        for _ in range(8):
+            panel.add_child(Button(rng.randrange(300), rng.randrange(300), rng.randrange(1, 40), rng.randrange(1, 40),
+                                   'кнопка'))
+    nodes = [node for node in traverse(dialog) if node is not dialog]
+    for _ in range(300):
+        node = rng.choice(nodes)
+        action = rng.random()
+        if action < 0.3:
+            node.move_to(rng.randrange(300), rng.randrange(300))
+        elif action < 0.5:
+            node.width = rng.randrange(1, 200)
+        elif action < 0.6 and isinstance(node, Button):
+            rng.choice(panels).add_child(node)
+        for _ in range(10):
+            x, y = rng.randrange(-10, 360), rng.randrange(-10, 360)
+            assert index.component_at(x, y) is topmost(dialog, x, y)
+
+
+def test_application_finds_the_button_under_the_mouse():
+    app = Application()
+    app.create_ui()
+    app.on_mouse_move(260, 770)
+    assert app.get_component_at_mouse_coords().text == 'ОК'
+    app.on_mouse_move(10, 10)
+    assert isinstance(app.get_component_at_mouse_coords(), Panel)
+    app.on_mouse_move(500, 10)
+    assert app.get_component_at_mouse_coords() is app.dialog
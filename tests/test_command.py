@@ -0,0 +1,209 @@
+import os
+import random
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from command import Command, CommandBus, Document, History, SetFieldCommand, _SpillStack
+
+
+def replay(history: History, document: Document, steps: int, seed: int) -> list:
+    """Случайная смесь команд, отмен и повторов; возвращает, сколько шагов не совпало с эталоном."""
+    rng = random.Random(seed)
+    states = [dict(document.fields)]
+    position = 0
+    for _ in range(steps):
+        action = rng.random()
+        if action < 0.5:
+            history.execute(SetFieldCommand(document, f'f{rng.randrange(20)}', rng.randrange(1000)))
+            del states[position + 1:]
+            states.append(dict(document.fields))
+            position += 1
+        elif action < 0.8:
+            if history.undo():
+                position -= 1
+        elif history.redo():
+            position += 1
+        assert document.fields == states[position]
+    return states
+
+
+def test_undo_and_redo_cross_the_spill_boundary(tmp_path, monkeypatch):
+    monkeypatch.setattr(_SpillStack, 'COMPACT_BYTES', 256)
+    document = Document()
+    history = History(document, max_bytes=2_000, spill_path=str(tmp_path / 'undo'))
+    replay(history, document, 5_000, seed=1)
+    assert history.stats['spilled'] and not history.stats['dropped'] and not history.stats['dropped_redo']
+    # Всё отменяется до исходного документа и повторяется обратно, часть шагов — из файлов
+    final = dict(document.fields)
+    while history.undo():
+        pass
+    assert document.fields == {}
+    while history.redo():
+        pass
+    assert document.fields == final
+    history.close()
+
+
+def test_spill_stack_appends_and_compacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(_SpillStack, 'COMPACT_BYTES', 0)
+    path = str(tmp_path / 'stack')
+    stack = _SpillStack(path)
+
+    def size_on_disk() -> int:
+        stack._file.flush()
+        return os.path.getsize(path)
+
+    blobs = [bytes([n]) * (n + 1) for n in range(10)]
+    for blob in blobs:
+        stack.push(blob)
+    size = size_on_disk()
+    assert stack.pop() == blobs[-1]
+    # Снятая запись не перезаписывается, а остаётся в файле
+    assert size_on_disk() == size
+    while size_on_disk() == size:
+        assert stack.pop() == blobs[stack.count]
+    # Мёртвых байт стало больше живых: файл сжат до оставшихся записей
+    live = blobs[:stack.count]
+    assert len(live) > 1 and size_on_disk() == sum(len(blob) + _SpillStack.TRAILER.size for blob in live)
+    stack.push(b'new')
+    assert [stack.pop() for _ in range(stack.count)] == [b'new'] + live[::-1]
+    assert size_on_disk() == 0
+    stack.close()
+
+
+def test_without_spill_undo_goes_first_and_drops_are_counted():
+    document = Document()
+    history = History(document, max_bytes=1_500)
+    for n in range(100):
+        history.execute(SetFieldCommand(document, 'title', n))
+    dropped = history.stats['dropped']
+    assert dropped and len(history) == 100 - dropped
+    while history.undo():
+        pass
+    # Отмена доходит до самого старого сохранённого шага, и вся ветка повтора цела
+    assert document.fields == {'title': dropped - 1}
+    while history.redo():
+        pass
+    assert document.fields == {'title': 99}
+    assert history.stats['dropped_redo'] == 0
+    assert history._push(history._undo, b'x' * 2_000)
+
+
+@pytest.mark.parametrize('spill', [False, True])
+def test_random_history_matches_reference(tmp_path, spill):
+    document = Document()
+    history = History(document, max_bytes=3_000, spill_path=str(tmp_path / 'undo') if spill else None)
+    replay(history, document, 3_000, seed=2)
+    history.close()
+
+
+class Gate(Command):
+    """Занимает рабочий поток шины, пока тест его не отпустит."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def execute(self) -> None:
+        self.started.set()
+        self.release.wait(5)
+
+
+class Record(Command):
+    def __init__(self, log: list, name: str, priority: int = 0):
+        self.log = log
+        self.name = name
+        self.priority = priority
+
+    def execute(self) -> str:
+        self.log.append(self.name)
+        return self.name
+
+
+class FailingBatch(SetFieldCommand):
+    def execute_batch(self, commands):
+        raise OSError('storage is gone')
+
+
+@pytest.fixture
+def gated_bus():
+    bus = CommandBus(workers=1, max_pending=3)
+    gate = Gate()
+    bus.submit(gate)
+    gate.started.wait(5)
+    yield bus, gate
+    gate.release.set()
+    bus.close()
+
+
+def test_bus_keeps_per_document_order_under_concurrent_producers():
+    bus = CommandBus(workers=4, max_batch=16)
+    documents = [Document() for _ in range(3)]
+
+    def produce(producer: int) -> list:
+        return [bus.submit(SetFieldCommand(documents[step % 3], f'p{producer}.f{step % 5}', step))
+                for step in range(2000)]
+
+    futures = []
+    producers = [threading.Thread(target=lambda n=n: futures.extend(produce(n))) for n in range(4)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    bus.close()
+    assert all(future.done() and future.exception() is None for future in futures)
+    for number, document in enumerate(documents):
+        expected = {}
+        for step in range(2000):
+            if step % 3 == number:
+                expected.update({f'p{producer}.f{step % 5}': step for producer in range(4)})
+        assert document.fields == expected
+    assert bus.stats['submitted'] == 8000
+    assert bus.stats['executed'] + bus.stats['coalesced'] == 8000
+
+
+def test_bus_runs_urgent_commands_first_and_skips_cancelled_ones(gated_bus):
+    bus, gate = gated_bus
+    log = []
+    late = bus.submit(Record(log, 'late', priority=5))
+    cancelled = bus.submit(Record(log, 'cancelled', priority=0))
+    urgent = bus.submit(Record(log, 'urgent', priority=-1))
+    assert cancelled.cancel()
+    gate.release.set()
+    assert late.result(5) == 'late' and urgent.result(5) == 'urgent'
+    assert log == ['urgent', 'late']
+    with pytest.raises(CancelledError):
+        cancelled.result()
+
+
+def test_bus_coalesces_queued_writes_and_bounds_the_queue(gated_bus):
+    bus, gate = gated_bus
+    document = Document()
+    first = bus.submit(SetFieldCommand(document, 'title', 'draft'))
+    second = bus.submit(SetFieldCommand(document, 'title', 'final'))
+    bus.submit(SetFieldCommand(document, 'body', 'text'))
+    bus.submit(SetFieldCommand(document, 'author', 'me'))
+    bus.submit(SetFieldCommand(document, 'title', 'really final'))
+    with pytest.raises(OverflowError):
+        bus.submit(SetFieldCommand(document, 'tags', 'x'), block=False)
+    with pytest.raises(TimeoutError):
+        bus.submit(SetFieldCommand(document, 'tags', 'x'), timeout=0.05)
+    gate.release.set()
+    assert first.result(5) is second.result(5) is None
+    bus.close()
+    assert document.fields == {'title': 'really final', 'body': 'text', 'author': 'me'} and document.applies == 1
+    assert bus.stats['coalesced'] == 2
+    with pytest.raises(RuntimeError):
+        bus.submit(SetFieldCommand(document, 'title', 'too late'))
+
+
+def test_bus_fails_every_future_of_a_failed_batch(gated_bus):
+    bus, gate = gated_bus
+    document = Document()
+    futures = [bus.submit(FailingBatch(document, field, 1)) for field in ('a', 'b')]
+    gate.release.set()
+    for future in futures:
+        with pytest.raises(OSError, match='storage is gone'):
+            future.result(5)
@@ -0,0 +1,132 @@
+import sys
+
+import pytest
+
+from composite import CompoundGraphic, Dot, HeadlessRenderer, Rect, traverse
+
+
+class RecordingRenderer(HeadlessRenderer):
+    def __init__(self) -> None:
+        super().__init__()
+        self.cleared = []
+        self.frames = []
+
+    def clear(self, rect: Rect) -> None:
+        super().clear(rect)
+        self.cleared.append(rect)
+
+    def draw_frame(self, rect: Rect) -> None:
+        super().draw_frame(rect)
+        self.frames.append(rect)
+
+
+def covered(rect: Rect, regions) -> bool:
+    return any(region.left <= rect.left and rect.right <= region.right
+               and region.top <= rect.top and rect.bottom <= region.bottom for region in regions)
+
+
+def test_redraw_erases_old_frame_of_group_whose_bounds_changed():
+    scene = CompoundGraphic()
+    group = CompoundGraphic()
+    edge = Dot(0, 0)
+    group.add(edge)
+    group.add(Dot(50, 50))
+    scene.add(group)
+    scene.add(Dot(200, 200))
+    scene.draw(HeadlessRenderer())
+    old_frame = group.bounds()
+
+    edge.move(20, 20)
+    renderer = RecordingRenderer()
+    scene.redraw(renderer)
+
+    assert group.bounds() == Rect(20, 20, 51, 51)
+    assert covered(old_frame, renderer.cleared)
+    assert group.bounds() in renderer.frames
+
+
+def test_redraw_erases_frame_of_group_left_empty_by_remove():
+    scene = CompoundGraphic()
+    group = CompoundGraphic()
+    inner = Dot(10, 10)
+    group.add(inner)
+    group.add(Dot(30, 30))
+    scene.add(group)
+    scene.draw(HeadlessRenderer())
+    old_frame = group.bounds()
+
+    group.remove(inner)
+    renderer = RecordingRenderer()
+    scene.redraw(renderer)
+
+    assert covered(old_frame, renderer.cleared)
+
+
+def test_redraw_of_untouched_interior_move_keeps_damage_local():
+    scene = CompoundGraphic()
+    group = CompoundGraphic()
+    for x in range(0, 100, 10):
+        group.add(Dot(x, 0))
+    scene.add(group)
+    scene.draw(HeadlessRenderer())
+
+    group.children[5].move(1, 0)
+    renderer = RecordingRenderer()
+    regions = scene.redraw(renderer)
+
+    assert regions and all(covered(region, [Rect(50, 0, 52, 1)]) for region in regions)
+    assert renderer.frames == [group.bounds(), scene.bounds()]
+
+
+def test_nested_bounds_follow_moves():
+    scene = CompoundGraphic()
+    group = CompoundGraphic()
+    group.add(Dot(5, 5))
+    scene.add(group)
+    group.children[0].move(10, 10)
+    assert group.bounds() == Rect(15, 15, 16, 16)
+    assert scene.bounds() == Rect(15, 15, 16, 16)
+
+
+def small_tree():
+    root, left, right = CompoundGraphic(), CompoundGraphic(), CompoundGraphic()
+    a, b, c = Dot(1, 1), Dot(2, 2), Dot(3, 3)
+    left.add(a)
+    left.add(b)
+    right.add(c)
+    root.add(left)
+    root.add(right)
+    return root, left, right, a, b, c
+
+
+@pytest.mark.parametrize('order, expected', [
+    ('pre', 'root left a b right c'),
+    ('post', 'a b left c right root'),
+    ('bfs', 'root left right a b c'),
+])
+def test_traverse_orders(order, expected):
+    nodes = small_tree()
+    names = dict(zip(map(id, nodes), 'root left right a b c'.split()))
+    assert ' '.join(names[id(node)] for node in traverse(nodes[0], order)) == expected
+
+
+def test_traverse_prune_skips_subtree_and_rejects_unknown_order():
+    root, left, right, a, b, c = small_tree()
+    assert list(traverse(root, prune=lambda node: node is left)) == [root, right, c]
+    assert list(traverse(root, prune=lambda node: node is root)) == []
+    with pytest.raises(ValueError):
+        list(traverse(root, 'sideways'))
+
+
+def test_tree_deeper_than_recursion_limit():
+    depth = sys.getrecursionlimit() * 3
+    root = node = CompoundGraphic()
+    for _ in range(depth):
+        child = CompoundGraphic()
+        node.add(child)
+        node = child
+    node.add(Dot(5, 5))
+    assert sum(1 for _ in traverse(root, 'post')) == depth + 2
+    root.move(10, 0)
+    assert root.bounds() == Rect(15, 5, 16, 6)
+    root.draw(HeadlessRenderer())
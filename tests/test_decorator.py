@@ -0,0 +1,206 @@
+import asyncio
+import os
+import random
+import threading
+
+import pytest
+
+from decorator import (ARCBlockCache, AsyncDataSourceAdapter, AsyncDataSourceDecorator, CachingDataSource,
+                       CompressionDecorator, DataSourceDecorator, EncryptedDataSource, FileDataSource, FramedPipeline,
+                       LRUBlockCache, MemoryDataSource, SyncDataSourceAdapter, aiterate, rechunk, to_async)
+
+
+@pytest.fixture
+def data() -> bytes:
+    return os.urandom(3000) * 40
+
+
+@pytest.mark.parametrize('method', ['zlib', 'lzma'])
+def test_compression_round_trip_in_small_chunks(tmp_path, data, method):
+    source = CompressionDecorator(FileDataSource(str(tmp_path / 'data')), method=method, chunk_size=1024)
+    source.write_data(data)
+    assert os.path.getsize(tmp_path / 'data') < len(data)
+    assert bytes(source.read_data()) == data
+    assert all(len(chunk) <= 1024 for chunk in source.read_chunks())
+
+
+@pytest.mark.parametrize('method', ['zlib', 'lzma'])
+@pytest.mark.parametrize('damage', ['truncated', 'last byte cut', 'trailing garbage', 'second stream'])
+def test_damaged_compressed_stream_is_rejected(tmp_path, data, method, damage):
+    path = tmp_path / 'data'
+    source = CompressionDecorator(FileDataSource(str(path)), method=method, chunk_size=1024)
+    source.write_data(data)
+    raw = path.read_bytes()
+    path.write_bytes({
+        'truncated': raw[:len(raw) // 2],
+        'last byte cut': raw[:-1],
+        'trailing garbage': raw + b'junk',
+        'second stream': raw + raw,
+    }[damage])
+    with pytest.raises(ValueError):
+        source.read_data()
+
+
+def test_stacked_decorators_round_trip(tmp_path, data):
+    source = CompressionDecorator(EncryptedDataSource(FileDataSource(str(tmp_path / 'data')), b'secret'))
+    source.write_data(data)
+    assert bytes(source.read_data()) == data
+
+
+def test_framed_pipeline_round_trip_and_random_frame_access(tmp_path, data):
+    stack = CompressionDecorator(DataSourceDecorator(EncryptedDataSource(FileDataSource(str(tmp_path / 'data')), b'k')))
+    pipeline = FramedPipeline(stack, frame_size=7_000, workers=3, max_in_flight=2)
+    pipeline.write_chunks(data[offset:offset + 10_000] for offset in range(0, len(data), 10_000))
+    assert len(pipeline.layers) == 2
+
+    # Новый конвейер читает таблицу кадров из хвоста файла
+    reopened = FramedPipeline(stack, frame_size=7_000, workers=3)
+    assert reopened.frame_count() == -(-len(data) // 7_000)
+    assert [raw for _, _, raw in reopened.frame_index()][-1] == len(data) % 7_000
+    assert reopened.read_frame(5) == data[35_000:42_000]
+    assert b''.join(reopened.read_chunks()) == data
+
+
+def test_framed_pipeline_rejects_foreign_files_and_sources(tmp_path):
+    with pytest.raises(TypeError):
+        FramedPipeline(CompressionDecorator(MemoryDataSource()))
+    path = tmp_path / 'plain'
+    path.write_bytes(b'not a framed file at all')
+    with pytest.raises(ValueError):
+        FramedPipeline(FileDataSource(str(path))).frame_index()
+
+
+def test_rechunk_slices_without_copying_and_joins_only_at_seams():
+    rng = random.Random(3)
+    payload = os.urandom(50_000)
+    cuts = sorted(rng.sample(range(1, len(payload)), 40))
+    chunks = [payload[start:end] for start, end in zip([0] + cuts, cuts + [len(payload)])]
+    pieces = []
+    for piece in rechunk(chunks, 1000):
+        assert isinstance(piece, memoryview)
+        pieces.append(bytes(piece))
+    assert b''.join(pieces) == payload
+    assert all(len(piece) == 1000 for piece in pieces[:-1])
+    # Кусок целиком внутри входного — представление самого входа
+    assert next(iter(rechunk([payload], 1000))).obj is payload
+
+
+class Tag(DataSourceDecorator):
+    """Чистая обёртка: ничего не переопределяет."""
+
+
+def test_pass_through_wrappers_are_fused_away(tmp_path, data):
+    file = FileDataSource(str(tmp_path / 'data'))
+    source = EncryptedDataSource(Tag(Tag(Tag(file))), b'key')
+    assert Tag.is_pass_through() and not EncryptedDataSource.is_pass_through()
+    assert source.target() is file
+
+    unfused = EncryptedDataSource(Tag(file, fuse=False), b'key', fuse=False)
+    assert isinstance(unfused.target(), Tag)
+    source.write_data(data)
+    assert bytes(unfused.read_data()) == data
+
+    # Смена wrapper сбрасывает запомненную цель
+    memory = MemoryDataSource()
+    source.wrapper = Tag(memory)
+    assert source.target() is memory
+    source.write_data(b'moved')
+    assert memory.buffer and bytes(memory.buffer) != b'moved' and bytes(source.read_data()) == b'moved'
+
+
+def test_lru_block_cache_is_bounded_by_bytes():
+    cache = LRUBlockCache(300)
+    for key in range(3):
+        cache.put(key, bytes(100))
+    cache.get(0)
+    cache.put(3, bytes(100))
+    assert 1 not in cache and 0 in cache and cache.size == 300
+    # Блок крупнее всей ёмкости всё равно остаётся единственным
+    cache.put(4, bytes(1000))
+    assert list(cache._blocks) == [4] and cache.stats['evictions'] == 4
+
+
+def test_arc_block_cache_survives_a_scan():
+    cache = ARCBlockCache(4 * 10, 10)
+    for _ in range(2):
+        for key in (0, 1):
+            if cache.get(key) is None:
+                cache.put(key, bytes(10))
+    for key in range(100, 120):
+        cache.put(key, bytes(10))
+    assert 0 in cache and 1 in cache
+    assert cache.size == 40
+
+
+@pytest.mark.parametrize('policy', ['lru', 'arc'])
+@pytest.mark.parametrize('framed', [False, True])
+def test_caching_source_reads_ranges_and_drops_cache_on_write(tmp_path, data, policy, framed):
+    stack = CompressionDecorator(FileDataSource(str(tmp_path / 'data')))
+    inner = FramedPipeline(stack, frame_size=8192, workers=2) if framed else stack
+    inner.write_data(data)
+    source = CachingDataSource(inner, capacity_bytes=64 * 1024, block_size=8192, policy=policy)
+    rng = random.Random(4)
+    for _ in range(200):
+        offset = rng.randrange(len(data))
+        size = rng.randrange(1, 20_000)
+        assert source.read_range(offset, size) == data[offset:offset + size]
+    assert source.stats['hits'] and source.stats['cached_bytes'] <= 64 * 1024 + 8192
+    assert bytes(source.read_data()) == data
+    assert source.read_range(len(data) + 10, 5) == b''
+
+    source.write_data(b'fresh')
+    assert source.stats['cached_bytes'] == 0
+    assert source.read_range(0, 100) == b'fresh'
+
+
+def test_caching_source_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        CachingDataSource(MemoryDataSource(), policy='mru')
+
+
+def test_async_stack_is_compatible_with_the_sync_one(tmp_path, data):
+    stack = CompressionDecorator(EncryptedDataSource(FileDataSource(str(tmp_path / 'data')), b'key'), method='lzma')
+    twin = to_async(stack)
+    assert isinstance(twin, AsyncDataSourceDecorator) and isinstance(twin.wrapper, AsyncDataSourceDecorator)
+
+    async def write_then_read():
+        await twin.awrite_chunks(aiterate(data[offset:offset + 5000] for offset in range(0, len(data), 5000)))
+        return await twin.aread_data()
+
+    assert bytes(asyncio.run(write_then_read())) == data
+    assert bytes(stack.read_data()) == data
+    stack.write_data(data[::-1])
+    assert bytes(asyncio.run(twin.aread_data())) == data[::-1]
+
+
+def test_async_adapter_wraps_layers_without_a_codec(tmp_path, data):
+    stack = CompressionDecorator(CachingDataSource(FileDataSource(str(tmp_path / 'data'))))
+    twin = to_async(stack)
+    assert isinstance(twin.wrapper, AsyncDataSourceAdapter)
+
+    async def round_trip():
+        # Несколько потоков данных одновременно через один маленький пул записей
+        await asyncio.gather(*(to_async(CompressionDecorator(FileDataSource(str(tmp_path / f'copy{n}'))))
+                               .awrite_data(data) for n in range(4)), twin.awrite_data(data))
+        return await twin.aread_data()
+
+    assert bytes(asyncio.run(round_trip())) == data
+    assert bytes(CompressionDecorator(FileDataSource(str(tmp_path / 'copy3'))).read_data()) == data
+
+
+def test_sync_adapter_drives_an_async_source_from_another_thread(tmp_path, data):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        source = SyncDataSourceAdapter(to_async(EncryptedDataSource(FileDataSource(str(tmp_path / 'data')), b'k')), loop)
+        source.write_chunks(data[offset:offset + 4096] for offset in range(0, len(data), 4096))
+        assert bytes(source.read_data()) == data
+        # Брошенное чтение закрывает асинхронный поток
+        chunks = source.read_chunks()
+        next(chunks)
+        chunks.close()
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
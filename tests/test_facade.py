@@ -0,0 +1,166 @@
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+from facade import (AudioMixer, BitrateReader, CachedFile, CodecProber, ConversionCache, File, OggCompressionCodec,
+                    VideoConvertor, staged)
+
+MP4_HEADER = b'\x00\x00\x00\x18ftypisom'
+
+
+@pytest.fixture
+def video(tmp_path) -> str:
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(MP4_HEADER + os.urandom(300_000))
+    return str(path)
+
+
+def test_tutorial_conversion_reads_like_the_string_pipeline():
+    file = VideoConvertor().convert('test.mp4', 'ogg')
+    buffer = BitrateReader.read('test.mp4', 'mp4')
+    expected = AudioMixer.fix(BitrateReader.convert(buffer, OggCompressionCodec()))
+    assert file.data.decode() == expected == 'fixed audio in converted buffer from test.mp4 with codec mp4 to ogg'
+
+
+@pytest.mark.parametrize('threaded', [False, True])
+def test_stream_matches_convert(tmp_path, video, threaded):
+    convertor = VideoConvertor()
+    output = tmp_path / 'out.ogg'
+    written = convertor.convert_stream(video, 'ogg', str(output), chunk_size=4096, threaded=threaded)
+    data = output.read_bytes()
+    assert written == len(data)
+    assert data == convertor.convert(video, 'ogg', chunk_size=4096).data
+    with open(video, 'rb') as file:
+        assert file.read() in data
+
+
+def test_staged_closes_upstream_when_abandoned():
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                yield b'chunk'
+        finally:
+            closed.set()
+
+    chunks = staged(endless(), queue_size=2)
+    assert next(chunks) == b'chunk'
+    chunks.close()
+    assert closed.is_set()
+
+
+def test_staged_passes_producer_errors_to_consumer():
+    def failing():
+        yield b'first'
+        raise OSError('disk went away')
+
+    chunks = staged(failing(), queue_size=2)
+    assert next(chunks) == b'first'
+    with pytest.raises(OSError, match='disk went away'):
+        next(chunks)
+
+
+def test_convert_many_reports_every_file_and_isolates_errors(tmp_path):
+    names = []
+    for n in range(5):
+        path = tmp_path / f'clip{n}.mp4'
+        path.write_bytes(MP4_HEADER + bytes([n]) * 1000)
+        names.append(str(path))
+    broken = tmp_path / 'folder.mp4'
+    broken.mkdir()
+    convertor = VideoConvertor()
+    results = {result.filename: result for result in
+               convertor.convert_many(names + [str(broken)], 'ogg', workers=2, max_in_flight=3)}
+    assert set(results) == set(names) | {str(broken)}
+    for name in names:
+        assert results[name].error is None
+        assert results[name].file.data == convertor.convert(name, 'ogg').data
+    assert results[str(broken)].file is None and 'IsADirectoryError' in results[str(broken)].error
+
+
+def test_convert_many_stops_submitting_after_cancel(tmp_path):
+    cancel = threading.Event()
+    results = []
+    for result in VideoConvertor().convert_many([f'clip{n}.mp4' for n in range(10)], 'ogg', workers=1,
+                                                max_in_flight=1, cancel=cancel):
+        results.append(result)
+        cancel.set()
+    assert len(results) == 1
+
+
+class CountingReader(BitrateReader):
+    conversions = 0
+
+    @classmethod
+    def convert_chunks(cls, chunks, destination_codec):
+        cls.conversions += 1
+        return BitrateReader.convert_chunks(chunks, destination_codec)
+
+
+def test_cache_serves_repeated_conversions_and_notices_new_content(tmp_path, video):
+    CountingReader.conversions = 0
+    convertor = VideoConvertor(CountingReader, ConversionCache(str(tmp_path / 'cache')))
+    first = convertor.convert(video, 'ogg')
+    expected = VideoConvertor().convert(video, 'ogg').data
+    with convertor.convert(video, 'ogg') as second:
+        assert isinstance(second, CachedFile) and second.data == first.data == expected
+        assert isinstance(pickle.loads(pickle.dumps(second)), File)
+    assert CountingReader.conversions == 1
+
+    with open(video, 'ab') as file:
+        file.write(b'more')
+    os.utime(video, ns=(time.time_ns() + 10**9,) * 2)
+    assert convertor.convert(video, 'ogg').data.endswith(b'more to ogg')
+    assert CountingReader.conversions == 2
+
+
+def test_cache_eviction_drops_least_recent_entries_and_their_fast_paths(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'), max_bytes=2500)
+    convertor = VideoConvertor(cache=cache)
+    names = []
+    for n in range(3):
+        path = tmp_path / f'clip{n}.mp4'
+        path.write_bytes(MP4_HEADER + bytes([n]) * 1000)
+        names.append(str(path))
+        convertor.convert(str(path), 'ogg').close()
+        # Время обращения хранится в mtime записи: разводим его явно
+        for entry in os.scandir(cache.objects):
+            os.utime(entry.path, ns=(entry.stat().st_mtime_ns - 10**9,) * 2)
+    assert len(os.listdir(cache.objects)) == 2
+    assert len(os.listdir(cache.fast)) == 2
+    hashes = {name.partition('-')[0] for name in os.listdir(cache.objects)}
+    assert cache.content_hash(names[0]) not in hashes
+    assert {cache.content_hash(name) for name in names[1:]} == hashes
+
+
+def test_prober_trusts_the_header_over_the_name_and_notices_changes(tmp_path):
+    path = tmp_path / 'really_ogg.mp4'
+    path.write_bytes(b'OggS' + bytes(100))
+    prober = CodecProber(max_entries=1)
+    assert prober.probe(str(path)) == 'ogg'
+    path.write_bytes(MP4_HEADER + bytes(200))
+    assert prober.probe(str(path)) == 'mp4'
+    # Неизвестный заголовок, пустой файл и отсутствующий файл — догадка по расширению
+    for name, content in (('unknown.mp4', b'????????'), ('empty.mp4', b'')):
+        (tmp_path / name).write_bytes(content)
+        assert prober.probe(str(tmp_path / name)) == 'mp4'
+    assert prober.probe(str(tmp_path / 'missing.avi')) == 'ogg'
+    assert len(prober._probes) == 1
+
+
+def test_file_already_in_target_format_is_returned_as_is(tmp_path):
+    path = tmp_path / 'clip.bin'
+    content = b'OggS' + os.urandom(5000)
+    path.write_bytes(content)
+    CountingReader.conversions = 0
+    assert VideoConvertor(CountingReader).convert(str(path), 'ogg', chunk_size=1024).data == content
+    assert CountingReader.conversions == 0
+
+
+def test_unknown_target_format_is_rejected(video):
+    with pytest.raises(ValueError, match='unsupported file format'):
+        VideoConvertor().convert(video, 'avi')
@@ -0,0 +1,184 @@
+import gc
+import random
+import threading
+from array import array
+
+import pytest
+
+from flyweight import TREE_EXTENT, Forest, RasterCanvas, TreeFactory, TreeType
+
+
+@pytest.fixture
+def forest() -> Forest:
+    forest = Forest()
+    forest.plant_tree(20, 50, 'Oak', 'green', 'rough')
+    forest.plant_many(array('i', [1, 2, 3]), array('i', [4, 5, 6]), 'Pine', 'darkgreen', 'smooth')
+    forest.plant_tree(-7, 9, 'Oak', 'green', 'rough')
+    return forest
+
+
+def columns(forest: Forest):
+    return [list(column) for column in (forest.xs, forest.ys, forest.kinds)]
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_save_load_round_trip(tmp_path, forest, lazy):
+    path = str(tmp_path / 'forest.bin')
+    forest.save(path)
+    loaded = Forest.load(path, lazy=lazy)
+    assert len(loaded) == len(forest)
+    assert loaded.types == forest.types
+    assert columns(loaded) == columns(forest)
+    loaded.close()
+
+
+def test_empty_forest_round_trip(tmp_path):
+    path = str(tmp_path / 'forest.bin')
+    Forest().save(path)
+    assert len(Forest.load(path)) == 0
+
+
+def test_planting_into_lazily_loaded_forest(tmp_path, forest):
+    path = str(tmp_path / 'forest.bin')
+    forest.save(path)
+    loaded = Forest.load(path)
+    loaded.plant_tree(1, 2, 'Birch', 'lightgreen', 'smooth')
+    assert len(loaded) == len(forest) + 1
+    assert loaded[-1].tree_type.name == 'Birch'
+    assert columns(loaded)[0][:-1] == columns(forest)[0]
+
+
+def test_truncated_type_table_is_rejected(tmp_path, forest):
+    path = tmp_path / 'forest.bin'
+    forest.save(str(path))
+    path.write_bytes(path.read_bytes()[:Forest.HEADER.size + 3])
+    with pytest.raises(ValueError, match='truncated'):
+        Forest.load(str(path))
+
+
+def test_duplicate_type_entry_is_rejected(tmp_path, forest):
+    path = str(tmp_path / 'forest.bin')
+    duplicate = Forest()
+    # save пишет таблицу из types как есть, поэтому повтор типа получается напрямую
+    duplicate.types = [forest.types[0], forest.types[0]]
+    duplicate.save(path)
+    with pytest.raises(ValueError, match='duplicate'):
+        Forest.load(path)
+
+
+def test_overflowing_coordinate_leaves_columns_untouched(forest):
+    before = columns(forest)
+    with pytest.raises(OverflowError):
+        forest.plant_tree(1, 2 ** 31, 'Oak', 'green', 'rough')
+    with pytest.raises(OverflowError):
+        forest.plant_many([1, 2], [3, 2 ** 40], 'Oak', 'green', 'rough')
+    assert columns(forest) == before
+
+
+def test_plant_many_rejects_mismatched_lengths(forest):
+    before = columns(forest)
+    with pytest.raises(ValueError):
+        forest.plant_many([1, 2, 3], [4, 5], 'Oak', 'green', 'rough')
+    assert columns(forest) == before
+    assert forest.plant_many(iter([7, 8]), (y for y in (9, 10)), 'Oak', 'green', 'rough') == 2
+    assert columns(forest)[0][-2:] == [7, 8]
+
+
+@pytest.fixture
+def factory():
+    saved = TreeFactory.tree_types
+    TreeFactory.tree_types = {}
+    yield TreeFactory
+    TreeFactory.tree_types = saved
+
+
+def test_tree_types_are_interned_across_threads(factory):
+    barrier = threading.Barrier(8)
+    seen = []
+
+    def plant() -> None:
+        barrier.wait()
+        seen.extend(factory.get_tree_type(f'Tree{n % 50}', 'green', 'rough') for n in range(2000))
+
+    threads = [threading.Thread(target=plant) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(factory.tree_types) == 50
+    assert len({id(tree_type) for tree_type in seen}) == 50
+    with pytest.raises(AttributeError):
+        seen[0].color = 'red'
+
+
+def test_weak_table_forgets_unused_types(factory):
+    oak = factory.get_tree_type('Oak', 'green', 'rough')
+    factory.configure(weak=True)
+    forest = Forest()
+    forest.plant_tree(1, 2, 'Pine', 'darkgreen', 'smooth')
+    factory.get_tree_type('Birch', 'white', 'smooth')
+    gc.collect()
+    # Живы только типы, на которые кто-то ссылается: переменная и лес
+    assert set(factory.tree_types) == {('Oak', 'green', 'rough'), ('Pine', 'darkgreen', 'smooth')}
+    assert factory.get_tree_type('Oak', 'green', 'rough') is oak
+    factory.configure(weak=False)
+    assert isinstance(factory.tree_types, dict) and len(factory.tree_types) == 2
+
+
+def test_columns_hand_out_trees_sharing_their_type(forest):
+    trees = list(forest.trees)
+    assert [(tree.x, tree.y, tree.tree_type.name) for tree in trees] == [
+        (20, 50, 'Oak'), (1, 4, 'Pine'), (2, 5, 'Pine'), (3, 6, 'Pine'), (-7, 9, 'Oak')]
+    assert trees[0].tree_type is trees[4].tree_type is forest[4].tree_type
+    assert forest.types == [trees[0].tree_type, trees[1].tree_type]
+    assert forest.nbytes() == len(forest) * (4 + 4 + 2)
+
+
+def test_kind_column_widens_past_65536_types(tmp_path):
+    forest = Forest()
+    forest.plant_tree(0, 0, 'First', 'green', 'rough')
+    for n in range(0x10000):
+        forest._kind(TreeType(f'Type{n}', 'green', 'rough'))
+    forest.plant_tree(1, 1, 'First', 'green', 'rough')
+    forest.plant_many([2], [2], 'Last', 'green', 'rough')
+    assert forest.kinds.typecode == 'I' and list(forest.kinds) == [0, 0, 0x10001]
+    assert forest[2].tree_type.name == 'Last'
+    path = str(tmp_path / 'forest.bin')
+    forest.save(path)
+    assert list(Forest.load(path, lazy=False).kinds) == [0, 0, 0x10001]
+
+
+def test_cull_matches_brute_force():
+    rng = random.Random(5)
+    forest = Forest()
+    for kind in ('Oak', 'Pine', 'Birch'):
+        forest.plant_many([rng.randrange(-500, 1500) for _ in range(1000)],
+                          [rng.randrange(-500, 1500) for _ in range(1000)], kind, 'green', 'rough')
+    left, top, right, bottom = TREE_EXTENT
+    for _ in range(30):
+        x0, y0 = rng.randrange(-600, 1400), rng.randrange(-600, 1400)
+        viewport = (x0, y0, x0 + rng.randrange(1, 400), y0 + rng.randrange(1, 400))
+        if rng.random() < 0.5:
+            # Посадка после первого cull дополняет уже построенную сетку
+            forest.plant_tree(x0 + 3, y0 + 3, 'Oak', 'green', 'rough')
+        expected = sorted((tree.tree_type.name, tree.x - x0, tree.y - y0) for tree in forest
+                          if tree.x + left < viewport[2] and viewport[0] < tree.x + right
+                          and tree.y + top < viewport[3] and viewport[1] < tree.y + bottom)
+        culled = sorted((forest.types[kind].name, x, y)
+                        for kind, (xs, ys) in forest.cull(viewport).items() for x, y in zip(xs, ys))
+        assert culled == expected
+
+
+def test_batched_draw_paints_the_same_pixels_as_tree_by_tree():
+    forest = Forest()
+    for row in range(10):
+        for column in range(12):
+            kind = ('Oak', 'green') if (row + column) % 2 else ('Pine', 'darkgreen')
+            forest.plant_tree(column * 40 - 15, row * 60 - 20, kind[0], kind[1], 'rough')
+    viewport = (10, 10, 250, 250)
+    batched, naive = RasterCanvas(240, 240), RasterCanvas(240, 240)
+    forest.draw(batched, viewport)
+    for tree in forest:
+        tree.tree_type.draw(naive, tree.x - viewport[0], tree.y - viewport[1])
+    assert batched.pixels == naive.pixels and batched.pixels != RasterCanvas(240, 240).pixels
+    assert sum(len(xs) for xs, _ in forest.cull(viewport).values()) < len(forest)
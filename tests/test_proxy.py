@@ -0,0 +1,303 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from proxy import (MISSING, AsyncCachedYouTubeClass, AsyncSingleFlight, BatchLoader, CacheEngine, CachedYouTubeClass, DownloadCache, LocalYouTubeClass, MeteredYouTubeClass,
+                   PersistentTier, Prefetcher, RateLimiter, SingleFlight, ThirdPartyYouTubeLib, VideoNotFoundError)
+
+
+class PlainService(ThirdPartyYouTubeLib):
+    """Сервис без Range-запросов: только полное скачивание."""
+
+    def __init__(self, content: str = 'x' * 5000):
+        self.content = content
+        self.downloads = 0
+
+    def list_videos(self):
+        return ['video1']
+
+    def get_video_info(self, video_id):
+        return f'info {video_id}'
+
+    def download_video(self, video_id):
+        self.downloads += 1
+        return self.content
+
+
+def test_service_without_ranges_is_downloaded_once(tmp_path):
+    service = PlainService()
+    proxy = CachedYouTubeClass(service, verbose=False, downloads=DownloadCache(str(tmp_path), segment_size=1000))
+    content = proxy.download_video('video1')
+    assert bytes(content) == service.content.encode()
+    assert service.downloads == 1
+    assert proxy.downloads.stats['segments_fetched'] == 5
+
+    assert bytes(proxy.download_video('video1')) == service.content.encode()
+    assert service.downloads == 1
+
+
+def test_download_path_is_explicit(tmp_path):
+    service = PlainService()
+    proxy = CachedYouTubeClass(service, verbose=False, downloads=DownloadCache(str(tmp_path), segment_size=1000))
+    with open(proxy.download_path('video1'), 'rb') as file:
+        assert file.read() == service.content.encode()
+    with pytest.raises(ValueError):
+        CachedYouTubeClass(service, verbose=False).download_path('video1')
+
+
+def test_ranged_download_resumes_and_refetches_corrupt_segments(tmp_path):
+    size = 10_000
+    expected = LocalYouTubeClass(video_bytes=size).download_range('video1', 0, size)
+
+    class Broken(LocalYouTubeClass):
+        def download_range(self, video_id, start, end):
+            if start >= size // 2:
+                raise ConnectionError('connection reset')
+            return super().download_range(video_id, start, end)
+
+    downloads = DownloadCache(str(tmp_path), segment_size=1000, workers=1)
+    with pytest.raises(ConnectionError):
+        downloads.fetch('video1', Broken(video_bytes=size))
+    assert not downloads.is_complete('video1')
+    with open(downloads.path('video1'), 'r+b') as file:
+        file.write(b'\xff' * 16)
+
+    service = LocalYouTubeClass(video_bytes=size)
+    with open(downloads.fetch('video1', service), 'rb') as file:
+        assert file.read() == expected
+    assert downloads.stats['segments_corrupt'] == 1
+    # Размер уже в журнале, целые сегменты не качаются заново
+    assert service.calls == downloads.segments(size) - (size // 2 // 1000 - 1)
+    assert downloads.is_complete('video1')
+
+
+def test_missing_data_file_restarts_download(tmp_path):
+    downloads = DownloadCache(str(tmp_path), segment_size=1000)
+    service = LocalYouTubeClass(video_bytes=3000)
+    path = downloads.fetch('video1', service)
+    os.remove(path)
+    assert not downloads.is_complete('video1')
+    with open(downloads.fetch('video1', service), 'rb') as file:
+        assert len(file.read()) == 3000
+
+
+def test_foreground_charges_shared_budget_without_waiting():
+    limiter = RateLimiter(rate=20, burst=1)
+    service = LocalYouTubeClass()
+    metered = MeteredYouTubeClass(service, limiter)
+    started = time.monotonic()
+    for number in range(5):
+        metered.get_video_info(f'video{number}')
+    assert time.monotonic() - started < 0.1
+    assert service.calls == 5
+
+    # Бюджет ушёл в долг на 4 токена: фоновое обращение ждёт, пока он не восстановится
+    started = time.monotonic()
+    with limiter.background():
+        metered.get_video_info('video9')
+    assert time.monotonic() - started >= 0.15
+
+
+def test_prefetch_backs_off_while_foreground_uses_the_budget():
+    limiter = RateLimiter(rate=10, burst=1)
+    service = LocalYouTubeClass()
+    proxy = CachedYouTubeClass(MeteredYouTubeClass(service, limiter), verbose=False)
+    for number in range(3):
+        proxy.get_video_info(f'video{number}')
+    prefetcher = Prefetcher(proxy, workers=2, budget=limiter)
+    try:
+        prefetcher.prefetch([f'video{number}' for number in range(100, 110)])
+        time.sleep(0.25)
+        # За 0.25 с при 10 запросах/с и долге в 2 токена прогрев почти ничего не успел
+        assert service.calls <= 3 + 2
+    finally:
+        prefetcher.close()
+    assert ('get_video_info', 'video0') in proxy.cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_engine_expires_and_evicts_least_recent():
+    clock = Clock()
+    cache = CacheEngine(max_entries=3, clock=clock)
+    cache.put('a', 1, ttl=10)
+    cache.put('b', 2)
+    cache.put('c', 3)
+    assert cache.get('a') == 1
+    cache.put('d', 4)
+    assert 'b' not in cache and cache.stats['evictions'] == 1
+    clock.now = 10
+    assert cache.get('a') is MISSING and cache.stats['expirations'] == 1
+    assert cache.get('c') == 3 and len(cache) == 2
+    assert not cache.add('c', 30) and cache.get('c') == 3
+    assert cache.invalidate('c') and not cache.invalidate('c')
+
+
+def test_segmented_cache_keeps_popular_keys_through_a_scan():
+    cache = CacheEngine(max_entries=10, policy='slru', protected_ratio=0.5)
+    for key in range(3):
+        cache.put(key, key)
+        cache.get(key)
+    for key in range(100, 200):
+        cache.put(key, key)
+    assert all(key in cache for key in range(3))
+    with pytest.raises(ValueError):
+        CacheEngine(policy='fifo')
+
+
+def test_proxy_caches_misses_for_negative_ttl_and_invalidates():
+    clock = Clock()
+    service = LocalYouTubeClass(catalog=10)
+    proxy = CachedYouTubeClass(service, CacheEngine(clock=clock), ttls={'get_video_info': 100}, negative_ttl=5,
+                               verbose=False)
+    for _ in range(3):
+        with pytest.raises(VideoNotFoundError):
+            proxy.get_video_info('video42')
+        proxy.get_video_info('video1')
+    assert service.calls == 2
+    clock.now = 5
+    with pytest.raises(VideoNotFoundError):
+        proxy.get_video_info('video42')
+    assert service.calls == 3
+    proxy.invalidate('video1')
+    proxy.get_video_info('video1')
+    clock.now = 200
+    proxy.get_video_info('video1')
+    assert service.calls == 5
+
+
+def test_concurrent_misses_reach_the_service_once():
+    service = LocalYouTubeClass(catalog=10, latency=0.05)
+    proxy = CachedYouTubeClass(service, verbose=False)
+    with ThreadPoolExecutor(16) as pool:
+        infos = list(pool.map(proxy.get_video_info, ['video3'] * 16))
+    assert len(set(infos)) == 1 and service.calls == 1
+
+
+def test_single_flight_shares_errors_and_forgets_finished_flights():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.05)
+        raise VideoNotFoundError('video9')
+
+    def follower():
+        started.wait()
+        return flights.do('key', lambda: 'not called')
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flights.do, 'key', failing)
+        shared = pool.submit(follower)
+        for future in (leader, shared):
+            with pytest.raises(VideoNotFoundError):
+                future.result()
+    assert flights.do('key', lambda: 'fresh') == 'fresh'
+
+
+def test_async_single_flight_survives_one_cancelled_waiter():
+    async def scenario():
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'value'
+
+        first = asyncio.ensure_future(flights.do('key', fetch))
+        second = asyncio.ensure_future(flights.do('key', fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == 'value'
+        assert first.cancelled() and len(calls) == 1 and flights.shared == 1
+
+        proxy = AsyncCachedYouTubeClass(CachedYouTubeClass(LocalYouTubeClass(catalog=10, latency=0.02), verbose=False))
+        infos = await asyncio.gather(*(proxy.get_video_info('video2') for _ in range(8)))
+        assert len(set(infos)) == 1 and proxy.proxy._service.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_batch_loader_groups_keys_within_the_window():
+    batches = []
+
+    def batch_fn(keys):
+        batches.append(sorted(keys))
+        if 'boom' in keys:
+            raise OSError('service down')
+        return {key: key.upper() for key in keys if key != 'gone'}
+
+    loader = BatchLoader(batch_fn, window=0.05, max_batch=4)
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(loader.load, key) for key in ('a', 'b', 'c', 'a', 'gone', 'd', 'e')]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except VideoNotFoundError:
+            results.append(None)
+    assert results == ['A', 'B', 'C', 'A', None, 'D', 'E']
+    assert sum(map(len, batches)) == 6 and all(len(batch) <= 4 for batch in batches) and len(batches) <= 3
+    with pytest.raises(OSError):
+        loader.load('boom')
+
+
+def test_proxy_batches_lookups_and_caches_batch_misses():
+    service = LocalYouTubeClass(catalog=10)
+    proxy = CachedYouTubeClass(service, verbose=False, batch_window=0.05)
+    with ThreadPoolExecutor(5) as pool:
+        list(pool.map(proxy.get_video_info, [f'video{n}' for n in range(5)]))
+    assert service.calls == 1
+
+    infos = proxy.get_videos_info(['video1', 'video7', 'video99'])
+    assert set(infos) == {'video1', 'video7'} and service.calls == 2
+    assert set(proxy.get_videos_info(['video7', 'video99'])) == {'video7'} and service.calls == 2
+    with pytest.raises(VideoNotFoundError):
+        proxy.get_video_info('video99')
+    assert service.calls == 2
+
+
+def test_persistent_tier_warms_a_restarted_proxy(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    service = LocalYouTubeClass(catalog=10)
+    proxy = CachedYouTubeClass(service, verbose=False, persistent=PersistentTier(path),
+                               ttls={'get_video_info': 60, 'list_videos': 0.05})
+    for n in range(4):
+        proxy.get_video_info(f'video{n}')
+    with pytest.raises(VideoNotFoundError):
+        proxy.get_video_info('video50')
+    proxy.list_videos()
+    proxy.invalidate('video3')
+    proxy.persistent.close()
+    time.sleep(0.1)
+
+    restarted = LocalYouTubeClass(catalog=10)
+    tier = PersistentTier(path)
+    proxy = CachedYouTubeClass(restarted, verbose=False, persistent=tier)
+    tier.warm(proxy.cache, background=False)
+    assert {key for key in [('get_video_info', f'video{n}') for n in range(4)] if key in proxy.cache} == {
+        ('get_video_info', f'video{n}') for n in range(3)}
+    for n in range(3):
+        proxy.get_video_info(f'video{n}')
+    with pytest.raises(VideoNotFoundError):
+        proxy.get_video_info('video50')
+    assert restarted.calls == 0
+    # Удалённая запись и запись с истёкшим TTL в постоянном уровне не оживают
+    proxy.get_video_info('video3')
+    proxy.list_videos()
+    assert restarted.calls == 2
+    entry = proxy.cache._probation.get(('get_video_info', 'video0')) or proxy.cache._protected[('get_video_info', 'video0')]
+    assert entry.expires_at - time.monotonic() < 60
+    tier.close()